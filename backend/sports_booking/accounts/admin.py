@@ -7,15 +7,18 @@ from .models import User, OTP
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     list_display = ['username', 'email', 'mobile_number', 'full_name_display', 
-                    'is_mobile_verified', 'is_staff', 'is_active', 'date_joined']
+                    'is_mobile_verified', 'is_staff', 'is_active', 'booking_count',
+                    'confirmed_booking_count', 'cancelled_booking_count', 'total_spent', 'date_joined']
     list_filter = ['is_staff', 'is_active', 'is_mobile_verified', 'date_joined']
     search_fields = ['username', 'email', 'mobile_number', 'first_name', 'last_name']
     ordering = ['-date_joined']
-    readonly_fields = ['date_joined', 'last_login', 'total_bookings']
+    readonly_fields = ['date_joined', 'last_login', 'total_bookings', 'confirmed_booking_count',
+                       'cancelled_booking_count', 'total_spent']
     
     fieldsets = BaseUserAdmin.fieldsets + (
         ('Additional Info', {
-            'fields': ('mobile_number', 'is_mobile_verified', 'total_bookings')
+            'fields': ('mobile_number', 'is_mobile_verified', 'total_bookings', 'confirmed_booking_count',
+                       'cancelled_booking_count', 'total_spent')
         }),
     )
     
@@ -25,16 +28,12 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.prefetch_related('bookings')
-    
     def full_name_display(self, obj):
         return obj.get_full_name() or '-'
     full_name_display.short_description = 'Full Name'
 
     def total_bookings(self, obj):
-        count = obj.bookings.count()
+        count = obj.booking_count
         if count > 0:
             url = f"/admin/bookings/booking/?user__id__exact={obj.id}"
             return format_html('<a href="{}">{} bookings</a>', url, count)
@@ -0,0 +1,133 @@
+"""
+Per-user booking counters stored on User.
+
+A booking adds one to booking_count and, by status, to the confirmed
+(confirmed/completed) or cancelled (cancelled/refunded) count; a
+completed payment adds its amount to total_spent. Signals
+(accounts.signals, on the shared common.tracking trackers) apply the
+difference between a row's old and new contribution with F() increments,
+so concurrent transitions never lose an update; refresh()/rebuild()
+recompute from the base tables for queryset.update() callers, the
+nightly verification (reports.tasks.verify_daily_rollups) and the
+repair_user_counters command.
+
+User.save() never writes these fields back on an update (see
+accounts.models.User), so a form or password change working from a
+loaded user can't overwrite increments made since it was loaded.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from bookings.models import Booking
+
+User = get_user_model()
+
+COUNTERS = User.COUNTER_FIELDS
+CONFIRMED_STATUSES = ('confirmed', 'completed')
+CANCELLED_STATUSES = ('cancelled', 'refunded')
+
+# Fields accounts.signals needs the before/after of
+BOOKING_STATE_FIELDS = ('user_id', 'status')
+PAYMENT_STATE_FIELDS = ('status', 'amount')
+
+USER_CHUNK = 500
+
+
+def booking_part(status):
+    part = {'booking_count': 1}
+    if status in CONFIRMED_STATUSES:
+        part['confirmed_booking_count'] = 1
+    elif status in CANCELLED_STATUSES:
+        part['cancelled_booking_count'] = 1
+    return part
+
+
+def payment_part(payment_state):
+    status, amount = payment_state
+    return {'total_spent': amount} if status == 'completed' else {}
+
+
+def apply(deltas):
+    """Add per-user counter deltas with one F() update per user."""
+    for user_id, counters in deltas.items():
+        counters = {counter: value for counter, value in counters.items() if value}
+        if counters:
+            User.objects.filter(pk=user_id).update(**{
+                counter: F(counter) + value for counter, value in counters.items()
+            })
+
+
+def compute(users):
+    """Counter values for a User queryset, as recomputed from bookings and payments."""
+    return users.annotate(
+        real_booking_count=Count('bookings'),
+        real_confirmed_booking_count=Count('bookings', filter=Q(bookings__status__in=CONFIRMED_STATUSES)),
+        real_cancelled_booking_count=Count('bookings', filter=Q(bookings__status__in=CANCELLED_STATUSES)),
+        real_total_spent=Coalesce(
+            Sum('bookings__payment__amount', filter=Q(bookings__payment__status='completed')),
+            Value(Decimal('0')),
+        ),
+    ).values('pk', *COUNTERS, *(f'real_{counter}' for counter in COUNTERS))
+
+
+def _drifted(rows):
+    for row in rows:
+        if any(row[counter] != row[f'real_{counter}'] for counter in COUNTERS):
+            yield row
+
+
+def _write(rows):
+    users = [
+        User(pk=row['pk'], **{counter: row[f'real_{counter}'] for counter in COUNTERS})
+        for row in rows
+    ]
+    User.objects.bulk_update(users, COUNTERS)
+    return len(users)
+
+
+def refresh(user_ids):
+    """Recompute the counters of the given users exactly."""
+    user_ids = list(set(user_ids))
+    for i in range(0, len(user_ids), USER_CHUNK):
+        with transaction.atomic():
+            chunk = User.objects.select_for_update().filter(pk__in=user_ids[i:i + USER_CHUNK])
+            _write(list(compute(chunk)))
+
+
+def check(users=None):
+    """[(user_id, counter, stored, expected)] wherever a user's counters disagree with the base tables."""
+    rows = compute(User.objects.all() if users is None else users).order_by('pk')
+    return [
+        (row['pk'], counter, row[counter], row[f'real_{counter}'])
+        for row in _drifted(rows.iterator())
+        for counter in COUNTERS
+        if row[counter] != row[f'real_{counter}']
+    ]
+
+
+def rebuild(batch_size=USER_CHUNK):
+    """Recompute every user's counters, rewriting only drifted rows. Returns the number fixed."""
+    fixed, last_id = 0, 0
+    while True:
+        with transaction.atomic():
+            batch = list(compute(
+                User.objects.select_for_update().filter(pk__gt=last_id).order_by('pk')[:batch_size]
+            ))
+            if not batch:
+                return fixed
+            fixed += _write(list(_drifted(batch)))
+        last_id = batch[-1]['pk']
+
+
+def users_of(bookings):
+    """Distinct user ids of a Booking queryset (for refreshing around queryset.update())."""
+    return set(bookings.values_list('user_id', flat=True).order_by().distinct())
+
+
+def user_of_payment(payment):
+    booking = payment.loaded_booking()
+    return booking.user_id if booking else None
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from accounts.counters import check, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-user booking counters (booking/confirmed/cancelled counts, total spent) from bookings and payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Users recomputed per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report users whose counters disagree',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            mismatches = check()
+            for user_id, counter, stored, expected in mismatches:
+                self.stdout.write(f"user={user_id} {counter}: stored {stored}, expected {expected}")
+            users = len({user_id for user_id, *_ in mismatches})
+            self.stdout.write(self.style.SUCCESS(f"{users} user(s) with inconsistent counters"))
+            return
+
+        fixed = rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Repaired counters for {fixed} user(s)"))
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:04
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+COUNTERS = ('booking_count', 'confirmed_booking_count', 'cancelled_booking_count', 'total_spent')
+
+
+def fill_counters(apps, schema_editor):
+    """The counters of existing users, from their bookings and payments (as repair_user_counters would)."""
+    User = apps.get_model('accounts', 'User')
+    users = User.objects.annotate(
+        real_booking_count=Count('bookings'),
+        real_confirmed_booking_count=Count('bookings', filter=Q(bookings__status__in=('confirmed', 'completed'))),
+        real_cancelled_booking_count=Count('bookings', filter=Q(bookings__status__in=('cancelled', 'refunded'))),
+        real_total_spent=Coalesce(
+            Sum('bookings__payment__amount', filter=Q(bookings__payment__status='completed')),
+            Value(Decimal('0')),
+        ),
+    ).filter(real_booking_count__gt=0).values('pk', *(f'real_{counter}' for counter in COUNTERS))
+    User.objects.bulk_update([
+        User(pk=row['pk'], **{counter: row[f'real_{counter}'] for counter in COUNTERS})
+        for row in users.iterator()
+    ], COUNTERS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_user_users_date_jo_12fc70_idx_and_more'),
+        ('bookings', '0002_initial'),
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='booking_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='cancelled_booking_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='confirmed_booking_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='total_spent',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# The admin user search (accounts.views.all_users, reports.exports.booking_search)
+# matches prefixes: Django compiles istartswith to UPPER(col::text) LIKE
+# UPPER('q%') and startswith to col::text LIKE 'q%'. On PostgreSQL a plain
+# btree (non-C collation) serves neither; these pattern_ops indexes do.
+INDEXES = {
+    'users_username_upper_like': 'UPPER(username::text) text_pattern_ops',
+    'users_email_upper_like': 'UPPER(email::text) text_pattern_ops',
+    'users_mobile_number_like': 'mobile_number varchar_pattern_ops',
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, expression in INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON users ({expression})')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_user_booking_count_user_cancelled_booking_count_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -19,6 +19,15 @@ class User(AbstractUser):
     email = models.EmailField(unique=True)
     is_mobile_verified = models.BooleanField(default=False)
 
+    # Denormalised booking stats, kept in step by accounts.signals (see
+    # accounts.counters); repair with `manage.py repair_user_counters`
+    booking_count = models.PositiveIntegerField(default=0)
+    confirmed_booking_count = models.PositiveIntegerField(default=0)
+    cancelled_booking_count = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    COUNTER_FIELDS = ('booking_count', 'confirmed_booking_count', 'cancelled_booking_count', 'total_spent')
+
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['email', 'mobile_number']
 
@@ -28,18 +37,34 @@ class User(AbstractUser):
         indexes = [
             models.Index(fields=['mobile_number']),
             models.Index(fields=['email']),
+            # Admin user list keyset pagination
+            models.Index(fields=['date_joined', 'id']),
+            models.Index(fields=['is_staff', 'date_joined']),
         ]
 
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        # The counters only ever change through F() updates; a full save
+        # from a loaded instance (profile form, password change, admin)
+        # would write back the stale values it was loaded with.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
     def get_full_name(self):
         full_name = f'{self.first_name} {self.last_name}'.strip()
         return full_name if full_name else self.username
 
     @property
     def total_booking(self):
-        return self.bookings.count()
+        return self.booking_count
 
 
 class OTP(models.Model):
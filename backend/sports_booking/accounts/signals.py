@@ -0,0 +1,61 @@
+from bookings.models import Booking
+from common.tracking import add, new_deltas, pick, tracker
+from payments.models import Payment
+from . import counters
+
+bookings = tracker(Booking, counters.BOOKING_STATE_FIELDS)
+payments = tracker(Payment, counters.PAYMENT_STATE_FIELDS)
+
+
+def booking_saved(instance, old, new, created):
+    old, new = pick(old, counters.BOOKING_STATE_FIELDS), pick(new, counters.BOOKING_STATE_FIELDS)
+    if new is None or (old is None and not created):
+        # Loaded with deferred fields: no reliable before/after, recompute
+        counters.refresh(counters.users_of(Booking.objects.filter(pk=instance.pk)) | ({old[0]} if old else set()))
+    elif old != new:
+        deltas = new_deltas()
+        if old is not None:
+            add(deltas, old[0], counters.booking_part(old[1]), -1)
+        add(deltas, new[0], counters.booking_part(new[1]))
+        counters.apply(deltas)
+
+
+def booking_deleted(instance, old):
+    old = pick(old, counters.BOOKING_STATE_FIELDS)
+    if old is not None:
+        deltas = new_deltas()
+        add(deltas, old[0], counters.booking_part(old[1]), -1)
+        counters.apply(deltas)
+
+
+def payment_saved(instance, old, new, created):
+    old, new = pick(old, counters.PAYMENT_STATE_FIELDS), pick(new, counters.PAYMENT_STATE_FIELDS)
+    if new is None or (old is None and not created):
+        user_id = counters.user_of_payment(instance)
+        if user_id:
+            counters.refresh([user_id])
+        return
+    old_part = counters.payment_part(old) if old else {}
+    new_part = counters.payment_part(new)
+    if old_part != new_part:
+        user_id = counters.user_of_payment(instance)
+        if user_id:
+            deltas = new_deltas()
+            add(deltas, user_id, old_part, -1)
+            add(deltas, user_id, new_part)
+            counters.apply(deltas)
+
+
+def payment_deleted(instance, old):
+    old = pick(old, counters.PAYMENT_STATE_FIELDS)
+    user_id = counters.user_of_payment(instance) if old else None
+    if user_id:
+        deltas = new_deltas()
+        add(deltas, user_id, counters.payment_part(old), -1)
+        counters.apply(deltas)
+
+
+bookings.on_save.append(booking_saved)
+bookings.on_delete.append(booking_deleted)
+payments.on_save.append(payment_saved)
+payments.on_delete.append(payment_deleted)
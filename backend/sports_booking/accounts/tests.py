@@ -1,6 +1,13 @@
-from django.test import override_settings
+from datetime import time, timedelta
+
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
 from rest_framework.test import APITestCase
 
+from bookings.models import Booking
+from clubs.models import Club, Sport
+
 from .models import User
 
 
@@ -41,3 +48,378 @@ class AdminLoginTests(APITestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertIn('access', response.data)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AdminDashboardTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_user(
+            username='admin', email='admin@example.com', mobile_number='9000000000',
+            password='AdminPass123', is_staff=True,
+        )
+        player = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        sport = Sport.objects.create(name='Badminton', club=club, price_per_hour=500)
+        for i, booking_status in enumerate(['confirmed', 'confirmed', 'pending', 'cancelled']):
+            Booking.objects.create(
+                user=player, club=club, sport=sport, date=timezone.now().date() + timedelta(days=2),
+                start_time=time(10 + i), end_time=time(11 + i), amount=500, status=booking_status,
+            )
+        Booking.objects.filter(status='cancelled').update(created_at=timezone.now() - timedelta(days=3))
+        self.client.force_authenticate(admin)
+
+    def test_stats_and_weekly_series(self):
+        data = self.client.get('/api/auth/admin/dashboard-stats/').data
+        self.assertEqual(
+            (data['total_bookings'], data['confirmed_bookings'], data['pending_bookings'], data['today_bookings']),
+            (4, 2, 1, 3),
+        )
+        self.assertEqual(data['active_users'], 1)
+        self.assertEqual([day['count'] for day in data['weekly_bookings']], [0, 0, 0, 0, 0, 0, 3])
+
+    def test_revenue_is_net_of_refunds(self):
+        from payments.models import Payment
+        for booking, final_status in zip(Booking.objects.filter(status='confirmed'), ('completed', 'refunded')):
+            payment = Payment.objects.create(
+                booking=booking, stripe_payment_intent_id=f'pi_{booking.pk}', amount=500, status='pending',
+            )
+            payment.mark_completed()
+            if final_status == 'refunded':
+                payment.mark_refunded()
+        data = self.client.get('/api/auth/admin/dashboard-stats/').data
+        # As the sum of completed payments always was: the refunded charge is not revenue
+        self.assertEqual((data['total_revenue'], data['total_refunded'], data['net_revenue']), (500, 500, 0))
+
+    def test_snapshot_is_shared_between_requests(self):
+        first = self.client.get('/api/auth/admin/dashboard-stats/').data
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/auth/admin/dashboard-stats/').data
+        self.assertEqual(first, second)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class QueueLatencyTests(APITestCase):
+    def setUp(self):
+        admin = User.objects.create_user(
+            username='admin', email='admin@example.com', mobile_number='9000000000',
+            password='AdminPass123', is_staff=True,
+        )
+        self.client.force_authenticate(admin)
+
+    def test_minutes_is_validated_and_clamped(self):
+        url = '/api/auth/admin/queue-latency/'
+        self.assertEqual(self.client.get(url, {'minutes': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'minutes': 0}).data['minutes'], 1)
+        self.assertEqual(self.client.get(url, {'minutes': 500}).data['minutes'], 60)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class MonthlyReportTests(APITestCase):
+    def setUp(self):
+        admin = User.objects.create_user(
+            username='admin', email='admin@example.com', mobile_number='9000000000',
+            password='AdminPass123', is_staff=True,
+        )
+        self.player = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        self.day = timezone.now().date().replace(day=10)
+        self.add_club('Arena')
+        self.client.force_authenticate(admin)
+
+    def add_club(self, name):
+        from payments.models import Payment
+        club = Club.objects.create(name=name, location='Pune', opening_time=time(6), closing_time=time(22))
+        for sport_name in ('Badminton', 'Tennis'):
+            sport = Sport.objects.create(name=sport_name, club=club, price_per_hour=500)
+            for i, booking_status in enumerate(['confirmed', 'refunded', 'cancelled']):
+                booking = Booking.objects.create(
+                    user=self.player, club=club, sport=sport, date=self.day + timedelta(days=i),
+                    start_time=time(10 + i), end_time=time(11 + i), amount=500, status='pending',
+                )
+                if booking_status != 'cancelled':
+                    payment = Payment.objects.create(
+                        booking=booking, stripe_payment_intent_id=f'pi_{booking.id}', amount=500, status='pending',
+                    )
+                    payment.mark_completed()
+                    if booking_status == 'refunded':
+                        payment.mark_refunded()
+                booking.status = booking_status
+                booking.save()
+
+    def report(self):
+        return self.client.get('/api/auth/admin/monthly-report/', {'month': self.day.month, 'year': self.day.year})
+
+    def test_figures(self):
+        data = self.report().data
+        self.assertEqual((data['total_bookings'], data['confirmed_bookings'], data['refunded_bookings']), (6, 2, 2))
+        # Gross is the completed payments (the refunded ones are not in it), as it always was
+        self.assertEqual((data['gross_revenue'], data['total_refunds'], data['net_revenue']), (1000, 1000, 0))
+        club = data['club_breakdown'][0]
+        self.assertEqual((club['gross_revenue'], club['refunds'], club['net_revenue']), (1000, 1000, 0))
+        self.assertEqual([(s['name'], s['bookings'], s['revenue']) for s in club['sports']],
+                         [('Badminton', 3, 500), ('Tennis', 3, 500)])
+        first_day = next(d for d in data['daily_data'] if d['date'] == str(self.day))
+        self.assertEqual((first_day['bookings'], first_day['confirmed'], first_day['revenue']), (2, 2, 1000))
+
+    def test_query_count_does_not_grow_with_clubs(self):
+        with self.assertNumQueries(4):
+            self.report()
+        self.add_club('Riverside')
+        self.add_club('Lakeside')
+        with self.assertNumQueries(4):
+            data = self.report().data
+        self.assertEqual(len(data['club_breakdown']), 3)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    EXPORT_CHUNK_SIZE=2,
+)
+class AdminExportTests(APITestCase):
+    def setUp(self):
+        from payments.models import Payment
+        admin = User.objects.create_user(
+            username='admin', email='admin@example.com', mobile_number='9000000000',
+            password='AdminPass123', is_staff=True,
+        )
+        player = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001',
+            password='UserPass123', first_name='Asha', last_name='Rao',
+        )
+        club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        sport = Sport.objects.create(name='Tennis', club=club, price_per_hour=500)
+        day = timezone.now().date()
+        for i, booking_status in enumerate(['confirmed', 'confirmed', 'cancelled', 'pending', 'confirmed']):
+            booking = Booking.objects.create(
+                user=player, club=club, sport=sport, date=day + timedelta(days=i),
+                start_time=time(10), end_time=time(11), amount=500, status=booking_status,
+            )
+            if booking_status == 'confirmed':
+                Payment.objects.create(
+                    booking=booking, stripe_payment_intent_id=f'pi_{i}', amount=500, status='completed',
+                )
+        self.day = day
+        self.client.force_authenticate(admin)
+
+    def export(self, path, **params):
+        response = self.client.get(f'/api/auth/admin/export/{path}/', params)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_bookings_csv(self):
+        response, body = self.export('bookings', fmt='csv', status='confirmed')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = body.splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'user_name', 'club_name'])
+        self.assertEqual(len(lines), 4)
+        self.assertIn('Asha Rao,Arena,Pune,Tennis', lines[1])
+        self.assertIn(',500.0,confirmed,card,', lines[1])
+
+    def test_csv_cells_are_not_read_as_formulas(self):
+        User.objects.filter(username='player').update(first_name='=HYPERLINK("http://x")', last_name='')
+        Club.objects.update(name='@SUM(A1)')
+        _, body = self.export('bookings', fmt='csv', status='confirmed')
+        self.assertIn('"\'=HYPERLINK(""http://x"")",\'@SUM(A1),Pune,', body.splitlines()[1])
+
+    def test_payments_ndjson_filtered_by_booking_date(self):
+        import json
+        _, body = self.export('payments', fmt='ndjson', date_from=str(self.day + timedelta(days=1)))
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(sorted(r['stripe_payment_intent_id'] for r in records), ['pi_1', 'pi_4'])
+        self.assertEqual(records[0]['amount'], 500.0)
+
+    def test_single_query_regardless_of_size(self):
+        # Auth is forced, so the only queries are the export's own chunked fetches
+        response = self.client.get('/api/auth/admin/export/bookings/', {'fmt': 'ndjson'})
+        with self.assertNumQueries(1):
+            self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 5)
+
+    def test_rejects_bad_filters(self):
+        self.assertEqual(self.client.get('/api/auth/admin/export/bookings/', {'fmt': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/auth/admin/export/payments/', {'date_to': 'soon'}).status_code, 400)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AdminKeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', mobile_number='9000000000',
+            password='AdminPass123', is_staff=True,
+        )
+        self.players = [
+            User.objects.create_user(
+                username=f'player{i}', email=f'player{i}@example.com', mobile_number=f'90000001{i:02d}',
+                password='UserPass123',
+            )
+            for i in range(5)
+        ]
+        club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        sport = Sport.objects.create(name='Tennis', club=club, price_per_hour=500)
+        day = timezone.now().date()
+        for i in range(7):
+            Booking.objects.create(
+                user=self.players[i % 5], club=club, sport=sport, date=day + timedelta(days=i),
+                start_time=time(10), end_time=time(11), amount=500,
+                status='cancelled' if i == 3 else 'confirmed',
+            )
+        # Identical timestamps must still page deterministically on the id tie-breaker
+        Booking.objects.update(created_at=timezone.now())
+        self.client.force_authenticate(self.admin)
+
+    def walk(self, path, **params):
+        seen, cursor = [], None
+        while True:
+            query = dict(params, page_size=3, **({'cursor': cursor} if cursor else {}))
+            data = self.client.get(path, query).data
+            seen.extend(row['id'] for row in data['results'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                return seen
+
+    def test_bookings_pages_cover_every_row_once(self):
+        seen = self.walk('/api/auth/admin/bookings/')
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(sorted(seen), sorted(str(pk) for pk in Booking.objects.values_list('id', flat=True)))
+
+    def test_bookings_filters_and_count(self):
+        self.assertEqual(len(self.walk('/api/auth/admin/bookings/', status='confirmed')), 6)
+        data = self.client.get('/api/auth/admin/bookings/', {'q': 'player0', 'include_count': 1}).data
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['results'][0]['payment_method'], 'card')
+
+    def test_bookings_page_query_count_is_constant(self):
+        first = self.client.get('/api/auth/admin/bookings/', {'page_size': 3}).data
+        with self.assertNumQueries(1):
+            self.client.get('/api/auth/admin/bookings/', {'page_size': 3, 'cursor': first['next_cursor']})
+
+    def test_users_pages_and_search(self):
+        self.assertEqual(sorted(self.walk('/api/auth/admin/users/')), sorted(u.id for u in [self.admin] + self.players))
+        data = self.client.get('/api/auth/admin/users/', {'q': '9000000102'}).data
+        self.assertEqual([(u['username'], u['total_bookings']) for u in data['results']], [('player2', 1)])
+        self.assertEqual(len(self.client.get('/api/auth/admin/users/', {'is_staff': 'true'}).data['results']), 1)
+
+    def test_rejects_bad_cursor(self):
+        self.assertEqual(self.client.get('/api/auth/admin/bookings/', {'cursor': 'nope'}).status_code, 400)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class UserCounterTests(APITestCase):
+    def setUp(self):
+        self.player = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        self.sport = Sport.objects.create(name='Tennis', club=club, price_per_hour=500)
+        self.club = club
+
+    def book(self, i, booking_status='pending'):
+        return Booking.objects.create(
+            user=self.player, club=self.club, sport=self.sport, date=timezone.now().date() + timedelta(days=i),
+            start_time=time(10), end_time=time(11), amount=500, status=booking_status,
+        )
+
+    def counters(self):
+        from .counters import COUNTERS
+        return User.objects.filter(pk=self.player.pk).values_list(*COUNTERS).get()
+
+    def test_transitions_update_counters(self):
+        from payments.models import Payment
+        first, second = self.book(0), self.book(1)
+        self.assertEqual(self.counters(), (2, 0, 0, 0))
+
+        payment = Payment.objects.create(booking=first, stripe_payment_intent_id='pi_1', amount=500, status='pending')
+        payment.mark_completed()
+        first.status = 'confirmed'
+        first.save()
+        self.assertEqual(self.counters(), (2, 1, 0, 500))
+
+        payment.mark_refunded()
+        first.status = 'refunded'
+        first.save()
+        second.delete()
+        self.assertEqual(self.counters(), (1, 0, 1, 0))
+
+    def test_bulk_update_inside_refreshing(self):
+        from reports.rollups import refreshing
+        self.book(0), self.book(1)
+        bookings = Booking.objects.filter(user=self.player)
+        with refreshing(bookings):
+            bookings.update(status='cancelled')
+        self.assertEqual(self.counters(), (2, 0, 2, 0))
+
+    def test_repair_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        self.book(0, 'confirmed')
+        User.objects.filter(pk=self.player.pk).update(booking_count=7, confirmed_booking_count=0)
+        out = StringIO()
+        call_command('repair_user_counters', '--dry-run', stdout=out)
+        self.assertIn('booking_count: stored 7, expected 1', out.getvalue())
+        call_command('repair_user_counters', stdout=StringIO())
+        self.assertEqual(self.counters(), (1, 1, 0, 0))
+
+    def test_full_save_of_a_loaded_user_keeps_counters(self):
+        stale = User.objects.get(pk=self.player.pk)
+        self.book(0, 'confirmed')
+        stale.first_name = 'Asha'
+        stale.set_password('NewPass123')
+        stale.save()
+        self.assertEqual(self.counters(), (1, 1, 0, 0))
+        self.assertEqual(User.objects.get(pk=self.player.pk).first_name, 'Asha')
+
+    def test_payment_transition_loads_its_booking_once(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from payments.models import Payment
+        booking = self.book(0)
+        Payment.objects.create(booking=booking, stripe_payment_intent_id='pi_1', amount=500, status='pending')
+        payment = Payment.objects.get(booking=booking)
+        with CaptureQueriesContext(connection) as queries:
+            payment.mark_completed()
+        booking_reads = [q for q in queries.captured_queries if q['sql'].startswith('SELECT') and 'FROM "bookings"' in q['sql']]
+        self.assertEqual(len(booking_reads), 1)
+
+    def test_nightly_verification_fixes_counters(self):
+        from reports.tasks import verify_daily_rollups
+        self.book(0, 'confirmed')
+        User.objects.filter(pk=self.player.pk).update(booking_count=7)
+        verify_daily_rollups()
+        self.assertEqual(self.counters(), (1, 1, 0, 0))
+
+    def test_admin_user_list_reads_counters(self):
+        admin = User.objects.create_user(
+            username='admin', email='admin@example.com', mobile_number='9000000000',
+            password='AdminPass123', is_staff=True,
+        )
+        self.book(0, 'confirmed')
+        self.client.force_authenticate(admin)
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/auth/admin/users/').data
+        row = next(u for u in data['results'] if u['username'] == 'player')
+        self.assertEqual((row['total_bookings'], row['confirmed_bookings']), (1, 1))
+
+
+class DerivedWriteAtomicityTests(TransactionTestCase):
+    """Outside a test transaction, so Booking.save() opens the outermost block as it does under autocommit."""
+
+    def test_derived_writes_roll_back_with_the_booking(self):
+        from unittest import mock
+        from .counters import COUNTERS
+        player = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        sport = Sport.objects.create(name='Tennis', club=club, price_per_hour=500)
+        booking = Booking.objects.create(
+            user=player, club=club, sport=sport, date=timezone.now().date() + timedelta(days=1),
+            start_time=time(10), end_time=time(11), amount=500, status='pending',
+        )
+        booking.status = 'confirmed'
+        with mock.patch('reports.rollups.apply', side_effect=RuntimeError('rollup write failed')):
+            with self.assertRaises(RuntimeError):
+                booking.save()
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'pending')
+        self.assertEqual(User.objects.filter(pk=player.pk).values_list(*COUNTERS).get(), (1, 0, 0, 0))
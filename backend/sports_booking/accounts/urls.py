@@ -33,9 +33,16 @@ urlpatterns = [
     # Admin — stats & bookings
     path('admin/dashboard-stats/', views.dashboard_stats, name='dashboard_stats'),
     path('admin/monthly-report/', views.monthly_report, name='monthly_report'),
+    path('admin/activity/', views.activity_feed, name='admin_activity_feed'),
+    path('admin/analytics/heatmap/', views.occupancy_heatmap, name='admin_occupancy_heatmap'),
+    path('admin/reports/', views.submit_report, name='admin_submit_report'),
+    path('admin/reports/<int:job_id>/', views.report_job_detail, name='admin_report_job_detail'),
     path('admin/bookings/', views.all_bookings, name='admin_all_bookings'),
+    path('admin/export/bookings/', views.export_bookings, name='admin_export_bookings'),
+    path('admin/export/payments/', views.export_payments, name='admin_export_payments'),
     path('admin/bookings/<uuid:booking_id>/status/', views.update_booking_status, name='update_booking_status'),
     path('admin/users/', views.all_users, name='admin_all_users'),
+    path('admin/queue-latency/', views.queue_latency, name='admin_queue_latency'),
     path('admin-login/', views.admin_login, name='admin_login'),
 
     # Admin clubs endpoints
@@ -2,8 +2,8 @@ import secrets
 import logging
 
 from django.conf import settings
-from django.core.paginator import Paginator
 from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from datetime import timedelta
 
@@ -20,6 +20,12 @@ from clubs.models import Club
 from clubs.serializers import ClubSerializer
 from bookings.models import Booking
 from bookings.tasks import send_otp_sms_task, send_welcome_email_task
+from common.metrics import latency_summary
+from common.pagination import approximate_count, keyset_page, tail_page
+from common.snapshot import snapshot
+from reports import builders, exports, jobs as report_jobs
+from reports.activity import FEED_SIZE
+from reports.models import ActivityEvent, ReportJob
 
 from .models import OTP
 from .serializers import (
@@ -251,203 +257,202 @@ class ChangePasswordView(APIView):
 # Admin views
 # ---------------------------------------------------------------------------
 
-@api_view(['GET'])
-@permission_classes([IsAdminUser])
-def dashboard_stats(request):
+def _relative_time(ts):
+    delta = timezone.now() - ts
+    if delta.total_seconds() < 60:
+        return "Just now"
+    if delta.total_seconds() < 3600:
+        return f"{int(delta.total_seconds()//60)}m ago"
+    if delta.days == 0:
+        return f"{int(delta.total_seconds()//3600)}h ago"
+    return ts.strftime('%d %b, %I:%M %p')
+
+
+def _activity_row(event):
+    return {
+        'id': event.id, 'type': event.type, 'message': event.message,
+        'time': _relative_time(event.occurred_at), 'occurred_at': event.occurred_at.isoformat(),
+        'amount': float(event.amount) if event.amount is not None else None,
+    }
+
+
+def _dashboard_payload():
     from bookings.models import Booking
-    from payments.models import Payment
-    from clubs.models import Club, Sport
-    from django.db.models import Sum
+    from payments.ledger import totals
+    from django.db.models import Count, Q
+    from django.db.models.functions import TruncDate
 
     today = timezone.now().date()
 
-    total_bookings = Booking.objects.count()
-    confirmed_bookings = Booking.objects.filter(status='confirmed').count()
-    pending_bookings = Booking.objects.filter(status='pending').count()
-    today_bookings = Booking.objects.filter(created_at__date=today).count()
+    # Every booking count in one conditional-aggregation pass
+    counts = Booking.objects.aggregate(
+        total_bookings=Count('id'),
+        confirmed_bookings=Count('id', filter=Q(status='confirmed')),
+        pending_bookings=Count('id', filter=Q(status='pending')),
+        today_bookings=Count('id', filter=Q(created_at__date=today)),
+    )
     active_users = User.objects.filter(is_active=True, is_staff=False).count()
 
-    total_earned = Payment.objects.filter(status='completed').aggregate(total=Sum('amount'))['total'] or 0
-    total_refunded = Payment.objects.filter(status='refunded').aggregate(total=Sum('amount'))['total'] or 0
+    # From the ledger's daily balances: one pass over days, not payments.
+    # Same meaning as before the ledger: revenue is what was charged and
+    # not refunded (the completed payments), net takes the refunds off again.
+    ledger = totals()
+    total_earned = ledger['net']
+    total_refunded = ledger['refunds']
     net_revenue = float(total_earned) - float(total_refunded)
 
+    week_start = today - timedelta(days=6)
+    per_day = dict(
+        Booking.objects.filter(
+            created_at__date__gte=week_start, status__in=['confirmed', 'pending', 'refunded']
+        ).annotate(day=TruncDate('created_at')).values('day')
+        .annotate(count=Count('id')).values_list('day', 'count')
+    )
     weekly_bookings = []
     for i in range(6, -1, -1):
         day = today - timedelta(days=i)
-        count = Booking.objects.filter(created_at__date=day, status__in=['confirmed', 'pending', 'refunded']).count()
-        weekly_bookings.append({'date': str(day), 'label': day.strftime('%a'), 'count': count})
-
-    recent_activities = []
-
-    for b in Booking.objects.select_related('user', 'club', 'sport').order_by('-updated_at')[:15]:
-        if b.status == 'confirmed':
-            msg = f"{b.user.get_full_name() or b.user.username} booked {b.sport.name} at {b.club.name}"
-            atype = 'confirmed'
-        elif b.status == 'refunded':
-            msg = f"Refund for {b.user.get_full_name() or b.user.username} — {b.club.name}"
-            atype = 'refunded'
-        elif b.status == 'cancelled':
-            msg = f"{b.user.get_full_name() or b.user.username} cancelled at {b.club.name}"
-            atype = 'cancelled'
-        elif b.status == 'pending':
-            msg = f"{b.user.get_full_name() or b.user.username} initiated booking at {b.club.name}"
-            atype = 'pending'
-        else:
-            continue
-        delta = timezone.now() - b.updated_at
-        ts = b.updated_at.strftime('%d %b, %I:%M %p')
-        if delta.total_seconds() < 60:
-            ts = "Just now"
-        elif delta.total_seconds() < 3600:
-            ts = f"{int(delta.total_seconds()//60)}m ago"
-        elif delta.days == 0:
-            ts = f"{int(delta.total_seconds()//3600)}h ago"
-        recent_activities.append({'type': atype, 'message': msg, 'time': ts,
-            'amount': float(b.amount) if b.status in ['confirmed', 'refunded'] else None,
-            'sort_key': b.updated_at.timestamp()})
-
-    for club in Club.objects.order_by('-created_at')[:5]:
-        delta = timezone.now() - club.created_at
-        ts = club.created_at.strftime('%d %b, %I:%M %p')
-        if delta.total_seconds() < 60:
-            ts = "Just now"
-        elif delta.total_seconds() < 3600:
-            ts = f"{int(delta.total_seconds()//60)}m ago"
-        elif delta.days == 0:
-            ts = f"{int(delta.total_seconds()//3600)}h ago"
-        recent_activities.append({'type': 'club_added',
-            'message': f"New club added: {club.name} — {club.location}",
-            'time': ts, 'amount': None, 'sort_key': club.created_at.timestamp()})
-
-    for sport in Sport.objects.select_related('club').order_by('-id')[:5]:
-        recent_activities.append({'type': 'sport_added',
-            'message': f"Sport added: {sport.name} at {sport.club.name} (₹{sport.price_per_hour}/hr)",
-            'time': 'Recently', 'amount': None, 'sort_key': 0})
-
-    recent_activities.sort(key=lambda x: x.get('sort_key', 0), reverse=True)
-    for a in recent_activities:
-        a.pop('sort_key', None)
+        weekly_bookings.append({'date': str(day), 'label': day.strftime('%a'), 'count': per_day.get(day, 0)})
 
-    return Response({
-        'total_bookings': total_bookings, 'confirmed_bookings': confirmed_bookings,
-        'pending_bookings': pending_bookings, 'today_bookings': today_bookings,
+    recent_activities = [
+        _activity_row(event) for event in ActivityEvent.objects.order_by('-occurred_at', '-id')[:FEED_SIZE]
+    ]
+
+    return {
+        **counts,
         'active_users': active_users, 'total_revenue': float(total_earned),
         'total_refunded': float(total_refunded), 'net_revenue': round(net_revenue, 2),
-        'weekly_bookings': weekly_bookings, 'recent_activities': recent_activities[:20],
-    })
+        'weekly_bookings': weekly_bookings, 'recent_activities': recent_activities,
+    }
 
 
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
-def monthly_report(request):
-    from bookings.models import Booking
-    from payments.models import Payment
-    from clubs.models import Club
-    from django.db.models import Sum
-    from datetime import date
-    from calendar import monthrange
+def dashboard_stats(request):
+    # One computation per DASHBOARD_SNAPSHOT_TTL however many admins are watching
+    return Response(snapshot(
+        'admin:dashboard_stats', getattr(settings, 'DASHBOARD_SNAPSHOT_TTL', 5), _dashboard_payload
+    ))
+
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def monthly_report(request):
+    """
+    Month summary per club, sport and day (reports.builders). Closed
+    months are served from their stored result (reports.jobs.cached_report).
+    For months that take long to build, submit a report job instead
+    (admin/reports/).
+    """
     today = timezone.now().date()
     try:
         month = int(request.query_params.get('month', today.month))
         year = int(request.query_params.get('year', today.year))
+        builders.month_bounds(year, month)
     except ValueError:
         return Response({'error': 'month and year must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(report_jobs.cached_report('monthly', {'year': year, 'month': month}))
 
-    _, last_day = monthrange(year, month)
-    start_date = date(year, month, 1)
-    end_date = date(year, month, last_day)
-
-    month_bookings = Booking.objects.filter(
-        date__gte=start_date, date__lte=end_date,
-        status__in=['confirmed', 'refunded', 'cancelled']
-    ).select_related('user', 'club', 'sport')
-
-    club_breakdown = []
-    for club in Club.objects.prefetch_related('sports'):
-        cb = month_bookings.filter(club=club)
-        if not cb.exists():
-            continue
-        revenue = Payment.objects.filter(booking__club=club, booking__date__gte=start_date,
-            booking__date__lte=end_date, status='completed').aggregate(total=Sum('amount'))['total'] or 0
-        refunds = Payment.objects.filter(booking__club=club, booking__date__gte=start_date,
-            booking__date__lte=end_date, status='refunded').aggregate(total=Sum('amount'))['total'] or 0
-        sports_data = []
-        for s in club.sports.filter(is_active=True):
-            sb = cb.filter(sport=s)
-            if sb.exists():
-                sr = Payment.objects.filter(booking__club=club, booking__sport=s,
-                    booking__date__gte=start_date, booking__date__lte=end_date,
-                    status='completed').aggregate(total=Sum('amount'))['total'] or 0
-                sports_data.append({'name': s.name, 'bookings': sb.count(), 'revenue': float(sr)})
-        club_breakdown.append({
-            'club_name': club.name, 'location': club.location,
-            'total_bookings': cb.count(), 'confirmed': cb.filter(status='confirmed').count(),
-            'refunded': cb.filter(status='refunded').count(), 'cancelled': cb.filter(status='cancelled').count(),
-            'gross_revenue': float(revenue), 'refunds': float(refunds),
-            'net_revenue': float(revenue) - float(refunds), 'sports': sports_data
-        })
 
-    daily_data = []
-    current = start_date
-    while current <= end_date:
-        db = month_bookings.filter(date=current)
-        dr = Payment.objects.filter(booking__date=current, status='completed').aggregate(
-            total=Sum('amount'))['total'] or 0
-        daily_data.append({'date': str(current), 'day': current.strftime('%a %d'),
-            'bookings': db.count(), 'confirmed': db.filter(status='confirmed').count(), 'revenue': float(dr)})
-        current += timedelta(days=1)
-
-    total_rev = Payment.objects.filter(booking__date__gte=start_date, booking__date__lte=end_date,
-        status='completed').aggregate(total=Sum('amount'))['total'] or 0
-    total_ref = Payment.objects.filter(booking__date__gte=start_date, booking__date__lte=end_date,
-        status='refunded').aggregate(total=Sum('amount'))['total'] or 0
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def occupancy_heatmap(request):
+    """
+    Admin: weekday x hour occupancy, revenue per court-hour and
+    cancellation rate per club and sport over ?start=&end= (default: the
+    last 12 weeks), optionally for one ?club= or ?sport=.
+    """
+    from datetime import date
+    from reports import heatmap
 
-    return Response({
-        'month': month, 'year': year, 'month_name': start_date.strftime('%B %Y'),
-        'total_bookings': month_bookings.count(),
-        'confirmed_bookings': month_bookings.filter(status='confirmed').count(),
-        'cancelled_bookings': month_bookings.filter(status='cancelled').count(),
-        'refunded_bookings': month_bookings.filter(status='refunded').count(),
-        'gross_revenue': float(total_rev), 'total_refunds': float(total_ref),
-        'net_revenue': float(total_rev) - float(total_ref),
-        'club_breakdown': club_breakdown, 'daily_data': daily_data,
-    })
+    today = timezone.localdate()
+    try:
+        end = date.fromisoformat(request.query_params.get('end', str(today)))
+        start = date.fromisoformat(request.query_params.get('start', str(end - timedelta(weeks=12) + timedelta(days=1))))
+        club_id = int(request.query_params['club']) if request.query_params.get('club') else None
+        sport_id = int(request.query_params['sport']) if request.query_params.get('sport') else None
+    except ValueError:
+        return Response({'error': 'start/end must be dates (YYYY-MM-DD), club/sport integers'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if end < start or (end - start).days >= settings.REPORT_MAX_RANGE_DAYS:
+        return Response({'error': f'Range must be 1 to {settings.REPORT_MAX_RANGE_DAYS} days'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(snapshot(
+        f'admin:heatmap:{start}:{end}:{club_id}:{sport_id}', settings.HEATMAP_SNAPSHOT_TTL,
+        lambda: heatmap.build(start, end, club_id, sport_id),
+    ))
+
+
+def _report_job_row(job):
+    return {
+        'job_id': job.id,
+        'kind': job.kind,
+        'params': job.params,
+        'status': job.status,
+        'is_final': job.is_final,
+        'completed_at': job.completed_at.isoformat() if job.completed_at else None,
+        'error': job.last_error or None,
+        # While a stale result is being rebuilt the previous one stays readable
+        'result': job.result,
+    }
 
 
-@api_view(['GET'])
+@api_view(['POST'])
 @permission_classes([IsAdminUser])
-def all_bookings(request):
-    """Admin: list all bookings with payment method included (paginated)"""
-    from bookings.models import Booking
-    from payments.models import Payment
+def submit_report(request):
+    """
+    Admin: queue a report ({"kind": "monthly", "year", "month"} or
+    {"kind": "range", "start", "end"}). Identical submissions share one
+    job; 200 with the stored result when it is ready, otherwise 202 and
+    poll admin/reports/<job_id>/.
+    """
+    try:
+        kind, params = report_jobs.parse(request.data)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    bookings = Booking.objects.select_related(
-        'user', 'club', 'sport', 'payment'
-    ).order_by('-created_at')
+    job = report_jobs.submit(kind, params, requested_by=request.user)
+    ready = job.status == 'succeeded'
+    return Response(_report_job_row(job), status=status.HTTP_200_OK if ready else status.HTTP_202_ACCEPTED)
 
-    page_size = min(int(request.query_params.get('page_size', 50)), 200)
-    page_number = int(request.query_params.get('page', 1))
-    paginator = Paginator(bookings, page_size)
-    page = paginator.get_page(page_number)
 
-    payment_map = {
-        p.booking_id: p.payment_method
-        for p in Payment.objects.filter(booking__in=page.object_list).values_list(
-            'booking_id', 'payment_method', named=True)
-    }
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def report_job_detail(request, job_id):
+    """Admin: status and (once built) result of a report job"""
+    try:
+        job = ReportJob.objects.get(id=job_id)
+    except ReportJob.DoesNotExist:
+        return Response({'error': 'Report job not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(_report_job_row(job))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def all_bookings(request):
+    """
+    Admin: bookings newest first with payment method included. Keyset
+    paginated (?cursor= from the previous page's next_cursor), filterable
+    by status, club, sport, date_from/date_to and q (user or club prefix);
+    ?include_count=1 adds an approximate total.
+    """
+    try:
+        bookings = Booking.objects.filter(**exports.booking_filters(request.query_params))
+        if request.query_params.get('q'):
+            bookings = bookings.filter(exports.booking_search(request.query_params['q']))
+        page, next_cursor = keyset_page(
+            bookings.select_related('user', 'club', 'sport', 'payment'),
+            request.query_params, 'created_at',
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     data = []
-    for b in page.object_list:
-        method = ''
+    for b in page:
         try:
-            method = (b.payment.payment_method or '').strip()
-        except Exception:
-            pass
-        if not method:
-            method = (payment_map.get(b.id) or '').strip()
-        if not method and b.status in ('confirmed', 'refunded'):
-            method = 'card'
+            method = b.payment.payment_method
+        except Booking.payment.RelatedObjectDoesNotExist:
+            method = ''
 
         data.append({
             'id': str(b.id),
@@ -460,26 +465,56 @@ def all_bookings(request):
             'end_time': str(b.end_time),
             'amount': float(b.amount),
             'status': b.status,
-            'payment_method': method or None,
+            'payment_method': exports.payment_method(method, b.status),
             'created_at': b.created_at.isoformat(),
         })
 
-    return Response({
-        'count': paginator.count,
-        'num_pages': paginator.num_pages,
-        'page': page.number,
-        'results': data,
-    })
+    response = {'results': data, 'next_cursor': next_cursor}
+    if request.query_params.get('include_count'):
+        response['count'] = approximate_count(bookings)
+    return Response(response)
+
+
+def _export(request, kind, rows, columns):
+    fmt = request.query_params.get('fmt', 'csv')
+    if fmt not in exports.FORMATS:
+        return Response({'error': 'Invalid fmt. Must be: csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        records = rows(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(
+        exports.encode(records, columns, fmt), content_type=exports.FORMATS[fmt]
+    )
+    stamp = timezone.localtime().strftime('%Y%m%d-%H%M')
+    response['Content-Disposition'] = f'attachment; filename="{kind}-{stamp}.{fmt}"'
+    # Let proxies pass chunks straight through instead of buffering the export
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_bookings(request):
+    """Admin: stream every booking matching the all_bookings filters as CSV or NDJSON (?fmt=)"""
+    return _export(request, 'bookings', exports.booking_rows, exports.BOOKING_COLUMNS)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_payments(request):
+    """Admin: stream every payment whose booking matches the all_bookings filters as CSV or NDJSON (?fmt=)"""
+    return _export(request, 'payments', exports.payment_rows, exports.PAYMENT_COLUMNS)
 
 
 @api_view(['PATCH'])
 @permission_classes([IsAdminUser])
 def update_booking_status(request, booking_id):
     """Update booking status by admin"""
-    from bookings.tasks import send_booking_status_update
+    from notifications.outbox import enqueue_booking_status_update
 
     try:
-        booking = Booking.objects.get(id=booking_id)
         new_status = request.data.get('status')
 
         if new_status not in ['pending', 'confirmed', 'cancelled', 'completed']:
@@ -488,12 +523,14 @@ def update_booking_status(request, booking_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        old_status = booking.status
-        booking.status = new_status
-        booking.save()
+        with transaction.atomic():
+            booking = Booking.objects.select_for_update().get(id=booking_id)
+            old_status = booking.status
+            booking.status = new_status
+            booking.save()
 
-        if old_status != new_status:
-            send_booking_status_update.delay(booking.id, new_status)
+            if old_status != new_status:
+                enqueue_booking_status_update(booking, new_status)
 
         logger.info(f"Admin updated booking {booking_id} status: {old_status} -> {new_status}")
 
@@ -514,13 +551,28 @@ def update_booking_status(request, booking_id):
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def all_users(request):
-    """Get all users for admin (paginated)"""
-    users = User.objects.all().order_by('-date_joined')
+    """
+    Admin: users newest first. Keyset paginated (?cursor=), filterable by
+    is_staff, is_active and q (username, email or mobile prefix);
+    ?include_count=1 adds an approximate total.
+    """
+    from django.db.models import Q
+
+    users = User.objects.all()
+    for flag in ('is_staff', 'is_active'):
+        value = request.query_params.get(flag)
+        if value is not None:
+            users = users.filter(**{flag: value.lower() in ('1', 'true', 'yes')})
+    q = request.query_params.get('q', '').strip()
+    if q:
+        users = users.filter(
+            Q(username__istartswith=q) | Q(email__istartswith=q) | Q(mobile_number__startswith=q)
+        )
 
-    page_size = min(int(request.query_params.get('page_size', 50)), 200)
-    page_number = int(request.query_params.get('page', 1))
-    paginator = Paginator(users, page_size)
-    page = paginator.get_page(page_number)
+    try:
+        page, next_cursor = keyset_page(users, request.query_params, 'date_joined')
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     data = [{
         'id': u.id,
@@ -534,14 +586,66 @@ def all_users(request):
         'is_active': u.is_active,
         'is_mobile_verified': u.is_mobile_verified,
         'date_joined': u.date_joined,
-        'total_bookings': u.bookings.count()
-    } for u in page.object_list]
+        'total_bookings': u.booking_count,
+        'confirmed_bookings': u.confirmed_booking_count,
+        'cancelled_bookings': u.cancelled_booking_count,
+        'total_spent': float(u.total_spent),
+    } for u in page]
+
+    response = {'results': data, 'next_cursor': next_cursor}
+    if request.query_params.get('include_count'):
+        response['count'] = approximate_count(users)
+    return Response(response)
 
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def activity_feed(request):
+    """
+    Admin: activity events newest first. ?cursor= pages back through
+    older events; ?since=<latest_cursor from an earlier response> returns
+    the events recorded after it instead, oldest first and at most a page
+    of them, with latest_cursor advanced to the last one returned (call
+    again with it until the results come back empty).
+    """
+    events = ActivityEvent.objects.all()
+    since = request.query_params.get('since')
+    try:
+        if since:
+            page, latest_cursor = tail_page(events, request.query_params, since, default_size=FEED_SIZE)
+            next_cursor = None
+        else:
+            page, next_cursor = keyset_page(events, request.query_params, 'occurred_at', default_size=FEED_SIZE)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not since:
+        # A fresh read starts the tail at the newest event seen; paging back doesn't set it
+        latest_cursor = None
+        if page and not request.query_params.get('cursor'):
+            latest_cursor = str(max(event.pk for event in page))
     return Response({
-        'count': paginator.count,
-        'num_pages': paginator.num_pages,
-        'page': page.number,
-        'results': data,
+        'results': [_activity_row(event) for event in page],
+        'next_cursor': next_cursor,
+        'latest_cursor': latest_cursor,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def queue_latency(request):
+    """Celery wait-time percentiles (ms) per queue over the last N minutes"""
+    try:
+        minutes = int(request.query_params.get('minutes', 5))
+    except ValueError:
+        return Response({'error': 'minutes must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    minutes = max(1, min(minutes, 60))
+    return Response({
+        'minutes': minutes,
+        'queues': {
+            queue: latency_summary(f'celery.queue.{queue}', minutes=minutes)
+            for queue in (q.name for q in settings.CELERY_TASK_QUEUES)
+        },
     })
 
 
@@ -1,5 +1,11 @@
 from django.contrib import admin
+from django.db import transaction
 from django.utils import timezone
+from payments.models import Payment
+from payments.refunds import enqueue_refunds
+from notifications.outbox import enqueue_waitlist_notifications
+from notifications.reminders import sync_booking_reminders
+from reports.rollups import refreshing
 from .models import Booking, SlotWaitlist, SlotLock
 
 
@@ -32,23 +38,50 @@ class BookingAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user', 'club', 'sport', 'lock')
 
-    actions = ['mark_confirmed', 'mark_cancelled', 'mark_completed']
+    actions = ['mark_confirmed', 'mark_cancelled', 'mark_completed', 'cancel_and_refund']
 
     def mark_confirmed(self, request, queryset):
-        updated = queryset.update(status='confirmed')
+        with refreshing(queryset):
+            updated = queryset.update(status='confirmed')
+        sync_booking_reminders(queryset)
         self.message_user(request, f'{updated} bookings marked as confirmed.')
     mark_confirmed.short_description = 'Mark selected bookings as confirmed'
 
     def mark_cancelled(self, request, queryset):
-        updated = queryset.update(status='cancelled')
+        with refreshing(queryset):
+            updated = queryset.update(status='cancelled')
+        sync_booking_reminders(queryset)
         self.message_user(request, f'{updated} bookings marked as cancelled.')
     mark_cancelled.short_description = 'Mark selected bookings as cancelled'
 
     def mark_completed(self, request, queryset):
-        updated = queryset.update(status='completed')
+        with refreshing(queryset):
+            updated = queryset.update(status='completed')
+        sync_booking_reminders(queryset)
         self.message_user(request, f'{updated} bookings marked as completed.')
     mark_completed.short_description = 'Mark selected bookings as completed'
 
+    def cancel_and_refund(self, request, queryset):
+        # Rain days / closures: refunds are queued, not issued inline, so
+        # this returns at once however many bookings are selected.
+        booking_ids = list(queryset.filter(status__in=['pending', 'confirmed']).values_list('id', flat=True))
+        bookings = Booking.objects.filter(id__in=booking_ids)
+        reason = 'Cancelled by the club'
+        with transaction.atomic(), refreshing(bookings):
+            payments = list(Payment.objects.filter(booking__in=booking_ids, status='completed'))
+            queued = enqueue_refunds(payments, reason=reason, requested_by=request.user)
+            paid_ids = [p.booking_id for p in payments]
+            now = timezone.now()
+            bookings.filter(id__in=paid_ids).update(status='refunded', cancellation_reason=reason, cancelled_at=now)
+            bookings.exclude(id__in=paid_ids).update(status='cancelled', cancellation_reason=reason, cancelled_at=now)
+            sync_booking_reminders(bookings)
+            # Same as BookingViewSet.cancel: each freed slot goes out to
+            # its waitlist via the outbox.
+            for slot in bookings.values_list('club_id', 'sport_id', 'date', 'start_time').order_by().distinct():
+                enqueue_waitlist_notifications(*slot)
+        self.message_user(request, f'{len(booking_ids)} bookings cancelled, {queued} refunds queued.')
+    cancel_and_refund.short_description = 'Cancel selected bookings and refund payments'
+
 
 @admin.register(SlotLock)
 class SlotLockAdmin(admin.ModelAdmin):
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
@@ -81,11 +81,25 @@ class Booking(models.Model):
             models.Index(fields=['user', 'status']),
             models.Index(fields=['date', 'club']),
             models.Index(fields=['status', 'date']),
+            # Admin list keyset pagination, unfiltered and filtered
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['club', 'created_at']),
         ]
 
     def __str__(self):
         return f"{self.user.username} - {self.club.name} - {self.date}"
 
+    # Signal receivers keep derived rows (rollups, user counters, activity,
+    # reminders) in step: they commit or roll back together with the row.
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            return super().delete(*args, **kwargs)
+
     def clean(self):
         super().clean()
 
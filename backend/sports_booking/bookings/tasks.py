@@ -1,6 +1,7 @@
 from celery import shared_task
 from common.email_utils import send_resend_email
-from django.conf import settings
+from common.sms_utils import send_twilio_sms, twilio_configured
+from notifications.rendering import booking_context, render, user_context
 from django.utils import timezone
 from datetime import timedelta
 import logging
@@ -20,28 +21,9 @@ def send_booking_confirmation_email(booking_id):
             logger.info(f"No email for user {user.username}, skipping confirmation email")
             return "No email address"
 
-        subject = f'Booking Confirmed - {booking.club.name}'
-        message = f"""
-Dear {user.first_name or user.username},
+        rendered = render('booking_confirmation', booking_context(booking, user))
 
-Your booking has been confirmed!
-
-Booking Details:
-- Club: {booking.club.name}
-- Sport: {booking.sport.name}
-- Date: {booking.date}
-- Time: {booking.start_time} - {booking.end_time}
-- Amount: ₹{booking.amount}
-
-Please arrive 15 minutes before your slot time.
-
-Thank you for booking with Sports Club!
-
-Best regards,
-Sports Club Team
-        """
-
-        result = send_resend_email(subject, message, user.email)
+        result = send_resend_email(rendered.subject, rendered.text, user.email, html=rendered.html)
         if result:
             logger.info(f"Confirmation email sent to {user.email} for booking {booking_id}")
             return f"Email sent to {user.email}"
@@ -66,26 +48,16 @@ def send_booking_confirmation_sms(booking_id):
             logger.info(f"No mobile for user {user.username}, skipping SMS")
             return "No mobile number"
 
-        twilio_sid = getattr(settings, 'TWILIO_ACCOUNT_SID', None)
-        twilio_token = getattr(settings, 'TWILIO_AUTH_TOKEN', None)
-        twilio_from = getattr(settings, 'TWILIO_PHONE_NUMBER', None)
-
-        if not all([twilio_sid, twilio_token, twilio_from]) or twilio_sid == 'None':
+        if not twilio_configured():
             logger.info(f"Twilio not configured, skipping SMS for booking {booking_id}")
             return "Twilio not configured"
 
-        from twilio.rest import Client
-        client = Client(twilio_sid, twilio_token)
-        message = client.messages.create(
-            body=(
-                f"Booking Confirmed! {booking.club.name} - {booking.sport.name} "
-                f"on {booking.date} at {booking.start_time}. Amount: ₹{booking.amount}"
-            ),
-            from_=twilio_from,
-            to=f"+91{user.mobile_number}"
-        )
+        rendered = render('booking_confirmation', booking_context(booking, user))
+        sid = send_twilio_sms(rendered.sms, user.mobile_number)
+        if not sid:
+            return "Send failed"
         logger.info(f"SMS sent to {user.mobile_number} for booking {booking_id}")
-        return f"SMS sent: {message.sid}"
+        return f"SMS sent: {sid}"
 
     except Exception as e:
         logger.error(f"Failed to send SMS for booking {booking_id}: {e}")
@@ -96,22 +68,14 @@ def send_booking_confirmation_sms(booking_id):
 def send_otp_sms_task(mobile_number, otp_code):
     """Send OTP via SMS"""
     try:
-        twilio_sid = getattr(settings, 'TWILIO_ACCOUNT_SID', None)
-        twilio_token = getattr(settings, 'TWILIO_AUTH_TOKEN', None)
-        twilio_from = getattr(settings, 'TWILIO_PHONE_NUMBER', None)
-
-        if not all([twilio_sid, twilio_token, twilio_from]) or twilio_sid == 'None':
+        if not twilio_configured():
             logger.info(f"DEV OTP for {mobile_number}: {otp_code}")
             return "Dev mode - OTP logged"
 
-        from twilio.rest import Client
-        client = Client(twilio_sid, twilio_token)
-        message = client.messages.create(
-            body=f"Your Sports Club OTP is: {otp_code}. Valid for 10 minutes.",
-            from_=twilio_from,
-            to=f"+91{mobile_number}"
-        )
-        return f"OTP SMS sent: {message.sid}"
+        sid = send_twilio_sms(render('otp', {'otp_code': otp_code}).sms, mobile_number)
+        if not sid:
+            return "Send failed"
+        return f"OTP SMS sent: {sid}"
 
     except Exception as e:
         logger.error(f"Error sending OTP SMS to {mobile_number}: {e}")
@@ -129,17 +93,8 @@ def send_welcome_email_task(user_id):
         if not user.email:
             return "No email address"
 
-        message = f"""
-Dear {user.first_name or user.username},
-
-Welcome to Sports Club! Your account has been created successfully.
-
-You can now browse and book sports facilities at your favorite clubs.
-
-Best regards,
-Sports Club Team
-        """
-        send_resend_email('Welcome to Sports Club!', message, user.email)
+        rendered = render('welcome', user_context(user))
+        send_resend_email(rendered.subject, rendered.text, user.email, html=rendered.html)
         return f"Welcome email sent to {user.email}"
 
     except Exception as e:
@@ -152,19 +107,22 @@ def release_expired_slot_locks():
     """Periodic task: release expired slot locks and cancel pending bookings"""
     try:
         from bookings.models import SlotLock, Booking
+        from reports.rollups import refreshing
         expired_locks = list(SlotLock.objects.filter(expires_at__lt=timezone.now(), is_converted=False))
         count = len(expired_locks)
         for lock in expired_locks:
-            Booking.objects.filter(
+            expired = Booking.objects.filter(
                 club=lock.club, sport=lock.sport, date=lock.date,
                 start_time=lock.start_time, status='pending'
-            ).update(status='cancelled')
+            )
+            with refreshing(expired):
+                expired.update(status='cancelled')
         SlotLock.objects.filter(id__in=[l.id for l in expired_locks]).delete()
 
         cutoff = timezone.now() - timedelta(minutes=15)
-        stale_count = Booking.objects.filter(
-            status='pending', created_at__lt=cutoff
-        ).update(status='cancelled')
+        stale = Booking.objects.filter(status='pending', created_at__lt=cutoff)
+        with refreshing(stale):
+            stale_count = stale.update(status='cancelled')
 
         logger.info(f"Released {count} expired locks, cancelled {stale_count} stale bookings")
         return f"Released {count} locks, cancelled {stale_count} bookings"
@@ -179,47 +137,24 @@ def notify_waitlisted_users(club_id, sport_id, date_str, start_time, end_time):
     """
     Notify every user waitlisted for a specific slot that it has just
     become available again (called after a cancellation or lock expiry).
-    Was imported by admin.py but never defined — that import would have
-    raised ImportError the first time an admin used the action.
+    Writes one outbox row per waitlisted user; dispatch_outbox sends them.
     """
     try:
-        from bookings.models import SlotWaitlist
         from datetime import datetime as dt
+        from django.db import transaction
+        from notifications.outbox import enqueue_waitlist_notifications
 
         date = dt.strptime(date_str, '%Y-%m-%d').date()
-        entries = SlotWaitlist.objects.filter(
-            club_id=club_id, sport_id=sport_id, date=date,
-            start_time=start_time, notified=False
-        ).select_related('user', 'club', 'sport')
-
-        notified_count = 0
-        for entry in entries:
-            user = entry.user
-            if user.email:
-                send_resend_email(
-                    subject=f'Slot now available - {entry.club.name}',
-                    message=(
-                        f"Good news! The slot you waitlisted for is now available:\n\n"
-                        f"Club: {entry.club.name}\n"
-                        f"Sport: {entry.sport.name}\n"
-                        f"Date: {entry.date}\n"
-                        f"Time: {entry.start_time} - {entry.end_time}\n\n"
-                        f"Book it quickly before someone else does!"
-                    ),
-                    from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@sportsclub.com'),
-                    recipient_list=[user.email],
-                    fail_silently=True,
-                )
-            entry.notified = True
-            entry.save(update_fields=['notified'])
-            notified_count += 1
-
-        return f"Notified {notified_count} waitlisted users"
+        with transaction.atomic():
+            messages = enqueue_waitlist_notifications(club_id, sport_id, date, start_time)
+
+        return f"Notified {len(messages)} waitlisted users"
 
     except Exception as e:
         logger.error(f"Waitlist notification failed: {e}")
         return f"Failed: {str(e)}"
-    
+
+
 @shared_task
 def send_booking_status_update(booking_id, new_status):
     """Notify the user their booking status was changed by an admin."""
@@ -228,16 +163,9 @@ def send_booking_status_update(booking_id, new_status):
         booking = Booking.objects.select_related('user', 'club', 'sport').get(id=booking_id)
         user = booking.user
 
-        subject = f"Your booking status has been updated to: {new_status}"
-        message = (
-            f"Hi {user.get_full_name() or user.username},\n\n"
-            f"Your booking for {booking.sport.name} at {booking.club.name} "
-            f"on {booking.date} ({booking.start_time}-{booking.end_time}) "
-            f"has been updated to: {new_status}.\n\n"
-            f"Thanks,\nSports Club Team"
-        )
+        rendered = render('booking_status_update', booking_context(booking, user, new_status=new_status))
 
-        send_resend_email(subject, message, user.email)
+        send_resend_email(rendered.subject, rendered.text, user.email, html=rendered.html)
         logger.info(f"Status update email sent to {user.email} for booking {booking_id}")
         return "Sent"
     except Exception as e:
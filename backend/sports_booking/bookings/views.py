@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django_ratelimit.decorators import ratelimit
 from django.utils.decorators import method_decorator
+from django.conf import settings
 from django.utils import timezone
 from django.db import transaction, IntegrityError
 from datetime import datetime, timedelta, time as dt_time
@@ -15,12 +16,11 @@ from .serializers import (
     SlotLockSerializer,
     SlotWaitlistSerializer,
 )
-from .tasks import (
-    send_booking_confirmation_email,
-    send_booking_confirmation_sms,
-    notify_waitlisted_users,
-)
 from clubs.models import Sport
+from notifications.outbox import enqueue_waitlist_notifications
+from payments.tasks import prerender_upi_qr_codes
+from payments.refunds import enqueue_refund
+from reports.rollups import refreshing
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +28,13 @@ MAX_ADVANCE_BOOKING_DAYS = 15
 STALE_PENDING_MINUTES = 15
 
 
+def _prerender_qr(booking):
+    try:
+        prerender_upi_qr_codes.delay([str(booking.id)])
+    except Exception as e:
+        logger.warning(f"Could not queue UPI QR prerender for booking {booking.id}, it renders on first request: {e}")
+
+
 def _slot_datetime(date, time_str):
     """Combine a date with an 'HH:MM:SS' string into a tz-aware datetime."""
     hour, minute, second = (int(p) for p in time_str.split(':'))
@@ -80,10 +87,12 @@ class BookingViewSet(viewsets.ModelViewSet):
             expires_at__lt=timezone.now(), is_converted=False
         ))
         for lock in expired_locks:
-            Booking.objects.filter(
+            expired = Booking.objects.filter(
                 club_id=club_id, sport_id=sport_id, date=date,
                 start_time=lock.start_time, status='pending'
-            ).update(status='cancelled')
+            )
+            with refreshing(expired):
+                expired.update(status='cancelled')
         SlotLock.objects.filter(id__in=[l.id for l in expired_locks]).delete()
 
         try:
@@ -313,6 +322,9 @@ class BookingViewSet(viewsets.ModelViewSet):
                     lock=lock,
                     status='pending'
                 )
+                if settings.UPI_ID:
+                    # Have the UPI QR ready before the payment page asks for it
+                    transaction.on_commit(lambda: _prerender_qr(booking))
 
             serializer = self.get_serializer(booking)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -362,7 +374,9 @@ class BookingViewSet(viewsets.ModelViewSet):
                 try:
                     payment = booking.payment
                     if payment.status == 'completed':
-                        payment.mark_refunded()
+                        # Queued, not issued: the refund worker calls Stripe
+                        # after commit, so a mass cancellation never blocks here.
+                        enqueue_refund(payment, reason=reason, requested_by=request.user)
                         booking.status = 'refunded'
                     else:
                         booking.status = 'cancelled'
@@ -382,14 +396,14 @@ class BookingViewSet(viewsets.ModelViewSet):
                 is_converted=False
             ).delete()
 
-        logger.info(f"Booking {booking.id} {booking.status} by {request.user.username}. Reason: {reason}")
+            # Let anyone waitlisted for this slot know it's free again —
+            # written to the outbox in this transaction, sent by the
+            # dispatcher after commit.
+            enqueue_waitlist_notifications(
+                booking.club_id, booking.sport_id, booking.date, booking.start_time
+            )
 
-        # Let anyone waitlisted for this slot know it's free again.
-        notify_waitlisted_users.delay(
-            str(booking.club_id), str(booking.sport_id),
-            booking.date.strftime('%Y-%m-%d'),
-            str(booking.start_time), str(booking.end_time)
-        )
+        logger.info(f"Booking {booking.id} {booking.status} by {request.user.username}. Reason: {reason}")
 
         msg = (
             'Booking cancelled. Refund will be processed within 5-7 business days.'
@@ -410,16 +424,19 @@ class BookingViewSet(viewsets.ModelViewSet):
         expired_locks = list(SlotLock.objects.filter(expires_at__lt=timezone.now(), is_converted=False))
         cancelled = 0
         for lock in expired_locks:
-            cancelled += Booking.objects.filter(
+            expired = Booking.objects.filter(
                 club=lock.club, sport=lock.sport, date=lock.date,
                 start_time=lock.start_time, status='pending'
-            ).update(status='cancelled')
+            )
+            with refreshing(expired):
+                cancelled += expired.update(status='cancelled')
         SlotLock.objects.filter(id__in=[l.id for l in expired_locks]).delete()
 
         cutoff = timezone.now() - timedelta(minutes=STALE_PENDING_MINUTES)
         stale = Booking.objects.filter(status='pending', created_at__lt=cutoff)
         stale_count = stale.count()
-        stale.update(status='cancelled')
+        with refreshing(stale):
+            stale.update(status='cancelled')
 
         total_cancelled = cancelled + stale_count
         return Response({
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+# reports.exports.booking_search matches club names by prefix
+# (UPPER(name::text) LIKE UPPER('q%') on PostgreSQL), which needs a
+# pattern_ops index on the same expression.
+INDEX = 'clubs_name_upper_like'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {INDEX} ON clubs (UPPER(name::text) text_pattern_ops)')
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clubs', '0006_alter_club_phone_number'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
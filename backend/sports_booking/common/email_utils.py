@@ -1,15 +1,15 @@
 import logging
-import resend
 from django.conf import settings
 
-logger = logging.getLogger(__name__)
+from .providers import resend_client
 
-resend.api_key = settings.RESEND_API_KEY
+logger = logging.getLogger(__name__)
 
 
-def send_resend_email(subject, message, to_email, from_email=None):
+def send_resend_email(subject, message, to_email, from_email=None, html=None):
     """
-    Send an email via Resend's HTTP API instead of SMTP.
+    Send an email via Resend's HTTP API instead of SMTP. `message` is the
+    plain-text body; pass `html` to include an HTML alternative.
     Returns the Resend response dict on success, or None on failure
     (mirrors send_mail's fail_silently=True behavior — callers already
     check truthiness of the return value).
@@ -17,14 +17,53 @@ def send_resend_email(subject, message, to_email, from_email=None):
     if not settings.RESEND_API_KEY:
         logger.warning("RESEND_API_KEY not set, skipping email to %s", to_email)
         return None
+    params = {
+        "from": from_email or settings.DEFAULT_FROM_EMAIL,
+        "to": [to_email],
+        "subject": subject,
+        "text": message,
+    }
+    if html:
+        params["html"] = html
     try:
-        result = resend.Emails.send({
-            "from": from_email or settings.DEFAULT_FROM_EMAIL,
-            "to": [to_email],
-            "subject": subject,
-            "text": message,
-        })
+        result = resend_client().Emails.send(params)
         return result
     except Exception as e:
         logger.error("Resend send failed for %s: %s", to_email, e)
-        return None
\ No newline at end of file
+        return None
+
+
+# Resend accepts at most 100 messages per batch request.
+RESEND_BATCH_LIMIT = 100
+
+
+def send_resend_batch(messages, from_email=None):
+    """
+    Send many emails in as few Resend API calls as possible.
+    `messages` is a list of dicts with `subject`, `message` and `to_email`
+    (plus an optional `html`).
+    Returns a list (same order/length as `messages`) holding the Resend
+    response for each message, or None for any message whose chunk failed.
+    """
+    if not settings.RESEND_API_KEY:
+        logger.warning("RESEND_API_KEY not set, skipping batch of %d emails", len(messages))
+        return [None] * len(messages)
+
+    sender = from_email or settings.DEFAULT_FROM_EMAIL
+    results = []
+    for start in range(0, len(messages), RESEND_BATCH_LIMIT):
+        chunk = messages[start:start + RESEND_BATCH_LIMIT]
+        try:
+            response = resend_client().Batch.send([{
+                "from": sender,
+                "to": [m['to_email']],
+                "subject": m['subject'],
+                "text": m['message'],
+                **({"html": m['html']} if m.get('html') else {}),
+            } for m in chunk])
+            data = response.get('data') or []
+            results.extend(data[i] if i < len(data) else None for i in range(len(chunk)))
+        except Exception as e:
+            logger.error("Resend batch send failed for %d emails: %s", len(chunk), e)
+            results.extend([None] * len(chunk))
+    return results
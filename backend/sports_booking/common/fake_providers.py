@@ -0,0 +1,341 @@
+"""
+In-process fakes for Stripe, Twilio and Resend, selected with
+PROVIDER_BACKEND='fake' (see common.providers).
+
+Each fake accepts the same calls our code makes on the real SDK, records
+every call, and applies a FaultInjector — configurable latency, random
+errors and a token-bucket rate limit — so the checkout and notification
+pipeline can be load-tested offline with realistic tail latency and
+failure modes. Injected failures raise the SDK's own exception types, so
+the production error handling is what gets exercised.
+
+Knobs (settings, overridable per provider via PROVIDER_FAKE_OVERRIDES):
+PROVIDER_FAKE_LATENCY_MS, PROVIDER_FAKE_LATENCY_JITTER_MS,
+PROVIDER_FAKE_ERROR_RATE, PROVIDER_FAKE_RATE_LIMIT (calls/second, 0 = off),
+PROVIDER_FAKE_SEED.
+"""
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from types import SimpleNamespace
+
+from django.conf import settings
+
+ProviderCall = namedtuple('ProviderCall', ['provider', 'operation', 'params', 'outcome', 'latency'])
+
+
+def _new_id(prefix):
+    return f"{prefix}{uuid.uuid4().hex[:24]}"
+
+
+class FaultInjector:
+    """
+    Decides the fate of one provider call. check() returns None (proceed),
+    'rate_limited' or 'error'; the latency is slept before errors and
+    successes alike, but a rate-limited call is rejected straight away,
+    as the real APIs do.
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit=0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = float(rate_limit)
+        self._refilled_at = time.monotonic()
+
+    @classmethod
+    def from_settings(cls, provider):
+        options = {
+            'latency_ms': getattr(settings, 'PROVIDER_FAKE_LATENCY_MS', 0.0),
+            'jitter_ms': getattr(settings, 'PROVIDER_FAKE_LATENCY_JITTER_MS', 0.0),
+            'error_rate': getattr(settings, 'PROVIDER_FAKE_ERROR_RATE', 0.0),
+            'rate_limit': getattr(settings, 'PROVIDER_FAKE_RATE_LIMIT', 0),
+            'seed': getattr(settings, 'PROVIDER_FAKE_SEED', None),
+        }
+        options.update(getattr(settings, 'PROVIDER_FAKE_OVERRIDES', {}).get(provider, {}))
+        return cls(**options)
+
+    def _take_token(self):
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled_at) * self.rate_limit)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def check(self):
+        if not self._take_token():
+            return 'rate_limited'
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms))
+            failed = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay / 1000)
+        return 'error' if failed else None
+
+
+class _FakeProvider(ABC):
+    name = None
+
+    def __init__(self, faults):
+        self.faults = faults
+        self.calls = []
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _raise(self, outcome, operation):
+        """Raise the SDK's own exception for an injected outcome ('rate_limited' or 'error')."""
+
+    def _call(self, operation, params, respond):
+        started = time.perf_counter()
+        outcome = self.faults.check()
+        try:
+            if outcome:
+                self._raise(outcome, operation)
+            return respond()
+        finally:
+            with self._lock:
+                self.calls.append(ProviderCall(
+                    self.name, operation, params, outcome or 'ok', time.perf_counter() - started,
+                ))
+
+
+# --------------------------------------------------------------------------
+# Stripe
+# --------------------------------------------------------------------------
+class _FakeStripeResource:
+    def __init__(self, fake):
+        self._fake = fake
+
+
+class _FakePaymentIntents(_FakeStripeResource):
+    def create(self, idempotency_key=None, **params):
+        return self._fake._create('payment_intent.create', idempotency_key, params, self._fake._new_intent)
+
+    def retrieve(self, intent_id, **params):
+        return self._fake._call('payment_intent.retrieve', {'id': intent_id}, lambda: self._fake._retrieve_intent(intent_id))
+
+    def list(self, **params):
+        return self._fake._call('payment_intent.list', params, lambda: self._fake._list(self._fake.intents, params))
+
+
+class _FakeRefunds(_FakeStripeResource):
+    def create(self, idempotency_key=None, **params):
+        return self._fake._create('refund.create', idempotency_key, params, self._fake._new_refund)
+
+    def list(self, **params):
+        return self._fake._call('refund.list', params, lambda: self._fake._list(self._fake.refunds, params))
+
+
+class FakeStripe(_FakeProvider):
+    """
+    Stands in for the `stripe` module. PaymentIntents move to 'succeeded' on
+    their first retrieve (as if the customer had completed the card step in
+    the browser) unless PROVIDER_FAKE_STRIPE_AUTO_CONFIRM is False; webhook
+    verification is the real, offline signature check.
+    """
+    name = 'stripe'
+
+    def __init__(self, faults):
+        import stripe
+        super().__init__(faults)
+        self._stripe = stripe
+        self.auto_confirm = getattr(settings, 'PROVIDER_FAKE_STRIPE_AUTO_CONFIRM', True)
+        self.intents = {}
+        self.refunds = {}
+        self._idempotent = {}
+        self.PaymentIntent = _FakePaymentIntents(self)
+        self.Refund = _FakeRefunds(self)
+        self.Webhook = stripe.Webhook
+
+    def _raise(self, outcome, operation):
+        if outcome == 'rate_limited':
+            raise self._stripe.RateLimitError(f"Injected rate limit on {operation}", http_status=429)
+        raise self._stripe.APIConnectionError(f"Injected failure on {operation}")
+
+    def _construct(self, cls, values):
+        return cls.construct_from(values, 'sk_fake')
+
+    def _create(self, operation, idempotency_key, params, build):
+        def respond():
+            if idempotency_key and idempotency_key in self._idempotent:
+                return self._idempotent[idempotency_key]
+            obj = build(params)
+            if idempotency_key:
+                self._idempotent[idempotency_key] = obj
+            return obj
+        return self._call(operation, params, respond)
+
+    def _new_intent(self, params):
+        intent_id = _new_id('pi_')
+        values = {
+            'id': intent_id,
+            'object': 'payment_intent',
+            'amount': params.get('amount'),
+            'currency': params.get('currency'),
+            'status': 'requires_payment_method',
+            'client_secret': f"{intent_id}_secret_{uuid.uuid4().hex[:12]}",
+            'metadata': {key: str(value) for key, value in (params.get('metadata') or {}).items()},
+            'created': int(time.time()),
+        }
+        with self._lock:
+            self.intents[intent_id] = values
+        return self._construct(self._stripe.PaymentIntent, values)
+
+    def _retrieve_intent(self, intent_id):
+        with self._lock:
+            values = self.intents.get(intent_id)
+            if values is None:
+                raise self._stripe.InvalidRequestError(f"No such payment_intent: '{intent_id}'", 'id', http_status=404)
+            if self.auto_confirm and values['status'] == 'requires_payment_method':
+                values['status'] = 'succeeded'
+        return self._construct(self._stripe.PaymentIntent, values)
+
+    def _new_refund(self, params):
+        intent = self.intents.get(params.get('payment_intent'))
+        values = {
+            'id': _new_id('re_'),
+            'object': 'refund',
+            'payment_intent': params.get('payment_intent'),
+            'amount': params.get('amount') or (intent or {}).get('amount'),
+            'status': 'succeeded',
+            'created': int(time.time()),
+        }
+        with self._lock:
+            self.refunds[values['id']] = values
+        return self._construct(self._stripe.Refund, values)
+
+    def _list(self, store, params):
+        """Stripe list semantics: newest first, `created` range filter, cursor paging."""
+        created = params.get('created') or {}
+        with self._lock:
+            rows = sorted(store.values(), key=lambda row: (row['created'], row['id']), reverse=True)
+        rows = [
+            row for row in rows
+            if ('gte' not in created or row['created'] >= created['gte'])
+            and ('lt' not in created or row['created'] < created['lt'])
+        ]
+        if params.get('starting_after'):
+            ids = [row['id'] for row in rows]
+            rows = rows[ids.index(params['starting_after']) + 1:]
+        limit = params.get('limit', 10)
+        return self._stripe.ListObject.construct_from({
+            'object': 'list', 'url': '/v1/fake',
+            'data': [dict(row) for row in rows[:limit]], 'has_more': len(rows) > limit,
+        }, 'sk_fake')
+
+    def signed_event(self, event_type, obj, **fields):
+        """
+        (payload, Stripe-Signature header) for a webhook event about `obj`,
+        signed with STRIPE_WEBHOOK_SECRET — for driving the webhook endpoint
+        in load tests. `fields` override top-level event fields (id, created).
+        """
+        payload = json.dumps({
+            'id': _new_id('evt_'), 'object': 'event', 'type': event_type,
+            'created': int(time.time()), 'data': {'object': dict(obj)}, **fields,
+        })
+        timestamp = int(time.time())
+        signature = hmac.new(
+            settings.STRIPE_WEBHOOK_SECRET.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256,
+        ).hexdigest()
+        return payload, f"t={timestamp},v1={signature}"
+
+
+# --------------------------------------------------------------------------
+# Twilio
+# --------------------------------------------------------------------------
+class _FakeTwilioMessages:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def create(self, body=None, from_=None, to=None, **params):
+        return self._fake._call(
+            'messages.create', {'body': body, 'from_': from_, 'to': to, **params},
+            lambda: SimpleNamespace(sid=_new_id('SM'), status='queued', body=body, from_=from_, to=to),
+        )
+
+
+class FakeTwilio(_FakeProvider):
+    """Stands in for twilio.rest.Client."""
+    name = 'twilio'
+
+    def __init__(self, faults):
+        super().__init__(faults)
+        self.messages = _FakeTwilioMessages(self)
+
+    def _raise(self, outcome, operation):
+        from twilio.base.exceptions import TwilioRestException
+        if outcome == 'rate_limited':
+            raise TwilioRestException(429, f'fake://twilio/{operation}', 'Injected rate limit', code=20429, method='POST')
+        raise TwilioRestException(500, f'fake://twilio/{operation}', 'Injected failure', method='POST')
+
+
+# --------------------------------------------------------------------------
+# Resend
+# --------------------------------------------------------------------------
+class _FakeResendEmails:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def send(self, params):
+        return self._fake._call('emails.send', params, lambda: {'id': _new_id('em_')})
+
+
+class _FakeResendBatch:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def send(self, params):
+        return self._fake._call(
+            'batch.send', params, lambda: {'data': [{'id': _new_id('em_')} for _ in params]},
+        )
+
+
+class FakeResend(_FakeProvider):
+    """Stands in for the `resend` module."""
+    name = 'resend'
+
+    def __init__(self, faults):
+        super().__init__(faults)
+        self.Emails = _FakeResendEmails(self)
+        self.Batch = _FakeResendBatch(self)
+
+    def _raise(self, outcome, operation):
+        from resend.exceptions import ResendError
+        if outcome == 'rate_limited':
+            raise ResendError(429, 'rate_limit_exceeded', f'Injected rate limit on {operation}', 'Slow down')
+        raise ResendError(500, 'application_error', f'Injected failure on {operation}', 'Try again later')
+
+
+FAKES = {
+    'stripe': FakeStripe,
+    'twilio': FakeTwilio,
+    'resend': FakeResend,
+}
+
+
+def build(provider):
+    return FAKES[provider](FaultInjector.from_settings(provider))
+
+
+def recorded_calls(provider=None):
+    """Every call the fakes in this process have seen, oldest first."""
+    from .providers import fake_clients
+    calls = []
+    for name, fake in fake_clients().items():
+        if provider is None or name == provider:
+            calls.extend(fake.calls)
+    return calls
@@ -0,0 +1,80 @@
+"""
+Lightweight counters and latency histograms kept in the shared cache
+(Redis), so every web and worker process reports into the same numbers.
+
+Latencies go into fixed millisecond buckets, one set per minute, which
+keeps every write a single atomic INCR and lets latency_summary() read
+any recent window without storing individual samples.
+"""
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, float('inf')]
+RETENTION_SECONDS = 24 * 3600
+
+
+def _incr(key, amount=1, timeout=RETENTION_SECONDS):
+    if not cache.add(key, amount, timeout=timeout):
+        cache.incr(key, amount)
+
+
+def incr(name, amount=1):
+    """Bump a monotonically increasing counter. Never raises."""
+    try:
+        _incr(f'metrics:counter:{name}', amount, timeout=None)
+    except Exception as e:
+        logger.warning(f"Metric {name} not recorded: {e}")
+
+
+def counter(name):
+    return cache.get(f'metrics:counter:{name}', 0)
+
+
+def _minute(ts=None):
+    return int((ts or time.time()) // 60)
+
+
+def observe_latency(name, seconds):
+    """Record one latency sample for `name`. Never raises."""
+    ms = seconds * 1000
+    bucket = next(i for i, bound in enumerate(LATENCY_BUCKETS_MS) if ms <= bound)
+    try:
+        _incr(f'metrics:latency:{name}:{_minute()}:{bucket}')
+    except Exception as e:
+        logger.warning(f"Latency for {name} not recorded: {e}")
+
+
+def latency_summary(name, minutes=5):
+    """
+    Sample count and p50/p95/p99 (upper bucket bound, in ms) for `name`
+    over the last `minutes` minutes.
+    """
+    now = _minute()
+    keys = [
+        f'metrics:latency:{name}:{minute}:{bucket}'
+        for minute in range(now - minutes + 1, now + 1)
+        for bucket in range(len(LATENCY_BUCKETS_MS))
+    ]
+    values = cache.get_many(keys)
+    counts = [0] * len(LATENCY_BUCKETS_MS)
+    for key, value in values.items():
+        counts[int(key.rsplit(':', 1)[1])] += value
+
+    total = sum(counts)
+    summary = {'count': total}
+    for label, q in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99)):
+        if not total:
+            summary[label] = None
+            continue
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if seen >= q * total:
+                bound = LATENCY_BUCKETS_MS[bucket]
+                summary[label] = None if bound == float('inf') else bound
+                break
+    return summary
@@ -0,0 +1,174 @@
+"""
+Per-process, keep-alive HTTP clients for Resend, Twilio and Stripe.
+
+Every worker process builds ONE requests.Session (bounded urllib3 pool,
+explicit connect/read timeouts) on first use and shares it between the
+three SDKs, so consecutive messages reuse warm TLS connections instead of
+paying a handshake each. Clients are rebuilt automatically after a fork
+(Celery prefork children, gunicorn workers) — sockets must never be shared
+across processes.
+
+PROVIDER_BACKEND picks what the three accessors return:
+  live    — the real SDKs against the real APIs (default).
+  standin — the real SDKs, pointed at PROVIDER_STANDIN_URL (a local
+            common.standin_server, see `run_provider_standin`).
+  fake    — in-process fakes (common.fake_providers); nothing leaves the
+            process.
+"""
+import os
+import threading
+
+import requests
+import resend
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+_lock = threading.RLock()
+_clients = {}
+_owner_pid = None
+
+
+def http_timeout():
+    return (
+        getattr(settings, 'PROVIDER_HTTP_CONNECT_TIMEOUT', 3.05),
+        getattr(settings, 'PROVIDER_HTTP_READ_TIMEOUT', 10),
+    )
+
+
+def _build_session():
+    pool_size = getattr(settings, 'PROVIDER_HTTP_POOL_MAXSIZE', 10)
+    session = requests.Session()
+    # pool_block=True: under a burst, wait for a free connection instead of
+    # opening (and then discarding) connections beyond the bound.
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def provider_backend():
+    return getattr(settings, 'PROVIDER_BACKEND', 'live')
+
+
+def _standin_url():
+    return settings.PROVIDER_STANDIN_URL.rstrip('/')
+
+
+def _get(name, factory):
+    global _owner_pid
+    pid = os.getpid()
+    client = _clients.get(name) if _owner_pid == pid else None
+    if client is not None:
+        return client
+    with _lock:
+        if _owner_pid != pid:
+            _clients.clear()
+            _owner_pid = pid
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def reset_clients():
+    """Drop every cached client (e.g. after credentials or PROVIDER_BACKEND change in tests)."""
+    with _lock:
+        for client in _clients.values():
+            if isinstance(client, requests.Session):
+                client.close()
+        _clients.clear()
+
+
+def _fake(provider):
+    from . import fake_providers
+    return _get(f'fake:{provider}', lambda: fake_providers.build(provider))
+
+
+def fake_clients():
+    """The fakes built so far in this process, by provider name."""
+    return {
+        name.split(':', 1)[1]: client
+        for name, client in list(_clients.items())
+        if name.startswith('fake:')
+    }
+
+
+def http_session():
+    return _get('session', _build_session)
+
+
+class _PooledResendHTTPClient(resend.HTTPClient):
+    """resend.HTTPClient implementation on the shared session."""
+
+    def __init__(self, session, timeout):
+        self._session = session
+        self._timeout = timeout
+
+    def request(self, method, url, headers, json=None, files=None, data=None):
+        try:
+            if files is not None:
+                resp = self._session.request(
+                    method=method, url=url, headers=headers,
+                    files=files, data=data, timeout=self._timeout,
+                )
+            else:
+                resp = self._session.request(
+                    method=method, url=url, headers=headers,
+                    json=json if data is None else None, data=data,
+                    timeout=self._timeout,
+                )
+            return resp.content, resp.status_code, resp.headers
+        except requests.RequestException as e:
+            # resend.Request turns RuntimeError into a ResendError
+            raise RuntimeError(f"Request failed: {e}") from e
+
+
+def _build_resend():
+    resend.api_key = settings.RESEND_API_KEY
+    resend.default_http_client = _PooledResendHTTPClient(http_session(), http_timeout())
+    if provider_backend() == 'standin':
+        resend.api_url = _standin_url()
+    return resend
+
+
+def resend_client():
+    """The resend module, configured with the pooled HTTP client."""
+    if provider_backend() == 'fake':
+        return _fake('resend')
+    return _get('resend', _build_resend)
+
+
+def _build_twilio():
+    from twilio.http.http_client import TwilioHttpClient
+    from twilio.rest import Client
+
+    http_client = TwilioHttpClient(pool_connections=True)
+    http_client.session = http_session()
+    # set after __init__, which only accepts a single float
+    http_client.timeout = http_timeout()
+    client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=http_client)
+    if provider_backend() == 'standin':
+        client.api.base_url = _standin_url()
+    return client
+
+
+def twilio_client():
+    if provider_backend() == 'fake':
+        return _fake('twilio')
+    return _get('twilio', _build_twilio)
+
+
+def _build_stripe():
+    import stripe
+
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.default_http_client = stripe.RequestsClient(session=http_session(), timeout=http_timeout())
+    if provider_backend() == 'standin':
+        stripe.api_base = _standin_url()
+    return stripe
+
+
+def stripe_client():
+    """The stripe module, configured with the pooled HTTP client."""
+    if provider_backend() == 'fake':
+        return _fake('stripe')
+    return _get('stripe', _build_stripe)
@@ -0,0 +1,35 @@
+"""
+A fixed-window rate limit kept in the shared cache (Redis), so every
+worker process and thread calling one provider draws from the same
+per-second budget.
+"""
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def acquire(name, per_second, timeout=30.0):
+    """
+    Block until a call slot in the current second is free for `name`.
+    Returns False if none came free within `timeout` seconds. A cache
+    outage never blocks the caller: the call simply goes ahead.
+    """
+    if not per_second:
+        return True
+    deadline = time.monotonic() + timeout
+    while True:
+        now = time.time()
+        key = f'ratelimit:{name}:{int(now)}'
+        try:
+            cache.add(key, 0, timeout=5)
+            if cache.incr(key) <= per_second:
+                return True
+        except Exception as e:
+            logger.warning(f"Rate limit {name} unavailable, not throttling: {e}")
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(1 - now % 1)
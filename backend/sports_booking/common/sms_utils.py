@@ -0,0 +1,34 @@
+import logging
+from django.conf import settings
+
+from .providers import twilio_client
+
+logger = logging.getLogger(__name__)
+
+
+def twilio_configured():
+    sid = getattr(settings, 'TWILIO_ACCOUNT_SID', None)
+    token = getattr(settings, 'TWILIO_AUTH_TOKEN', None)
+    from_number = getattr(settings, 'TWILIO_PHONE_NUMBER', None)
+    return all([sid, token, from_number]) and sid != 'None'
+
+
+def send_twilio_sms(body, mobile_number):
+    """
+    Send an SMS via Twilio to a 10-digit Indian mobile number.
+    Returns the message SID on success, or None on failure / when Twilio
+    isn't configured (same contract as send_resend_email).
+    """
+    if not twilio_configured():
+        logger.info("Twilio not configured, skipping SMS to %s", mobile_number)
+        return None
+    try:
+        message = twilio_client().messages.create(
+            body=body,
+            from_=settings.TWILIO_PHONE_NUMBER,
+            to=f"+91{mobile_number}",
+        )
+        return message.sid
+    except Exception as e:
+        logger.error("Twilio send failed for %s: %s", mobile_number, e)
+        return None
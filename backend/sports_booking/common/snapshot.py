@@ -0,0 +1,53 @@
+"""
+Short-lived snapshots of expensive read-only payloads (admin dashboards),
+kept in the shared cache with single-flight recomputation: when a snapshot
+goes stale exactly one caller recomputes it while everyone else keeps
+getting the previous copy, and when there is no copy at all the others
+wait briefly for the one being built instead of all computing it.
+"""
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# A stale copy is kept (and served during recomputation) this much longer than its TTL
+STALE_GRACE_SECONDS = 60
+
+
+def snapshot(key, ttl, compute, build_timeout=30, wait=5.0):
+    """Return compute()'s result, recomputed at most once per `ttl` seconds across all processes."""
+    data_key, lock_key = f'snapshot:{key}', f'snapshot:{key}:building'
+    try:
+        cached = cache.get(data_key)
+        if cached is not None and cached['fresh_until'] > time.time():
+            return cached['value']
+        if not cache.add(lock_key, 1, timeout=build_timeout):
+            if cached is not None:
+                return cached['value']
+            deadline = time.monotonic() + wait
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                cached = cache.get(data_key)
+                if cached is not None:
+                    return cached['value']
+            # The builder is stuck or gone: compute without the lock rather than fail
+            return compute()
+    except Exception as e:
+        logger.warning(f"Snapshot {key} cache unavailable, computing directly: {e}")
+        return compute()
+
+    try:
+        value = compute()
+        try:
+            cache.set(data_key, {'value': value, 'fresh_until': time.time() + ttl},
+                      timeout=ttl + STALE_GRACE_SECONDS)
+        except Exception as e:
+            logger.warning(f"Snapshot {key} not stored: {e}")
+        return value
+    finally:
+        try:
+            cache.delete(lock_key)
+        except Exception:
+            pass
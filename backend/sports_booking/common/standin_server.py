@@ -0,0 +1,157 @@
+"""
+A tiny local HTTP stand-in for the Resend, Twilio and Stripe endpoints we
+call, for benchmarks and offline load tests. It speaks HTTP/1.1 keep-alive
+and can add an artificial per-connection delay (to model the TLS handshake
+a fresh client pays against the real APIs) and per-request latency, plus
+the same random errors / rate limiting as the in-process fakes (pass a
+common.fake_providers.FaultInjector as `faults`).
+
+PaymentIntents and refunds are kept in memory and can be listed, and
+intents come back 'succeeded' when retrieved, so the whole checkout (and
+payment reconciliation) can run against it.
+"""
+import json
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+def _new_id(prefix):
+    return f"{prefix}{uuid.uuid4().hex[:24]}"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.connections += 1
+        if self.server.handshake_delay:
+            time.sleep(self.server.handshake_delay)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        body = self._read_body()
+        self.server.requests += 1
+        if self.server.request_latency:
+            time.sleep(self.server.request_latency)
+
+        path = self.path.split('?', 1)[0]
+        outcome = self.server.faults.check() if self.server.faults else None
+        if outcome:
+            status, message = (429, 'Injected rate limit') if outcome == 'rate_limited' else (500, 'Injected failure')
+            # One body that each SDK's error parser understands
+            return self._reply(status, {
+                'error': {'type': 'api_error', 'message': message},
+                'name': 'application_error', 'statusCode': status,
+                'code': 20429 if status == 429 else 20500, 'status': status, 'message': message,
+            })
+
+        if path == '/emails/batch':
+            count = len(json.loads(body or b'[]'))
+            return self._reply(200, {'data': [{'id': _new_id('em_')} for _ in range(count)]})
+        if path == '/emails':
+            return self._reply(200, {'id': _new_id('em_')})
+        if path.startswith('/2010-04-01/Accounts/') and path.endswith('/Messages.json'):
+            return self._reply(201, {'sid': _new_id('SM'), 'status': 'queued'})
+        query = dict(parse_qsl(self.path.split('?', 1)[1])) if '?' in self.path else {}
+        if path == '/v1/payment_intents' and method == 'GET':
+            return self._reply(200, self.server.list_objects(self.server.intents, query))
+        if path == '/v1/refunds' and method == 'GET':
+            return self._reply(200, self.server.list_objects(self.server.refunds, query))
+        if path == '/v1/payment_intents' and method == 'POST':
+            return self._reply(200, self.server.create_intent(body))
+        if path.startswith('/v1/payment_intents/'):
+            intent = self.server.intents.get(path.rsplit('/', 1)[1])
+            if intent is None:
+                return self._reply(404, {'error': {'type': 'invalid_request_error', 'message': 'No such payment_intent'}})
+            return self._reply(200, dict(intent, status='succeeded'))
+        if path == '/v1/refunds':
+            return self._reply(200, self.server.create_refund(body))
+        return self._reply(404, {'error': f'No stand-in for {method} {path}'})
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handshake_delay=0.0, request_latency=0.0, faults=None):
+        super().__init__(address, StandInHandler)
+        self.handshake_delay = handshake_delay
+        self.request_latency = request_latency
+        self.faults = faults
+        self.connections = 0
+        self.requests = 0
+        self.intents = {}
+        self.refunds = {}
+
+    def list_objects(self, store, query):
+        """Stripe list semantics: newest first, created[gte]/created[lt], cursor paging."""
+        rows = sorted(store.values(), key=lambda row: (row['created'], row['id']), reverse=True)
+        if 'created[gte]' in query:
+            rows = [row for row in rows if row['created'] >= int(query['created[gte]'])]
+        if 'created[lt]' in query:
+            rows = [row for row in rows if row['created'] < int(query['created[lt]'])]
+        if query.get('starting_after'):
+            ids = [row['id'] for row in rows]
+            rows = rows[ids.index(query['starting_after']) + 1:]
+        limit = int(query.get('limit', 10))
+        return {'object': 'list', 'url': '/v1/list', 'data': rows[:limit], 'has_more': len(rows) > limit}
+
+    def create_refund(self, body):
+        params = dict(parse_qsl(body.decode()))
+        intent = self.intents.get(params.get('payment_intent'), {})
+        refund = {
+            'id': _new_id('re_'), 'object': 'refund', 'status': 'succeeded',
+            'payment_intent': params.get('payment_intent'),
+            'amount': int(params.get('amount') or intent.get('amount') or 0),
+            'created': int(time.time()),
+        }
+        self.refunds[refund['id']] = refund
+        return refund
+
+    def create_intent(self, body):
+        params = dict(parse_qsl(body.decode()))
+        intent_id = _new_id('pi_')
+        intent = {
+            'id': intent_id, 'object': 'payment_intent', 'status': 'requires_payment_method',
+            'amount': int(params.get('amount', 0)), 'currency': params.get('currency'),
+            'client_secret': f"{intent_id}_secret_{uuid.uuid4().hex[:12]}",
+            'created': int(time.time()),
+            'metadata': {
+                key[len('metadata['):-1]: value
+                for key, value in params.items() if key.startswith('metadata[')
+            },
+        }
+        self.intents[intent_id] = intent
+        return intent
+
+
+def serve(host='127.0.0.1', port=0, handshake_delay=0.0, request_latency=0.0, faults=None):
+    """Start the stand-in on a daemon thread; returns (server, base_url)."""
+    server = StandInServer((host, port), handshake_delay, request_latency, faults)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
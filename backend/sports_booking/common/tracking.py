@@ -0,0 +1,81 @@
+"""
+Before/after state of model rows, for signal receivers that keep derived
+data in step incrementally (reports.rollups, accounts.counters).
+
+There is one Tracker per model. It remembers the fields every consumer
+watches when an instance is loaded, and on save/delete hands each
+consumer's handlers the same old and new state. Consumers therefore
+never disagree about what changed, and never overwrite each other's
+memory of the row.
+"""
+from collections import defaultdict
+
+from django.db.models.signals import post_delete, post_init, post_save
+
+_trackers = {}
+
+
+def state(instance, fields):
+    """The instance's current values for `fields` (as the database would return them), or None if any is deferred."""
+    values = instance.__dict__
+    if any(field not in values for field in fields):
+        return None
+    meta = instance._meta
+    return tuple(meta.get_field(field).to_python(values[field]) for field in fields)
+
+
+def pick(row_state, fields):
+    """`fields` of a tracked state as a tuple (None when the state is unknown)."""
+    return None if row_state is None else tuple(row_state[field] for field in fields)
+
+
+def new_deltas():
+    return defaultdict(lambda: defaultdict(int))
+
+
+def add(deltas, key, part, sign=1):
+    for metric, value in part.items():
+        deltas[key][metric] += sign * value
+
+
+class Tracker:
+    """
+    Calls on_save handlers as handler(instance, old, new, created) and
+    on_delete handlers as handler(instance, old). `old` and `new` are
+    {field: value} dicts, or None: `old` is None for a new row, and either
+    is None for an instance loaded with deferred fields.
+    """
+
+    def __init__(self, model):
+        self.fields = set()
+        self.on_save = []
+        self.on_delete = []
+        post_init.connect(self._loaded, sender=model, weak=False)
+        post_save.connect(self._saved, sender=model, weak=False)
+        post_delete.connect(self._deleted, sender=model, weak=False)
+
+    def _state(self, instance):
+        values = state(instance, sorted(self.fields))
+        return None if values is None else dict(zip(sorted(self.fields), values))
+
+    def _loaded(self, sender, instance, **kwargs):
+        instance._tracked_state = self._state(instance)
+
+    def _saved(self, sender, instance, created, **kwargs):
+        old = None if created else instance._tracked_state
+        new = self._state(instance)
+        for handler in self.on_save:
+            handler(instance, old, new, created)
+        instance._tracked_state = new
+
+    def _deleted(self, sender, instance, **kwargs):
+        for handler in self.on_delete:
+            handler(instance, instance._tracked_state)
+
+
+def tracker(model, fields):
+    """The model's Tracker, from now on also remembering `fields`."""
+    if model not in _trackers:
+        _trackers[model] = Tracker(model)
+    _trackers[model].fields.update(fields)
+    return _trackers[model]
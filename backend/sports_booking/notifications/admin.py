@@ -0,0 +1,38 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import BookingReminder, OutboxMessage
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'channel', 'user', 'booking', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status', 'kind', 'channel', 'created_at']
+    search_fields = ['user__username', 'user__email', 'booking__id']
+    readonly_fields = ['created_at', 'sent_at']
+    date_hierarchy = 'created_at'
+    list_per_page = 50
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'booking')
+
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(
+            status='pending', attempts=0, available_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} notification(s) re-queued.')
+    retry_now.short_description = 'Re-queue selected notifications'
+
+
+
+@admin.register(BookingReminder)
+class BookingReminderAdmin(admin.ModelAdmin):
+    list_display = ['booking', 'due_at', 'due_bucket', 'created_at']
+    search_fields = ['booking__id', 'booking__user__username']
+    readonly_fields = ['due_bucket', 'created_at']
+    date_hierarchy = 'due_at'
+    list_per_page = 50
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('booking')
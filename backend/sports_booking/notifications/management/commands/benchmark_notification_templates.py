@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.template import Context, Engine
+import time
+
+from notifications.rendering import PARTS, TEMPLATE_DIR, render, render_many
+
+
+SAMPLE_CONTEXT = {
+    'first_name': 'Asha', 'full_name': 'Asha Rao', 'booking_id': '6f1c2b7e-0000-4000-8000-000000000000',
+    'club_name': 'Riverside Arena', 'sport_name': 'Badminton', 'date': '2026-11-02',
+    'start_time': '18:00:00', 'end_time': '19:00:00', 'amount': '500.00',
+}
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark notification rendering (renders/second, all parts per render)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=2000, help='Renders per run (default: 2000)')
+        parser.add_argument('--kind', default='booking_confirmation', help='Notification kind to render')
+
+    def handle(self, *args, **options):
+        count = options['renders']
+        kind = options['kind']
+        contexts = [dict(SAMPLE_CONTEXT, first_name=f'User {i}') for i in range(count)]
+
+        def uncached():
+            # Compile every part from disk on every render, as a per-call
+            # template load without the cached loader would.
+            engine = Engine(
+                dirs=[TEMPLATE_DIR], autoescape=False,
+                loaders=['django.template.loaders.filesystem.Loader'],
+            )
+            for context in contexts:
+                for _, filename in PARTS.values():
+                    try:
+                        template = engine.get_template(f'notifications/{kind}/{filename}')
+                    except Exception:
+                        continue
+                    template.render(Context(context))
+
+        def registry():
+            for context in contexts:
+                render(kind, context)
+
+        def batch():
+            render_many(kind, contexts)
+
+        render(kind, SAMPLE_CONTEXT)  # warm the registry once, like a live worker
+        for label, run in (('uncached', uncached), ('registry', registry), ('render_many', batch)):
+            started = time.perf_counter()
+            run()
+            rate = count / (time.perf_counter() - started)
+            self.stdout.write(f"{label:<12} {rate:10.0f} renders/s")
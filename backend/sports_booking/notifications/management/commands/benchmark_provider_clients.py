@@ -0,0 +1,105 @@
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+import time
+
+from common import providers
+from common.standin_server import serve
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark messages/second for one worker sending through fresh vs '
+        'pooled provider clients, against a local stand-in server'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200, help='Messages per run (default: 200)')
+        parser.add_argument(
+            '--handshake-ms', type=float, default=20.0,
+            help='Artificial per-connection setup delay, modelling a TLS handshake (default: 20)',
+        )
+        parser.add_argument('--latency-ms', type=float, default=2.0, help='Per-request server latency (default: 2)')
+
+    def handle(self, *args, **options):
+        server, base_url = serve(
+            handshake_delay=options['handshake_ms'] / 1000,
+            request_latency=options['latency_ms'] / 1000,
+        )
+        count = options['messages']
+        self.stdout.write(
+            f"Stand-in at {base_url}: {count} messages per run, "
+            f"{options['handshake_ms']}ms handshake, {options['latency_ms']}ms latency"
+        )
+
+        credentials = dict(
+            RESEND_API_KEY='re_bench', STRIPE_SECRET_KEY='sk_test_bench',
+            TWILIO_ACCOUNT_SID='ACbench', TWILIO_AUTH_TOKEN='bench', TWILIO_PHONE_NUMBER='+10000000000',
+        )
+        try:
+            with override_settings(**credentials):
+                providers.reset_clients()
+                for name, fresh, pooled in self._scenarios(base_url):
+                    rows = []
+                    for label, send in (('fresh', fresh), ('pooled', pooled)):
+                        before = server.connections
+                        rate = self._run(send, count)
+                        rows.append((label, rate, server.connections - before))
+                    (_, fresh_rate, fresh_conns), (_, pooled_rate, pooled_conns) = rows
+                    self.stdout.write(
+                        f"{name:<8} fresh: {fresh_rate:8.1f} msg/s ({fresh_conns} conns)   "
+                        f"pooled: {pooled_rate:8.1f} msg/s ({pooled_conns} conns)   "
+                        f"x{pooled_rate / fresh_rate:.1f}"
+                    )
+        finally:
+            providers.reset_clients()
+            server.shutdown()
+
+    def _run(self, send, count):
+        started = time.perf_counter()
+        for i in range(count):
+            send(i)
+        return count / (time.perf_counter() - started)
+
+    def _scenarios(self, base_url):
+        import resend
+        import stripe
+        from twilio.rest import Client
+
+        resend.api_url = base_url
+        stripe.api_base = base_url
+        email = {'from': 'bench@example.com', 'to': ['user@example.com'], 'subject': 'Bench', 'text': 'Hello'}
+
+        def resend_fresh(i):
+            # The SDK default: module-level requests.request, a new connection per call.
+            resend.api_key = 're_bench'
+            resend.default_http_client = resend.RequestsClient(timeout=10)
+            resend.Emails.send(email)
+
+        def resend_pooled(i):
+            providers.resend_client().Emails.send(email)
+
+        def twilio_fresh(i):
+            # What the tasks used to do: a brand-new Client per message.
+            client = Client('ACbench', 'bench')
+            client.api.base_url = base_url
+            client.messages.create(body='Hello', from_='+10000000000', to='+919000000000')
+
+        twilio = providers.twilio_client()
+        twilio.api.base_url = base_url
+
+        def twilio_pooled(i):
+            twilio.messages.create(body='Hello', from_='+10000000000', to='+919000000000')
+
+        def stripe_fresh(i):
+            stripe.api_key = 'sk_test_bench'
+            stripe.default_http_client = stripe.RequestsClient()
+            stripe.PaymentIntent.create(amount=50000, currency='inr')
+
+        def stripe_pooled(i):
+            providers.stripe_client().PaymentIntent.create(amount=50000, currency='inr')
+
+        return [
+            ('resend', resend_fresh, resend_pooled),
+            ('twilio', twilio_fresh, twilio_pooled),
+            ('stripe', stripe_fresh, stripe_pooled),
+        ]
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from urllib.parse import urlparse
+
+from common.fake_providers import FaultInjector
+from common.standin_server import StandInServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the local Resend/Twilio/Stripe stand-in server for offline load '
+        'tests (point web and workers at it with PROVIDER_BACKEND=standin)'
+    )
+
+    def add_arguments(self, parser):
+        url = urlparse(settings.PROVIDER_STANDIN_URL)
+        parser.add_argument('--host', default=url.hostname or '127.0.0.1')
+        parser.add_argument('--port', type=int, default=url.port or 8765)
+        parser.add_argument('--latency-ms', type=float, default=settings.PROVIDER_FAKE_LATENCY_MS)
+        parser.add_argument('--jitter-ms', type=float, default=settings.PROVIDER_FAKE_LATENCY_JITTER_MS)
+        parser.add_argument('--error-rate', type=float, default=settings.PROVIDER_FAKE_ERROR_RATE,
+                            help='Fraction of requests answered with a 500 (0-1)')
+        parser.add_argument('--rate-limit', type=int, default=settings.PROVIDER_FAKE_RATE_LIMIT,
+                            help='Requests/second before answering 429 (0 = unlimited)')
+        parser.add_argument('--handshake-ms', type=float, default=0.0,
+                            help='Extra delay per new connection, modelling a TLS handshake')
+
+    def handle(self, *args, **options):
+        faults = FaultInjector(
+            latency_ms=options['latency_ms'], jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'], rate_limit=options['rate_limit'],
+            seed=settings.PROVIDER_FAKE_SEED,
+        )
+        server = StandInServer(
+            (options['host'], options['port']),
+            handshake_delay=options['handshake_ms'] / 1000, faults=faults,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Provider stand-in on http://{options['host']}:{server.server_address[1]} "
+            f"(latency {options['latency_ms']}±{options['jitter_ms']}ms, "
+            f"error rate {options['error_rate']}, rate limit {options['rate_limit'] or 'off'}/s)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bookings.models import Booking
+from notifications.models import BookingReminder
+from notifications.reminders import sync_booking_reminders
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the booking reminder index from confirmed upcoming bookings'
+
+    def handle(self, *args, **options):
+        BookingReminder.objects.exclude(booking__status='confirmed').delete()
+        bookings = Booking.objects.filter(status='confirmed', date__gte=timezone.localdate())
+        sync_booking_reminders(bookings.iterator())
+        self.stdout.write(self.style.SUCCESS(
+            f'{BookingReminder.objects.count()} booking reminders scheduled'
+        ))
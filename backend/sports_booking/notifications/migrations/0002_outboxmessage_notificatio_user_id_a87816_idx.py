@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_alter_booking_lock'),
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(fields=['user', 'channel', 'status'], name='notificatio_user_id_a87816_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_alter_booking_lock'),
+        ('notifications', '0002_outboxmessage_notificatio_user_id_a87816_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxmessage',
+            name='kind',
+            field=models.CharField(choices=[('booking_confirmation', 'Booking confirmation'), ('booking_status_update', 'Booking status update'), ('waitlist_available', 'Waitlisted slot available'), ('booking_reminder', 'Booking reminder')], max_length=40),
+        ),
+        migrations.CreateModel(
+            name='BookingReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_bucket', models.BigIntegerField()),
+                ('due_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reminder', to='bookings.booking')),
+            ],
+            options={
+                'db_table': 'booking_reminders',
+                'indexes': [models.Index(fields=['due_bucket'], name='booking_rem_due_buc_b1ac7b_idx')],
+            },
+        ),
+    ]
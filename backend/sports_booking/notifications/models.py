@@ -0,0 +1,113 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from datetime import timedelta
+
+User = get_user_model()
+
+
+class OutboxMessage(models.Model):
+    """
+    A notification waiting to be delivered. Rows are written in the SAME
+    transaction as the booking/payment state change that caused them, so a
+    notification can never be lost (broker down) or sent for a change that
+    was rolled back. notifications.tasks.dispatch_outbox drains them.
+
+    While a dispatcher is sending a row it is 'sending' and available_at
+    holds the end of its lease; a row still 'sending' after that (the
+    dispatcher died mid-send) is picked up again.
+    """
+    KIND_CHOICES = [
+        ('booking_confirmation', 'Booking confirmation'),
+        ('booking_status_update', 'Booking status update'),
+        ('waitlist_available', 'Waitlisted slot available'),
+        ('booking_reminder', 'Booking reminder'),
+    ]
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('sms', 'SMS'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ]
+
+    MAX_ATTEMPTS = 5
+
+    kind = models.CharField(max_length=40, choices=KIND_CHOICES)
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='outbox_messages')
+    booking = models.ForeignKey(
+        'bookings.Booking', on_delete=models.CASCADE, null=True, blank=True,
+        related_name='outbox_messages'
+    )
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'notification_outbox'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['user', 'channel', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} ({self.channel}) to {self.user_id} - {self.status}"
+
+    def mark_sent(self):
+        self.status = 'sent'
+        self.sent_at = timezone.now()
+        self.attempts += 1
+        self.last_error = ''
+
+    def mark_sending(self, lease_until):
+        self.status = 'sending'
+        self.available_at = lease_until
+
+    def mark_skipped(self, reason):
+        self.status = 'skipped'
+        self.last_error = reason
+
+    def mark_attempt_failed(self, error):
+        """Back off exponentially; give up after MAX_ATTEMPTS."""
+        self.attempts += 1
+        self.last_error = error
+        if self.attempts >= self.MAX_ATTEMPTS:
+            self.status = 'failed'
+        else:
+            self.status = 'pending'
+            self.available_at = timezone.now() + timedelta(seconds=min(30 * 2 ** self.attempts, 3600))
+
+
+class BookingReminder(models.Model):
+    """
+    Reminder index: one row per confirmed upcoming booking, keyed by the
+    minute its reminder falls due (minutes since the epoch). Instead of one
+    broker-held ETA task per booking, notifications.tasks.send_due_reminders
+    drains every due bucket with a single indexed range query each minute.
+    Kept in sync with the booking by notifications.reminders.
+    """
+    booking = models.OneToOneField(
+        'bookings.Booking', on_delete=models.CASCADE, related_name='reminder'
+    )
+    due_bucket = models.BigIntegerField()
+    due_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'booking_reminders'
+        indexes = [
+            models.Index(fields=['due_bucket']),
+        ]
+
+    def __str__(self):
+        return f"Reminder for {self.booking_id} at {self.due_at}"
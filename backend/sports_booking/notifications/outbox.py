@@ -0,0 +1,139 @@
+"""
+Write notifications to the transactional outbox.
+
+Call these INSIDE the transaction that makes the state change. Nothing is
+sent from the request path — the rows are committed (or rolled back)
+together with the booking/payment update, and dispatch_outbox drains them
+in batches. After commit we give the dispatcher a best-effort nudge so
+delivery stays prompt, but a broker outage only delays notifications
+until the next periodic drain instead of failing the request.
+"""
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from datetime import timedelta
+
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# At most one dispatcher kick per this many seconds, however many requests
+# commit outbox rows — the periodic drain covers anything in between.
+KICK_DEBOUNCE_SECONDS = 1
+
+
+def coalesce_window(kind):
+    """Seconds a `kind` notification may wait to be merged into a digest (0 = never)."""
+    return getattr(settings, 'NOTIFICATION_COALESCE_WINDOWS', {}).get(kind, 0)
+
+
+def _available_at(kind, keys, now):
+    """
+    When new rows for the (user_id, channel) `keys` become due, as
+    {key: available_at}. A coalescable event joins the user's open window
+    on that channel if there is one (so the whole window flushes as a
+    single digest), otherwise it opens a new window. One query for all
+    keys, however many.
+    """
+    window = coalesce_window(kind)
+    if not window:
+        return dict.fromkeys(keys, now)
+    keys = set(keys)
+    coalescable = [k for k, _ in OutboxMessage.KIND_CHOICES if coalesce_window(k)]
+    open_until = {
+        (user_id, channel): until
+        for user_id, channel, until in OutboxMessage.objects.filter(
+            user_id__in={user_id for user_id, _ in keys}, channel__in={channel for _, channel in keys},
+            status='pending', kind__in=coalescable, available_at__gt=now,
+        ).values_list('user_id', 'channel').annotate(until=Min('available_at')).order_by()
+    }
+    return {key: open_until.get(key) or now + timedelta(seconds=window) for key in keys}
+
+
+def _kick_dispatcher():
+    try:
+        if cache.add('notifications:outbox:kick', 1, timeout=KICK_DEBOUNCE_SECONDS):
+            from .tasks import dispatch_outbox
+            dispatch_outbox.delay()
+    except Exception as e:
+        logger.warning(f"Could not kick outbox dispatcher, periodic drain will pick it up: {e}")
+
+
+def enqueue(kind, user_id, channels, booking=None, payload=None):
+    due = _available_at(kind, [(user_id, channel) for channel in channels], timezone.now())
+    messages = OutboxMessage.objects.bulk_create([
+        OutboxMessage(
+            kind=kind, channel=channel, user_id=user_id, booking=booking, payload=payload or {},
+            available_at=due[(user_id, channel)],
+        )
+        for channel in channels
+    ])
+    transaction.on_commit(_kick_dispatcher)
+    return messages
+
+
+def enqueue_booking_confirmation(booking):
+    return enqueue('booking_confirmation', booking.user_id, ['email', 'sms'], booking=booking)
+
+
+def enqueue_booking_status_update(booking, new_status):
+    return enqueue(
+        'booking_status_update', booking.user_id, ['email'],
+        booking=booking, payload={'new_status': new_status},
+    )
+
+
+def enqueue_booking_reminders(bookings):
+    """Email + SMS reminder rows for many bookings in one insert (reminder drainer)."""
+    bookings = list(bookings)
+    channels = ('email', 'sms')
+    due = _available_at(
+        'booking_reminder', [(booking.user_id, channel) for booking in bookings for channel in channels],
+        timezone.now(),
+    )
+    messages = OutboxMessage.objects.bulk_create([
+        OutboxMessage(
+            kind='booking_reminder', channel=channel, user_id=booking.user_id,
+            booking=booking, available_at=due[(booking.user_id, channel)],
+        )
+        for booking in bookings
+        for channel in channels
+    ])
+    if messages:
+        transaction.on_commit(_kick_dispatcher)
+    return messages
+
+
+def enqueue_waitlist_notifications(club_id, sport_id, date, start_time):
+    """
+    One outbox row per user waitlisted for the slot. Entries are marked
+    notified in the same transaction, so a retry can't notify anyone twice.
+    """
+    from bookings.models import SlotWaitlist
+
+    entries = list(SlotWaitlist.objects.select_for_update(of=('self',)).filter(
+        club_id=club_id, sport_id=sport_id, date=date,
+        start_time=start_time, notified=False
+    ).select_related('user', 'club', 'sport'))
+    if not entries:
+        return []
+
+    messages = OutboxMessage.objects.bulk_create([
+        OutboxMessage(
+            kind='waitlist_available', channel='email', user_id=entry.user_id,
+            payload={
+                'club_name': entry.club.name,
+                'sport_name': entry.sport.name,
+                'date': str(entry.date),
+                'start_time': str(entry.start_time),
+                'end_time': str(entry.end_time),
+            },
+        )
+        for entry in entries if entry.user.email
+    ])
+    SlotWaitlist.objects.filter(id__in=[e.id for e in entries]).update(notified=True)
+    transaction.on_commit(_kick_dispatcher)
+    return messages
@@ -0,0 +1,52 @@
+"""
+Keep the BookingReminder index in step with bookings.
+
+Every write is O(1) on the booking's own row: confirming or rescheduling
+upserts it into the right minute bucket, anything else (cancelled,
+completed, slot already too close) removes it. post_save on Booking calls
+sync_booking_reminder(); code paths that bypass save() — queryset.update()
+in admin actions — call sync_booking_reminders() afterwards.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import BookingReminder
+
+
+def reminder_lead():
+    return timedelta(minutes=getattr(settings, 'BOOKING_REMINDER_LEAD_MINUTES', 120))
+
+
+def minute_bucket(moment):
+    return int(moment.timestamp() // 60)
+
+
+def reminder_due_at(booking):
+    """When `booking`'s reminder should go out, or None if it needs none."""
+    if booking.status != 'confirmed':
+        return None
+    starts_at = timezone.make_aware(datetime.combine(booking.date, booking.start_time))
+    due_at = starts_at - reminder_lead()
+    # Booked inside the lead window: the confirmation is reminder enough.
+    if due_at <= timezone.now():
+        return None
+    return due_at
+
+
+def sync_booking_reminder(booking):
+    due_at = reminder_due_at(booking)
+    if due_at is None:
+        BookingReminder.objects.filter(booking_id=booking.pk).delete()
+        return None
+    reminder, _ = BookingReminder.objects.update_or_create(
+        booking_id=booking.pk,
+        defaults={'due_at': due_at, 'due_bucket': minute_bucket(due_at)},
+    )
+    return reminder
+
+
+def sync_booking_reminders(bookings):
+    for booking in bookings:
+        sync_booking_reminder(booking)
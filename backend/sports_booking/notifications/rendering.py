@@ -0,0 +1,95 @@
+"""
+Notification template registry.
+
+Each notification kind lives in templates/notifications/<kind>/ as up to
+four parts — subject.txt, body.txt, body.html, sms.txt — rendered from ONE
+context dict. Templates are compiled once per worker process (cached
+loader) and reused for every message; plain-text parts use an engine with
+autoescaping off so names like "O'Brien" survive in emails and SMS.
+
+Contexts hold pre-formatted strings (see booking_context) rather than model
+instances: output matches the old f-strings exactly and rendering never
+touches the database.
+"""
+from collections import namedtuple
+from pathlib import Path
+
+from django.template import Context, Engine
+from django.template.exceptions import TemplateDoesNotExist
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates'
+
+_CACHED_LOADERS = [('django.template.loaders.cached.Loader', ['django.template.loaders.filesystem.Loader'])]
+
+_text_engine = Engine(dirs=[TEMPLATE_DIR], loaders=_CACHED_LOADERS, autoescape=False)
+_html_engine = Engine(dirs=[TEMPLATE_DIR], loaders=_CACHED_LOADERS, autoescape=True)
+
+PARTS = {
+    'subject': (_text_engine, 'subject.txt'),
+    'text': (_text_engine, 'body.txt'),
+    'html': (_html_engine, 'body.html'),
+    'sms': (_text_engine, 'sms.txt'),
+}
+
+RenderedNotification = namedtuple('RenderedNotification', ['subject', 'text', 'html', 'sms'])
+
+_compiled = {}
+
+
+def _templates(kind):
+    """Compiled templates for every part `kind` defines (None where absent)."""
+    templates = _compiled.get(kind)
+    if templates is None:
+        templates = {}
+        for part, (engine, filename) in PARTS.items():
+            try:
+                templates[part] = engine.get_template(f'notifications/{kind}/{filename}')
+            except TemplateDoesNotExist:
+                templates[part] = None
+        if not any(templates.values()):
+            raise KeyError(f"Unknown notification kind: {kind}")
+        _compiled[kind] = templates
+    return templates
+
+
+def _render(templates, context):
+    rendered = {}
+    for part, template in templates.items():
+        if template is None:
+            rendered[part] = None
+            continue
+        output = template.render(Context(context, autoescape=template.engine.autoescape))
+        rendered[part] = output if part == 'html' else output.strip()
+    return RenderedNotification(**rendered)
+
+
+def render(kind, context):
+    return _render(_templates(kind), context)
+
+
+def render_many(kind, contexts):
+    """Render one kind for many recipients (fan-out paths), resolving its templates once."""
+    templates = _templates(kind)
+    return [_render(templates, context) for context in contexts]
+
+
+def user_context(user):
+    return {
+        'first_name': user.first_name or user.username,
+        'full_name': user.get_full_name() or user.username,
+    }
+
+
+def booking_context(booking, user, **extra):
+    context = {
+        **user_context(user),
+        'booking_id': str(booking.id),
+        'club_name': booking.club.name,
+        'sport_name': booking.sport.name,
+        'date': str(booking.date),
+        'start_time': str(booking.start_time),
+        'end_time': str(booking.end_time),
+        'amount': str(booking.amount),
+    }
+    context.update(extra)
+    return context
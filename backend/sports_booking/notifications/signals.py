@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from bookings.models import Booking
+from .reminders import sync_booking_reminder
+
+# Saves that can't move the slot or change the status can't move the reminder.
+REMINDER_FIELDS = {'status', 'date', 'start_time'}
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not REMINDER_FIELDS & set(update_fields):
+        return
+    if created and instance.status != 'confirmed':
+        return  # nothing to add, nothing to remove
+    sync_booking_reminder(instance)
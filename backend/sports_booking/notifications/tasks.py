@@ -0,0 +1,251 @@
+from celery import shared_task
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+import logging
+
+from common.email_utils import send_resend_batch
+from common.sms_utils import send_twilio_sms, twilio_configured
+from .models import BookingReminder, OutboxMessage
+from .outbox import coalesce_window, enqueue_booking_reminders
+from .reminders import minute_bucket
+from .rendering import booking_context, render, render_many, user_context
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_UPDATE_FIELDS = ['status', 'attempts', 'last_error', 'available_at', 'sent_at']
+
+
+def _render_rows(rows, bookings, users):
+    """Render every row, grouped by kind so each kind's templates resolve once."""
+    by_kind = defaultdict(list)
+    for row in rows:
+        by_kind[row.kind].append(row)
+
+    rendered = {}
+    for kind, kind_rows in by_kind.items():
+        contexts = []
+        for row in kind_rows:
+            user = users[row.user_id]
+            booking = bookings.get(row.booking_id)
+            if booking is not None:
+                contexts.append(booking_context(booking, user, **row.payload))
+            else:
+                contexts.append({**user_context(user), **row.payload})
+        rendered.update(zip((row.id for row in kind_rows), render_many(kind, contexts)))
+    return rendered
+
+
+def _build_envelopes(rows, bookings, users):
+    """
+    Turn rows into outgoing messages as (rows, rendered) pairs. Rows of
+    coalescable kinds for the same user and channel — everything that
+    landed in one coalescing window — become a single digest.
+    """
+    rendered = _render_rows(rows, bookings, users)
+    envelopes = []
+    windows = defaultdict(list)
+    for row in rows:
+        if coalesce_window(row.kind):
+            windows[(row.user_id, row.channel)].append(row)
+        else:
+            envelopes.append(([row], rendered[row.id]))
+
+    for (user_id, _), group in windows.items():
+        if len(group) == 1:
+            envelopes.append((group, rendered[group[0].id]))
+            continue
+        digest = render('digest', {
+            **user_context(users[user_id]),
+            'items': [rendered[row.id] for row in group],
+        })
+        envelopes.append((group, digest))
+    return envelopes
+
+
+def _deliverable(rows, users, field, reason):
+    deliverable = []
+    for row in rows:
+        if getattr(users[row.user_id], field):
+            deliverable.append(row)
+        else:
+            row.mark_skipped(reason)
+    return deliverable
+
+
+def _send_email_batch(rows, bookings, users):
+    if not settings.RESEND_API_KEY:
+        for row in rows:
+            row.mark_skipped('RESEND_API_KEY not set')
+        return
+
+    envelopes = _build_envelopes(
+        _deliverable(rows, users, 'email', 'No email address'), bookings, users
+    )
+    results = send_resend_batch([{
+        'subject': message.subject,
+        'message': message.text,
+        'html': message.html,
+        'to_email': users[group[0].user_id].email,
+    } for group, message in envelopes])
+    for (group, _), result in zip(envelopes, results):
+        for row in group:
+            if result:
+                row.mark_sent()
+            else:
+                row.mark_attempt_failed('Resend batch send failed')
+
+
+def _send_sms_batch(rows, bookings, users):
+    if not twilio_configured():
+        for row in rows:
+            row.mark_skipped('Twilio not configured')
+        return
+
+    envelopes = _build_envelopes(
+        _deliverable(rows, users, 'mobile_number', 'No mobile number'), bookings, users
+    )
+    for group, message in envelopes:
+        sid = send_twilio_sms(message.sms, users[group[0].user_id].mobile_number)
+        for row in group:
+            if sid:
+                row.mark_sent()
+            else:
+                row.mark_attempt_failed('Twilio send failed')
+
+
+CHANNEL_SENDERS = {
+    'email': _send_email_batch,
+    'sms': _send_sms_batch,
+}
+
+
+def _claim(batch_size):
+    """
+    Lease up to `batch_size` due rows (skip_locked, so parallel dispatchers
+    never claim the same row) in one short transaction. Coalescable rows
+    bring the rest of their window along, so a window is never split
+    across two batches (two digests).
+    """
+    now = timezone.now()
+    due = Q(status='pending') | Q(status='sending')
+    with transaction.atomic():
+        rows = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(due, available_at__lte=now)
+            .order_by('id')[:batch_size]
+        )
+        # Rows of one window share (user, channel, available_at): see outbox._available_at
+        windows = {
+            (row.user_id, row.channel, row.available_at) for row in rows
+            if row.status == 'pending' and coalesce_window(row.kind)
+        }
+        if windows:
+            claimed = {row.id for row in rows}
+            rows += [
+                row for row in OutboxMessage.objects.select_for_update(skip_locked=True).filter(
+                    reduce(or_, (Q(user_id=u, channel=c, available_at=a) for u, c, a in windows)),
+                    status='pending',
+                ).order_by('id')
+                if row.id not in claimed and coalesce_window(row.kind)
+            ]
+        lease_until = now + timedelta(seconds=settings.NOTIFICATION_OUTBOX_LEASE_SECONDS)
+        for row in rows:
+            row.mark_sending(lease_until)
+        OutboxMessage.objects.bulk_update(rows, ['status', 'available_at'])
+    return rows
+
+
+def _record(rows):
+    """Store each row's outcome on its own, so one failed write can't resend the others."""
+    for row in rows:
+        OutboxMessage.objects.filter(pk=row.pk, status='sending').update(
+            **{field: getattr(row, field) for field in OUTBOX_UPDATE_FIELDS}
+        )
+
+
+@shared_task
+def dispatch_outbox(batch_size=None):
+    """
+    Drain one batch of due outbox rows: claim them (_claim), load every
+    booking and user they need in one query each, then send per channel in
+    bulk outside any transaction, recording each row's outcome as its
+    channel finishes. A dispatcher that dies mid-send leaves its rows
+    leased; they go out again once the lease expires.
+    """
+    from bookings.models import Booking
+    User = get_user_model()
+
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_OUTBOX_BATCH_SIZE', 100)
+
+    try:
+        rows = _claim(batch_size)
+        if not rows:
+            return "Outbox empty"
+
+        bookings = Booking.objects.select_related('club', 'sport').in_bulk(
+            {r.booking_id for r in rows if r.booking_id}
+        )
+        users = User.objects.in_bulk({r.user_id for r in rows})
+
+        by_channel = defaultdict(list)
+        for row in rows:
+            by_channel[row.channel].append(row)
+        for channel, channel_rows in by_channel.items():
+            CHANNEL_SENDERS[channel](channel_rows, bookings, users)
+            _record(channel_rows)
+
+        sent = sum(1 for r in rows if r.status == 'sent')
+        logger.info(f"Outbox dispatch: {sent}/{len(rows)} sent")
+        return f"Dispatched {sent}/{len(rows)} notifications"
+
+    except Exception as e:
+        logger.error(f"Outbox dispatch failed: {e}")
+        return f"Failed: {str(e)}"
+
+
+@shared_task
+def send_due_reminders(batch_size=None):
+    """
+    Drain every reminder bucket up to the current minute (earlier buckets
+    too, in case a run was missed): one indexed range query per batch, one
+    bulk insert into the outbox, one delete. Rows are locked with
+    skip_locked so overlapping runs never double-remind.
+    """
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_REMINDER_BATCH_SIZE', 500)
+    current = minute_bucket(timezone.now())
+    queued = 0
+
+    try:
+        while True:
+            with transaction.atomic():
+                reminders = list(
+                    BookingReminder.objects.select_for_update(skip_locked=True, of=('self',))
+                    .filter(due_bucket__lte=current)
+                    .select_related('booking')
+                    .order_by('due_bucket')[:batch_size]
+                )
+                if not reminders:
+                    break
+                # The index is kept in sync on save, but queryset.update()
+                # elsewhere can still cancel a booking behind its back.
+                bookings = [r.booking for r in reminders if r.booking.status == 'confirmed']
+                enqueue_booking_reminders(bookings)
+                BookingReminder.objects.filter(id__in=[r.id for r in reminders]).delete()
+            queued += len(bookings)
+            if len(reminders) < batch_size:
+                break
+
+        if queued:
+            logger.info(f"Queued {queued} booking reminders")
+        return f"Queued {queued} reminders"
+
+    except Exception as e:
+        logger.error(f"Reminder drain failed: {e}")
+        return f"Failed: {str(e)}"
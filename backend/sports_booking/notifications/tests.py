@@ -0,0 +1,214 @@
+from datetime import time, timedelta
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from bookings.models import Booking
+from clubs.models import Club, Sport
+
+from .models import BookingReminder, OutboxMessage
+from .outbox import enqueue_booking_confirmation, enqueue_booking_reminders
+from .reminders import minute_bucket, reminder_due_at
+from .rendering import render, render_many
+from .tasks import dispatch_outbox, send_due_reminders
+
+
+@override_settings(
+    RESEND_API_KEY='re_test',
+    TWILIO_ACCOUNT_SID='AC_test', TWILIO_AUTH_TOKEN='token', TWILIO_PHONE_NUMBER='+10000000000',
+    NOTIFICATION_COALESCE_WINDOWS={},
+)
+class OutboxDispatchTests(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(
+            name='Arena', location='Pune', opening_time=time(6), closing_time=time(22)
+        )
+        self.sport = Sport.objects.create(name='Badminton', club=self.club, price_per_hour=500)
+        self.bookings = []
+        for i in range(3):
+            user = User.objects.create_user(
+                username=f'user{i}', email=f'user{i}@example.com',
+                mobile_number=f'900000000{i}', password='UserPass123',
+            )
+            self.bookings.append(Booking.objects.create(
+                user=user, club=self.club, sport=self.sport,
+                date=timezone.now().date() + timedelta(days=2),
+                start_time=time(10 + i), end_time=time(11 + i),
+                amount=500, status='confirmed',
+            ))
+
+    def test_rolled_back_state_change_leaves_no_notification(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                enqueue_booking_confirmation(self.bookings[0])
+                raise RuntimeError('payment save failed')
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @mock.patch('notifications.tasks.send_twilio_sms', return_value='SM_test')
+    @mock.patch('notifications.tasks.send_resend_batch')
+    def test_dispatch_sends_one_email_batch_for_many_rows(self, send_batch, send_sms):
+        send_batch.side_effect = lambda messages: [{'id': 'em'} for _ in messages]
+        for booking in self.bookings:
+            enqueue_booking_confirmation(booking)
+
+        # claim (lock+select, bulk_update, savepoint bookkeeping), bookings,
+        # users, then one outcome update per row
+        with self.assertNumQueries(12):
+            dispatch_outbox()
+
+        send_batch.assert_called_once()
+        self.assertEqual(len(send_batch.call_args[0][0]), 3)
+        self.assertEqual(send_sms.call_count, 3)
+        self.assertEqual(OutboxMessage.objects.filter(status='sent').count(), 6)
+
+    @mock.patch('notifications.tasks.send_resend_batch', side_effect=lambda messages: [None] * len(messages))
+    @mock.patch('notifications.tasks.send_twilio_sms', return_value=None)
+    def test_failed_send_is_retried_later(self, send_sms, send_batch):
+        enqueue_booking_confirmation(self.bookings[0])
+        dispatch_outbox()
+
+        for message in OutboxMessage.objects.all():
+            self.assertEqual(message.status, 'pending')
+            self.assertEqual(message.attempts, 1)
+            self.assertGreater(message.available_at, timezone.now())
+
+    @mock.patch('notifications.tasks.send_twilio_sms', side_effect=RuntimeError('worker killed'))
+    @mock.patch('notifications.tasks.send_resend_batch')
+    def test_crash_mid_batch_resends_only_unrecorded_rows_after_the_lease(self, send_batch, send_sms):
+        send_batch.side_effect = lambda messages: [{'id': 'em'} for _ in messages]
+        enqueue_booking_confirmation(self.bookings[0])
+        dispatch_outbox()
+
+        self.assertEqual(OutboxMessage.objects.get(channel='email').status, 'sent')
+        sms = OutboxMessage.objects.get(channel='sms')
+        self.assertEqual(sms.status, 'sending')
+        self.assertEqual(dispatch_outbox(), "Outbox empty")  # still leased
+
+        OutboxMessage.objects.filter(pk=sms.pk).update(available_at=timezone.now())
+        send_sms.side_effect = None
+        send_sms.return_value = 'SM_test'
+        dispatch_outbox()
+        self.assertEqual(OutboxMessage.objects.get(pk=sms.pk).status, 'sent')
+        send_batch.assert_called_once()
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOWS={'booking_confirmation': 60})
+    @mock.patch('notifications.tasks.send_twilio_sms', return_value='SM_test')
+    @mock.patch('notifications.tasks.send_resend_batch')
+    def test_events_in_one_window_go_out_as_one_digest(self, send_batch, send_sms):
+        send_batch.side_effect = lambda messages: [{'id': 'em'} for _ in messages]
+        second = self.bookings[1]
+        second.user = self.bookings[0].user
+        second.save()
+        enqueue_booking_confirmation(self.bookings[0])
+        enqueue_booking_confirmation(second)
+
+        self.assertEqual(OutboxMessage.objects.values('available_at').distinct().count(), 1)
+        self.assertEqual(dispatch_outbox(), "Outbox empty")  # window still open
+
+        OutboxMessage.objects.update(available_at=timezone.now())
+        dispatch_outbox()
+
+        emails = send_batch.call_args[0][0]
+        self.assertEqual(len(emails), 1)
+        self.assertEqual(emails[0]['subject'], 'Your Sports Club updates (2)')
+        send_sms.assert_called_once()
+        self.assertEqual(OutboxMessage.objects.filter(status='sent').count(), 4)
+
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOWS={'booking_confirmation': 60})
+    @mock.patch('notifications.tasks.send_twilio_sms', return_value='SM_test')
+    @mock.patch('notifications.tasks.send_resend_batch')
+    def test_batch_boundary_never_splits_a_window(self, send_batch, send_sms):
+        send_batch.side_effect = lambda messages: [{'id': 'em'} for _ in messages]
+        for booking in self.bookings[1:]:
+            booking.user = self.bookings[0].user
+            booking.save()
+        for booking in self.bookings:
+            enqueue_booking_confirmation(booking)
+        OutboxMessage.objects.update(available_at=timezone.now())
+
+        dispatch_outbox(batch_size=2)
+        emails = send_batch.call_args[0][0]
+        self.assertEqual(len(emails), 1)
+        self.assertEqual(emails[0]['subject'], 'Your Sports Club updates (3)')
+        send_sms.assert_called_once()
+        self.assertFalse(OutboxMessage.objects.exclude(status='sent').exists())
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOWS={'booking_reminder': 60})
+    def test_batch_enqueue_finds_open_windows_in_one_query(self):
+        enqueue_booking_reminders(self.bookings[:1])
+        with self.assertNumQueries(2):  # open windows, then the insert
+            enqueue_booking_reminders(self.bookings)
+        first_user = OutboxMessage.objects.filter(user=self.bookings[0].user, channel='email')
+        self.assertEqual(first_user.count(), 2)
+        self.assertEqual(first_user.values('available_at').distinct().count(), 1)
+
+
+class BookingReminderTests(TestCase):
+    def setUp(self):
+        club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        sport = Sport.objects.create(name='Badminton', club=club, price_per_hour=500)
+        user = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        self.booking = Booking.objects.create(
+            user=user, club=club, sport=sport,
+            date=timezone.now().date() + timedelta(days=2),
+            start_time=time(10), end_time=time(11), amount=500, status='pending',
+        )
+
+    def test_index_follows_confirm_reschedule_and_cancel(self):
+        self.assertFalse(BookingReminder.objects.exists())
+
+        self.booking.status = 'confirmed'
+        self.booking.save()
+        reminder = BookingReminder.objects.get(booking=self.booking)
+        self.assertEqual(reminder.due_bucket, minute_bucket(reminder_due_at(self.booking)))
+
+        self.booking.start_time, self.booking.end_time = time(12), time(13)
+        self.booking.save()
+        reminder.refresh_from_db()
+        self.assertEqual(reminder.due_bucket, minute_bucket(reminder_due_at(self.booking)))
+        self.assertEqual(BookingReminder.objects.count(), 1)
+
+        self.booking.cancel('Plans changed')
+        self.assertFalse(BookingReminder.objects.exists())
+
+    def test_drainer_queues_due_buckets_only(self):
+        self.booking.status = 'confirmed'
+        self.booking.save()
+        send_due_reminders()
+        self.assertTrue(BookingReminder.objects.exists())  # not due yet
+
+        BookingReminder.objects.update(due_bucket=minute_bucket(timezone.now()) - 5)
+        send_due_reminders()
+        self.assertFalse(BookingReminder.objects.exists())
+        self.assertEqual(
+            sorted(OutboxMessage.objects.filter(kind='booking_reminder').values_list('channel', flat=True)),
+            ['email', 'sms'],
+        )
+
+
+class NotificationRenderingTests(TestCase):
+    context = {
+        'first_name': "O'Brien", 'club_name': 'Smash & Volley', 'sport_name': 'Tennis',
+        'date': '2026-11-02', 'start_time': '18:00:00', 'end_time': '19:00:00', 'amount': '500.00',
+    }
+
+    def test_text_parts_are_not_escaped_but_html_is(self):
+        rendered = render('booking_confirmation', self.context)
+        self.assertEqual(rendered.subject, 'Booking Confirmed - Smash & Volley')
+        self.assertIn("Dear O'Brien,", rendered.text)
+        self.assertIn('Smash &amp; Volley', rendered.html)
+        self.assertEqual(
+            rendered.sms,
+            "Booking Confirmed! Smash & Volley - Tennis on 2026-11-02 at 18:00:00. Amount: ₹500.00",
+        )
+
+    def test_render_many_matches_single_renders(self):
+        contexts = [dict(self.context, first_name=name) for name in ('Asha', 'Ravi')]
+        self.assertEqual(render_many('booking_confirmation', contexts),
+                         [render('booking_confirmation', c) for c in contexts])
@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.utils import timezone
 from django.utils.html import format_html
-from .models import Payment
+from bookings.models import Booking
+from reports.rollups import refreshing
+from .ledger import record_payments
+from .models import DailyClubBalance, LedgerEntry, Payment, ReconciliationCheckpoint, RefundJob, StripeEvent
 
 
 @admin.register(Payment)
@@ -78,6 +81,7 @@ class PaymentAdmin(admin.ModelAdmin):
             payment.status = 'completed'
             payment.completed_at = timezone.now()
             payment.save(update_fields=['status', 'completed_at'])
+            record_payments([payment])
             if payment.booking.status != 'confirmed':
                 payment.booking.status = 'confirmed'
                 payment.booking.save(update_fields=['status', 'updated_at'])
@@ -86,6 +90,89 @@ class PaymentAdmin(admin.ModelAdmin):
     mark_as_completed.short_description = 'Mark as completed (also confirms booking)'
 
     def mark_as_failed(self, request, queryset):
-        updated = queryset.update(status='failed', failed_at=timezone.now())
+        with refreshing(Booking.objects.filter(payment__in=queryset)):
+            updated = queryset.update(status='failed', failed_at=timezone.now())
         self.message_user(request, f'{updated} payments marked as failed.')
-    mark_as_failed.short_description = 'Mark as failed'
\ No newline at end of file
+    mark_as_failed.short_description = 'Mark as failed'
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'type', 'ordering_key', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'type', 'received_at']
+    search_fields = ['event_id', 'ordering_key']
+    readonly_fields = ['event_id', 'type', 'ordering_key', 'stripe_created', 'payload', 'received_at', 'processed_at']
+    date_hierarchy = 'received_at'
+    list_per_page = 50
+
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.filter(status__in=['pending', 'failed']).update(
+            status='pending', attempts=0, available_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} event(s) re-queued.')
+    retry_now.short_description = 'Re-queue selected events'
+
+
+@admin.register(RefundJob)
+class RefundJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'payment', 'amount', 'status', 'attempts', 'stripe_refund_id', 'created_at', 'completed_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['payment__stripe_payment_intent_id', 'payment__booking__id', 'stripe_refund_id', 'idempotency_key']
+    readonly_fields = ['payment', 'amount', 'idempotency_key', 'requested_by', 'stripe_refund_id', 'created_at', 'completed_at']
+    date_hierarchy = 'created_at'
+    list_per_page = 50
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('payment__booking')
+
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        # Same idempotency key, so a refund Stripe already made is not repeated
+        updated = queryset.filter(status__in=['pending', 'failed']).update(
+            status='pending', attempts=0, available_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} refund(s) re-queued.')
+    retry_now.short_description = 'Re-queue selected refunds'
+
+
+@admin.register(ReconciliationCheckpoint)
+class ReconciliationCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['name', 'scanned_until', 'updated_at']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'amount', 'currency', 'club', 'business_date', 'payment', 'reference', 'occurred_at']
+    list_filter = ['kind', 'club', 'business_date']
+    search_fields = ['entry_key', 'reference', 'payment__stripe_payment_intent_id']
+    date_hierarchy = 'business_date'
+    list_per_page = 50
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('club', 'payment')
+
+    # Append-only: entries are posted by payments.ledger, never edited here
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyClubBalance)
+class DailyClubBalanceAdmin(admin.ModelAdmin):
+    list_display = ['club', 'date', 'charges', 'refunds', 'adjustments', 'net', 'charge_count', 'refund_count']
+    list_filter = ['club']
+    date_hierarchy = 'date'
+    readonly_fields = ['updated_at']
+    list_per_page = 50
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('club')
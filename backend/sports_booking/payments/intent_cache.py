@@ -0,0 +1,56 @@
+"""
+Local PaymentIntent state, so confirm_payment rarely needs Stripe.
+
+Snapshots hold only what confirm_payment checks (status, amount and the
+booking_id metadata). They are written from the signature-verified
+webhook path (payments.webhooks.record_event) and from intents that
+confirm_payment itself retrieved. Settled states ('succeeded',
+'canceled') are final at Stripe and kept for a while. Anything else can
+change any second, so it is kept only long enough to absorb a burst of
+retries. A cache outage only means falling back to Stripe.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = {'succeeded', 'canceled'}
+
+
+def _key(intent_id):
+    return f'payments:intent:{intent_id}'
+
+
+def snapshot(intent):
+    """The fields confirm_payment needs, from a stripe PaymentIntent or an event payload dict."""
+    metadata = intent.get('metadata') or {}
+    return {
+        'id': intent['id'],
+        'status': intent['status'],
+        'amount': intent['amount'],
+        'metadata': {'booking_id': str(metadata['booking_id'])} if metadata.get('booking_id') else {},
+    }
+
+
+def remember_intent(intent):
+    state = snapshot(intent)
+    try:
+        if state['status'] in FINAL_STATUSES:
+            cache.set(_key(state['id']), state, timeout=getattr(settings, 'PAYMENT_INTENT_CACHE_TTL', 600))
+        else:
+            # add, not set: a late, out-of-order event must never replace a
+            # settled state with an older one
+            cache.add(_key(state['id']), state, timeout=getattr(settings, 'PAYMENT_INTENT_PENDING_CACHE_TTL', 5))
+    except Exception as e:
+        logger.warning(f"Could not cache PaymentIntent {state['id']}: {e}")
+    return state
+
+
+def cached_intent(intent_id):
+    try:
+        return cache.get(_key(intent_id))
+    except Exception as e:
+        logger.warning(f"PaymentIntent cache unavailable: {e}")
+        return None
@@ -0,0 +1,147 @@
+"""
+Payment ledger. Every payment state transition calls record_payments(),
+which posts the entries the payment's status implies — a charge once it
+has completed, plus a refund once it has been refunded — and folds them
+into DailyClubBalance in the same transaction.
+
+Each entry has a deterministic entry_key, so calling record_payments()
+again for the same state (webhook redeliveries, reconciliation catching
+up, the backfill command) posts nothing new.
+
+Balances are written for a booking's date, so posting also invalidates
+the stored reports of closed periods containing it (reports.jobs).
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import DailyClubBalance, LedgerEntry
+
+BALANCE_FIELDS = ['charges', 'refunds', 'adjustments', 'net', 'charge_count', 'refund_count']
+
+
+def _entries_for(payment):
+    booking = payment.booking
+    common = {
+        'payment': payment, 'club_id': booking.club_id, 'business_date': booking.date,
+        'currency': payment.currency,
+    }
+    entries = []
+    if payment.status in ('completed', 'refunded'):
+        entries.append(LedgerEntry(
+            entry_key=f"charge:{payment.id}", kind='charge', amount=payment.amount,
+            reference=payment.stripe_payment_intent_id,
+            occurred_at=payment.completed_at or timezone.now(), **common,
+        ))
+    if payment.status == 'refunded':
+        entries.append(LedgerEntry(
+            entry_key=f"refund:{payment.id}", kind='refund', amount=-payment.amount,
+            reference=(payment.metadata or {}).get('refund_id', ''), **common,
+        ))
+    return entries
+
+
+def _apply_to_balances(entries):
+    from reports.jobs import invalidate
+
+    deltas = defaultdict(lambda: dict.fromkeys(BALANCE_FIELDS, 0))
+    for entry in entries:
+        delta = deltas[(entry.club_id, entry.business_date)]
+        delta['net'] += entry.amount
+        if entry.kind == 'charge':
+            delta['charges'] += entry.amount
+            delta['charge_count'] += 1
+        elif entry.kind == 'refund':
+            delta['refunds'] -= entry.amount
+            delta['refund_count'] += 1
+        else:
+            delta['adjustments'] += entry.amount
+
+    DailyClubBalance.objects.bulk_create([
+        DailyClubBalance(club_id=club_id, date=day) for club_id, day in deltas
+    ], ignore_conflicts=True)
+    for (club_id, day), delta in deltas.items():
+        DailyClubBalance.objects.filter(club_id=club_id, date=day).update(**{
+            field: F(field) + value for field, value in delta.items() if value
+        })
+    invalidate(day for _, day in deltas)
+
+
+@transaction.atomic(savepoint=False)
+def post(entries):
+    """Append the entries whose keys are new and update the balances. Returns the number posted."""
+    entries = [e for e in entries if e.club_id is not None]
+    if not entries:
+        return 0
+    existing = set(LedgerEntry.objects.filter(
+        entry_key__in=[e.entry_key for e in entries]
+    ).values_list('entry_key', flat=True))
+    new = {e.entry_key: e for e in entries if e.entry_key not in existing}
+    # Concurrent posters (confirm_payment, the webhook worker, the refund
+    # worker) can pass the check above for the same key: insert one at a
+    # time and only fold in what this call actually inserted.
+    posted = []
+    for entry in new.values():
+        try:
+            with transaction.atomic():
+                entry.save(force_insert=True)
+        except IntegrityError:
+            continue
+        posted.append(entry)
+    if posted:
+        _apply_to_balances(posted)
+    return len(posted)
+
+
+def record_payments(payments):
+    """Post whatever the payments' current statuses imply and hasn't been posted yet."""
+    return post([entry for payment in payments for entry in _entries_for(payment)])
+
+
+def record_adjustment(club, business_date, amount, note, key):
+    """A manual correction (positive or negative); `key` makes it idempotent."""
+    return post([LedgerEntry(
+        entry_key=f"adjustment:{key}", kind='adjustment', amount=Decimal(amount),
+        club=club, business_date=business_date, note=note,
+    )])
+
+
+def totals(start=None, end=None, club=None):
+    """Charges, refunds, adjustments and net over a date range, read from the daily balances."""
+    balances = DailyClubBalance.objects.all()
+    if start:
+        balances = balances.filter(date__gte=start)
+    if end:
+        balances = balances.filter(date__lte=end)
+    if club is not None:
+        balances = balances.filter(club=club)
+    summed = balances.aggregate(**{field: Sum(field) for field in BALANCE_FIELDS})
+    return {field: value or 0 for field, value in summed.items()}
+
+
+def running_balances(club, start, end):
+    """[(date, net, running balance)] for one club; the running balance includes every day before `start`."""
+    opening = totals(end=start - timedelta(days=1), club=club)['net']
+    rows, running = [], opening
+    for day, net in DailyClubBalance.objects.filter(
+        club=club, date__gte=start, date__lte=end
+    ).values_list('date', 'net'):
+        running += net
+        rows.append((day, net, running))
+    return rows
+
+
+@transaction.atomic
+def rebuild_balances():
+    """Recompute DailyClubBalance from the ledger (after a manual fix-up or to verify drift)."""
+    from reports.jobs import invalidate_range
+
+    DailyClubBalance.objects.all().delete()
+    invalidate_range()
+    _apply_to_balances(LedgerEntry.objects.exclude(club=None).only(
+        'kind', 'amount', 'club_id', 'business_date'
+    ).iterator())
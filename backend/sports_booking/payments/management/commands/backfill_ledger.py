@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from payments.ledger import rebuild_balances, record_payments
+from payments.models import Payment
+
+
+class Command(BaseCommand):
+    help = 'Post ledger entries for existing completed/refunded payments (idempotent) and refresh daily balances'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Payments posted per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--rebuild-balances',
+            action='store_true',
+            help='Recompute every DailyClubBalance row from the ledger afterwards',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        payments = Payment.objects.filter(
+            status__in=['completed', 'refunded']
+        ).select_related('booking').order_by('id')
+
+        posted = scanned = 0
+        last_id = 0
+        while True:
+            batch = list(payments.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            posted += record_payments(batch)
+            scanned += len(batch)
+            last_id = batch[-1].id
+
+        if options['rebuild_balances']:
+            rebuild_balances()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} payments, posted {posted} ledger entries"
+            + (', balances rebuilt' if options['rebuild_balances'] else '')
+        ))
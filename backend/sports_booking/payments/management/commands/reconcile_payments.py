@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from payments.reconciliation import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Reconcile local Payment rows with Stripe, window by window since the last checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be fixed without writing anything (checkpoint included)',
+        )
+        parser.add_argument(
+            '--window-hours',
+            type=float,
+            default=None,
+            help='Size of each created-time window (default: RECONCILE_WINDOW_SECONDS)',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Ignore the checkpoint and rescan from RECONCILE_LOOKBACK_DAYS ago',
+        )
+
+    def handle(self, *args, **options):
+        window_seconds = int(options['window_hours'] * 3600) if options['window_hours'] else None
+        totals = reconcile(window_seconds=window_seconds, dry_run=options['dry_run'], reset=options['reset'])
+
+        prefix = '[DRY RUN] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{totals['windows']} window(s), {totals['pages']} page(s): "
+            f"{totals['intents']} intents, {totals['refunds']} refunds scanned, "
+            f"{totals['retrieved']} pending intents re-checked; "
+            f"{totals['completed']} completed, {totals['failed']} failed, "
+            f"{totals['refunded']} refunded, {totals['needs_review']} need review"
+        ))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_payment_failed_at_payment_failure_reason_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('type', models.CharField(max_length=100)),
+                ('ordering_key', models.CharField(blank=True, max_length=255)),
+                ('stripe_created', models.BigIntegerField()),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('ignored', 'Ignored'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'stripe_events',
+                'ordering': ['stripe_created', 'id'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='stripe_even_status_01dc55_idx'), models.Index(fields=['ordering_key', 'status'], name='stripe_even_orderin_c6c2b4_idx')],
+            },
+        ),
+    ]
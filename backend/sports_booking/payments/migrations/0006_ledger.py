@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clubs', '0006_alter_club_phone_number'),
+        ('payments', '0005_refundjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyClubBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('charges', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('refunds', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('adjustments', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('net', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('charge_count', models.PositiveIntegerField(default=0)),
+                ('refund_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('club', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_balances', to='clubs.club')),
+            ],
+            options={
+                'db_table': 'daily_club_balances',
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['date'], name='daily_club__date_f243b5_idx')],
+                'unique_together': {('club', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_key', models.CharField(max_length=255, unique=True)),
+                ('kind', models.CharField(choices=[('charge', 'Charge'), ('refund', 'Refund'), ('adjustment', 'Adjustment')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('currency', models.CharField(default='INR', max_length=3)),
+                ('business_date', models.DateField()),
+                ('reference', models.CharField(blank=True, max_length=255)),
+                ('note', models.TextField(blank=True)),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('club', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='clubs.club')),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='payments.payment')),
+            ],
+            options={
+                'db_table': 'ledger_entries',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['club', 'business_date'], name='ledger_entr_club_id_aa7891_idx'), models.Index(fields=['payment'], name='ledger_entr_payment_8c0152_idx')],
+            },
+        ),
+    ]
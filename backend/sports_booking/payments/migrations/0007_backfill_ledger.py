@@ -0,0 +1,67 @@
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+
+def backfill_ledger(apps, schema_editor):
+    """
+    Post the ledger entries of payments that completed (or were refunded)
+    before the ledger existed, then compute every daily balance from the
+    ledger, as the backfill_ledger --rebuild-balances command would.
+    """
+    Payment = apps.get_model('payments', 'Payment')
+    LedgerEntry = apps.get_model('payments', 'LedgerEntry')
+    DailyClubBalance = apps.get_model('payments', 'DailyClubBalance')
+
+    posted = set(LedgerEntry.objects.values_list('entry_key', flat=True))
+    entries = []
+    for payment in Payment.objects.filter(
+        status__in=['completed', 'refunded']
+    ).select_related('booking').order_by('id').iterator():
+        common = {
+            'payment': payment, 'club_id': payment.booking.club_id, 'business_date': payment.booking.date,
+            'currency': payment.currency,
+        }
+        if f'charge:{payment.id}' not in posted:
+            entries.append(LedgerEntry(
+                entry_key=f'charge:{payment.id}', kind='charge', amount=payment.amount,
+                reference=payment.stripe_payment_intent_id,
+                occurred_at=payment.completed_at or timezone.now(), **common,
+            ))
+        if payment.status == 'refunded' and f'refund:{payment.id}' not in posted:
+            entries.append(LedgerEntry(
+                entry_key=f'refund:{payment.id}', kind='refund', amount=-payment.amount,
+                reference=(payment.metadata or {}).get('refund_id', ''), **common,
+            ))
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000, ignore_conflicts=True)
+
+    DailyClubBalance.objects.all().delete()
+    days = LedgerEntry.objects.exclude(club=None).values('club_id', 'business_date').annotate(
+        charges=Sum('amount', filter=Q(kind='charge'), default=0),
+        refunds=-Sum('amount', filter=Q(kind='refund'), default=0),
+        adjustments=Sum('amount', filter=Q(kind='adjustment'), default=0),
+        net=Sum('amount'),
+        charge_count=Count('id', filter=Q(kind='charge')),
+        refund_count=Count('id', filter=Q(kind='refund')),
+    ).order_by()
+    DailyClubBalance.objects.bulk_create([
+        DailyClubBalance(
+            club_id=day['club_id'], date=day['business_date'],
+            **{field: day[field] for field in (
+                'charges', 'refunds', 'adjustments', 'net', 'charge_count', 'refund_count',
+            )},
+        )
+        for day in days
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_booking_bookings_created_4f33ac_idx_and_more'),
+        ('payments', '0006_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
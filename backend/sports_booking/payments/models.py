@@ -1,4 +1,6 @@
-from django.db import models
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models, transaction
+from datetime import timedelta
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 
@@ -39,10 +41,34 @@ class Payment(models.Model):
     def __str__(self):
         return f"Payment for Booking #{self.booking.id} - {self.status}"
     
+    # Signal receivers keep derived rows (rollups, user counters, activity)
+    # in step: they commit or roll back together with the row.
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            return super().delete(*args, **kwargs)
+
+    def loaded_booking(self):
+        """
+        The payment's booking, loaded at most once per instance: every
+        signal receiver (rollups, counters, activity) and the ledger share
+        it. None once the booking is gone.
+        """
+        try:
+            return self.booking
+        except ObjectDoesNotExist:
+            return None
+
+    @transaction.atomic
     def mark_completed(self):
         self.status = 'completed'
         self.completed_at = timezone.now()
         self.save(update_fields=['status', 'completed_at'])
+        from .ledger import record_payments
+        record_payments([self])
         
     # Added mark_failed() - was missing, needed when stripe returns failure
     def mark_failed(self, reason=''):
@@ -52,6 +78,210 @@ class Payment(models.Model):
         self.save(update_fields=['status', 'failed_at', 'failure_reason'])
     
     # added mark_refunded() - needed for cancellation/refund flow
+    @transaction.atomic
     def mark_refunded(self):
         self.status = 'refunded'
-        self.save(update_fields=['status'])
\ No newline at end of file
+        self.save(update_fields=['status'])
+        from .ledger import record_payments
+        record_payments([self])
+
+class StripeEvent(models.Model):
+    """
+    Webhook inbox. The webhook only verifies the signature and stores the
+    event here (event_id is unique, so Stripe's redeliveries are no-ops),
+    then returns 200; payments.tasks.process_stripe_events applies events
+    in Stripe's order within each booking (ordering_key).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ]
+
+    MAX_ATTEMPTS = 5
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    ordering_key = models.CharField(max_length=255, blank=True)
+    stripe_created = models.BigIntegerField()
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'stripe_events'
+        ordering = ['stripe_created', 'id']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['ordering_key', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id} - {self.status}"
+
+    def mark_processed(self):
+        self.status = 'processed'
+        self.processed_at = timezone.now()
+        self.attempts += 1
+        self.last_error = ''
+
+    def mark_attempt_failed(self, error):
+        """Back off exponentially; give up (and unblock the booking's later events) after MAX_ATTEMPTS."""
+        self.attempts += 1
+        self.last_error = error
+        if self.attempts >= self.MAX_ATTEMPTS:
+            self.status = 'failed'
+        else:
+            self.available_at = timezone.now() + timedelta(seconds=min(15 * 2 ** self.attempts, 900))
+
+
+class ReconciliationCheckpoint(models.Model):
+    """How far (unix time, exclusive) payments.reconciliation has scanned Stripe."""
+    name = models.CharField(max_length=50, unique=True)
+    scanned_until = models.BigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'payment_reconciliation_checkpoints'
+
+    def __str__(self):
+        return f"{self.name} scanned until {self.scanned_until}"
+
+
+class RefundJob(models.Model):
+    """
+    One full refund of a Payment, queued by cancellations and the admin
+    refund endpoint and executed by payments.tasks.process_refund_jobs.
+    The idempotency_key goes to Stripe with every attempt, so a retry
+    after a timeout (or a crashed worker's expired lease) can never refund
+    twice.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    MAX_ATTEMPTS = 8
+
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, related_name='refund_job')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    reason = models.TextField(blank=True)
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    requested_by = models.ForeignKey(
+        'accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    stripe_refund_id = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'refund_jobs'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+
+    def __str__(self):
+        return f"Refund of Payment #{self.payment_id} - {self.status}"
+
+    def mark_succeeded(self, refund_id=''):
+        self.status = 'succeeded'
+        self.stripe_refund_id = refund_id
+        self.completed_at = timezone.now()
+        self.attempts += 1
+        self.last_error = ''
+
+    def mark_attempt_failed(self, error, retryable=True):
+        """Back off exponentially; give up after MAX_ATTEMPTS or on a permanent error."""
+        self.attempts += 1
+        self.last_error = error
+        if not retryable or self.attempts >= self.MAX_ATTEMPTS:
+            self.status = 'failed'
+        else:
+            self.status = 'pending'
+            self.available_at = timezone.now() + timedelta(seconds=min(30 * 2 ** self.attempts, 3600))
+
+
+class LedgerEntry(models.Model):
+    """
+    Append-only money movements: a charge when a payment completes, a
+    refund when it is refunded, and manual adjustments. Rows are never
+    updated or deleted; a correction is another entry. entry_key makes
+    posting idempotent (see payments.ledger).
+    """
+    KIND_CHOICES = [
+        ('charge', 'Charge'),
+        ('refund', 'Refund'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    entry_key = models.CharField(max_length=255, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Signed: charges positive, refunds negative
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default='INR')
+    payment = models.ForeignKey(
+        Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    club = models.ForeignKey('clubs.Club', on_delete=models.SET_NULL, null=True, related_name='+')
+    # The day the money is reported against: the booking's date
+    business_date = models.DateField()
+    reference = models.CharField(max_length=255, blank=True)
+    note = models.TextField(blank=True)
+    occurred_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'ledger_entries'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['club', 'business_date']),
+            models.Index(fields=['payment']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.amount} {self.currency} ({self.entry_key})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Ledger entries are append-only; post an adjustment instead')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Ledger entries are append-only; post an adjustment instead')
+
+
+class DailyClubBalance(models.Model):
+    """
+    Per-club, per-day totals of the ledger, kept up to date as entries are
+    posted so revenue reads are a scan over days, not over payments.
+    `refunds` is a positive magnitude; net = charges - refunds + adjustments.
+    """
+    club = models.ForeignKey('clubs.Club', on_delete=models.CASCADE, related_name='daily_balances')
+    date = models.DateField()
+    charges = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refunds = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    adjustments = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    net = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    charge_count = models.PositiveIntegerField(default=0)
+    refund_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'daily_club_balances'
+        ordering = ['date']
+        unique_together = ['club', 'date']
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.club_id} {self.date}: {self.net}"
@@ -0,0 +1,145 @@
+"""
+QR code rendering with a two-tier cache.
+
+Images are keyed by a hash of (format, content): an in-process LRU serves
+repeat hits in the same worker for free, Redis shares renders between
+workers (and with prerender_upi_qr_codes, which renders ahead of the
+payment page). Only a miss in both builds a QRCode. SVG output is a
+single vector path written straight from the module matrix, skipping
+rasterising and PNG encoding.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+class _LRU:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_lru = _LRU(getattr(settings, 'QR_CACHE_LRU_SIZE', 256))
+
+
+def content_key(data, fmt):
+    return hashlib.sha256(f'{fmt}:{data}'.encode()).hexdigest()
+
+
+def _svg(matrix, box_size):
+    """
+    One <path> with a run per horizontal stretch of dark modules. Much
+    cheaper than qrcode's SVG factories, which build an element per module.
+    """
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if row[x]:
+                start = x
+                while x < len(row) and row[x]:
+                    x += 1
+                runs.append(f'M{start},{y}h{x - start}v1h-{x - start}z')
+            else:
+                x += 1
+    size = len(matrix)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'width="{size * box_size}" height="{size * box_size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{"".join(runs)}" fill="#000"/></svg>'
+    ).encode()
+
+
+def _render(data, fmt):
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    if fmt == 'svg':
+        return _svg(qr.get_matrix(), qr.box_size)
+    buffer = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def qr_image(data, fmt='png'):
+    """(bytes, content hash) of the QR code for `data` in `fmt` ('png' or 'svg')."""
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported QR format: {fmt}")
+    key = content_key(data, fmt)
+
+    image = _lru.get(key)
+    if image is not None:
+        return image, key
+
+    try:
+        image = cache.get(f'qr:{key}')
+    except Exception as e:
+        logger.warning(f"QR cache unavailable: {e}")
+    if image is None:
+        image = _render(data, fmt)
+        try:
+            cache.set(f'qr:{key}', image, timeout=getattr(settings, 'QR_CACHE_TTL', 3600))
+        except Exception as e:
+            logger.warning(f"QR cache unavailable: {e}")
+    _lru.set(key, image)
+    return image, key
+
+
+def prerender(data_strings, formats=('svg', 'png')):
+    """Render into the shared cache whatever isn't there yet. Returns the number rendered."""
+    wanted = {f'qr:{content_key(data, fmt)}': (data, fmt) for data in data_strings for fmt in formats}
+    present = cache.get_many(list(wanted))
+    rendered = {}
+    for key, (data, fmt) in wanted.items():
+        if key not in present:
+            rendered[key] = _render(data, fmt)
+    if rendered:
+        cache.set_many(rendered, timeout=getattr(settings, 'QR_CACHE_TTL', 3600))
+    return len(rendered)
+
+
+def booking_upi_string(booking):
+    from .utils import PaymentUtils
+    return PaymentUtils.generate_upi_ar_string(
+        settings.UPI_ID, booking.amount, booking.id, merchant_name=settings.UPI_MERCHANT_NAME,
+    )
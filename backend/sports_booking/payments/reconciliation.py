@@ -0,0 +1,210 @@
+"""
+Bulk reconciliation of local Payment rows against Stripe.
+
+Instead of one retrieve per suspicious row, page through Stripe's list
+APIs (PaymentIntents and Refunds, 100 per page) one created-time window
+at a time. Each page is joined with local Payments by
+stripe_payment_intent_id in memory (one query per page), and the fixes
+for the whole window are written in bulk. Afterwards the checkpoint
+moves past the window, so the next run only scans new windows.
+
+A window is only scanned once it is RECONCILE_SETTLE_SECONDS old, so
+intents in it have usually reached a final state. Those that had not
+(a customer finishing 3-D Secure hours later, an intent canceled the
+next day) leave their Payment pending after the list pass; every run
+therefore also retrieves, one by one, the intents of pending payments
+behind the checkpoint (at most RECONCILE_PENDING_LIMIT, newest first).
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from bookings.models import Booking
+from common.providers import stripe_client
+from notifications.outbox import enqueue_booking_confirmation
+from notifications.reminders import sync_booking_reminders
+from .ledger import record_payments
+from .models import Payment, ReconciliationCheckpoint
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = 'stripe'
+PAGE_SIZE = 100
+
+
+def _pages(resource, window_start, window_end):
+    """Every object `resource` created in [window_start, window_end), page by page."""
+    starting_after = None
+    while True:
+        params = {'created': {'gte': window_start, 'lt': window_end}, 'limit': PAGE_SIZE}
+        if starting_after:
+            params['starting_after'] = starting_after
+        page = resource.list(**params)
+        if page.data:
+            yield page.data
+        if not page.has_more or not page.data:
+            return
+        starting_after = page.data[-1]['id']
+
+
+def _local_payments(objects, intent_id):
+    ids = {intent_id(obj) for obj in objects if intent_id(obj)}
+    return Payment.objects.select_related('booking').in_bulk(ids, field_name='stripe_payment_intent_id')
+
+
+class WindowFixes:
+    """Changes found in one window, applied together."""
+
+    def __init__(self):
+        self.payments = {}
+        self.confirm = []
+        self.cancel = []
+        self.stats = Counter()
+
+    def intent(self, intent, payment):
+        if intent['status'] == 'succeeded' and payment.status in ('pending', 'failed'):
+            payment.status = 'completed'
+            payment.completed_at = timezone.now()
+            self.payments[payment.id] = payment
+            self.stats['completed'] += 1
+            if payment.booking.status == 'pending':
+                self.confirm.append(payment.booking)
+            elif payment.booking.status == 'cancelled':
+                # Money taken for a released slot: needs a human, not a bulk fix
+                logger.warning(
+                    f"Reconcile: intent {intent['id']} succeeded but booking {payment.booking_id} is cancelled"
+                )
+                self.stats['needs_review'] += 1
+        elif intent['status'] == 'canceled' and payment.status == 'pending':
+            payment.status = 'failed'
+            payment.failed_at = timezone.now()
+            payment.failure_reason = 'PaymentIntent canceled at Stripe'
+            self.payments[payment.id] = payment
+            self.stats['failed'] += 1
+
+    def refund(self, refund, payment):
+        if refund['status'] != 'succeeded' or payment.status == 'refunded':
+            return
+        payment = self.payments.get(payment.id, payment)
+        payment.status = 'refunded'
+        payment.metadata = dict(payment.metadata or {}, refund_id=refund['id'])
+        self.payments[payment.id] = payment
+        self.stats['refunded'] += 1
+        if payment.booking.status not in ('cancelled', 'refunded'):
+            self.cancel.append(payment.booking)
+
+    @transaction.atomic
+    def apply(self):
+        from accounts import counters
+        from reports.rollups import refresh
+        Payment.objects.bulk_update(
+            self.payments.values(), ['status', 'completed_at', 'failed_at', 'failure_reason', 'metadata']
+        )
+        record_payments(self.payments.values())
+        cancel_ids = {b.id for b in self.cancel}
+        confirm = [b for b in self.confirm if b.id not in cancel_ids]
+        if confirm:
+            Booking.objects.filter(id__in=[b.id for b in confirm]).update(status='confirmed')
+            for booking in confirm:
+                booking.status = 'confirmed'
+                enqueue_booking_confirmation(booking)
+        if self.cancel:
+            Booking.objects.filter(id__in=cancel_ids).update(status='cancelled', cancelled_at=timezone.now())
+            for booking in self.cancel:
+                booking.status = 'cancelled'
+        # queryset.update() skips post_save; keep the reminder index, the
+        # daily rollups and the user counters in step
+        sync_booking_reminders(confirm + self.cancel)
+        refresh((p.booking.date, p.booking.club_id, p.booking.sport_id) for p in self.payments.values())
+        counters.refresh(p.booking.user_id for p in self.payments.values())
+
+
+def reconcile_window(window_start, window_end, dry_run=False):
+    stripe = stripe_client()
+    fixes = WindowFixes()
+
+    for intents in _pages(stripe.PaymentIntent, window_start, window_end):
+        fixes.stats['pages'] += 1
+        fixes.stats['intents'] += len(intents)
+        local = _local_payments(intents, lambda obj: obj['id'])
+        for intent in intents:
+            if intent['id'] in local:
+                fixes.intent(intent, local[intent['id']])
+
+    for refunds in _pages(stripe.Refund, window_start, window_end):
+        fixes.stats['pages'] += 1
+        fixes.stats['refunds'] += len(refunds)
+        local = _local_payments(refunds, lambda obj: obj.get('payment_intent'))
+        for refund in refunds:
+            payment = local.get(refund.get('payment_intent'))
+            if payment is not None:
+                fixes.refund(refund, payment)
+
+    if not dry_run:
+        fixes.apply()
+    return fixes.stats
+
+
+def reconcile_pending(before, dry_run=False):
+    """Re-check payments still pending that were created before `before` (a timestamp)."""
+    stripe = stripe_client()
+    fixes = WindowFixes()
+    lookback = timezone.now() - timedelta(days=getattr(settings, 'RECONCILE_LOOKBACK_DAYS', 30))
+    pending = Payment.objects.select_related('booking').filter(
+        status='pending',
+        created_at__lt=datetime.fromtimestamp(before, tz=dt_timezone.utc),
+        created_at__gte=lookback,
+    ).order_by('-created_at')[:getattr(settings, 'RECONCILE_PENDING_LIMIT', 500)]
+
+    for payment in pending:
+        try:
+            intent = stripe.PaymentIntent.retrieve(payment.stripe_payment_intent_id)
+        except Exception as e:
+            logger.warning(f"Reconcile: could not retrieve intent {payment.stripe_payment_intent_id}: {e}")
+            fixes.stats['retrieve_errors'] += 1
+            continue
+        fixes.stats['retrieved'] += 1
+        fixes.intent(intent, payment)
+
+    if not dry_run:
+        fixes.apply()
+    return fixes.stats
+
+
+def _default_start():
+    lookback = timedelta(days=getattr(settings, 'RECONCILE_LOOKBACK_DAYS', 30))
+    oldest = Payment.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    start = max(oldest or timezone.now(), timezone.now() - lookback)
+    return int(start.timestamp())
+
+
+def reconcile(window_seconds=None, dry_run=False, reset=False):
+    """
+    Re-check the payments left pending behind the checkpoint, then scan
+    every settled window since it. Returns totals; the checkpoint advances
+    after each window, so an interrupted run resumes where it stopped.
+    """
+    window_seconds = window_seconds or getattr(settings, 'RECONCILE_WINDOW_SECONDS', 6 * 3600)
+    horizon = int(timezone.now().timestamp()) - getattr(settings, 'RECONCILE_SETTLE_SECONDS', 3600)
+
+    checkpoint = ReconciliationCheckpoint.objects.filter(name=CHECKPOINT).first()
+    if checkpoint is None or reset:
+        checkpoint = checkpoint or ReconciliationCheckpoint(name=CHECKPOINT)
+        checkpoint.scanned_until = _default_start()
+
+    # Before the new windows, so a payment is never checked twice in one run
+    totals = Counter(reconcile_pending(checkpoint.scanned_until, dry_run=dry_run))
+    window_start = checkpoint.scanned_until
+    while window_start < horizon:
+        window_end = min(window_start + window_seconds, horizon)
+        totals.update(reconcile_window(window_start, window_end, dry_run=dry_run))
+        totals['windows'] += 1
+        window_start = window_end
+        if not dry_run:
+            checkpoint.scanned_until = window_end
+            checkpoint.save()
+    return totals
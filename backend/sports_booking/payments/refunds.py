@@ -0,0 +1,150 @@
+"""
+Refund queue. Cancellations and the admin refund endpoint only write a
+RefundJob inside their own transaction (enqueue_refunds); the refund
+worker (payments.tasks.process_refund_jobs) claims due jobs, issues the
+Stripe refunds from a small thread pool under a shared per-second rate
+limit, and retries transient failures with exponential backoff.
+
+A claimed job is leased for REFUND_LEASE_SECONDS: if the worker dies
+mid-batch the job becomes due again, and the idempotency key makes the
+repeated Refund.create return the original refund.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from common import metrics
+from common.providers import stripe_client
+from common.ratelimit import acquire
+from .ledger import record_payments
+from .models import Payment, RefundJob
+
+logger = logging.getLogger(__name__)
+
+KICK_DEBOUNCE_SECONDS = 2
+
+RETRYABLE_ERRORS = (stripe.RateLimitError, stripe.APIConnectionError, stripe.APIError)
+
+# What a Stripe call came back with, for _apply(): refund id, or error and
+# whether it is worth retrying. Throttled calls were never attempted.
+SUCCEEDED, FAILED, THROTTLED = 'succeeded', 'failed', 'throttled'
+
+
+def _kick_worker():
+    try:
+        if cache.add('payments:refunds:kick', 1, timeout=KICK_DEBOUNCE_SECONDS):
+            from .tasks import process_refund_jobs
+            process_refund_jobs.delay()
+    except Exception as e:
+        logger.warning(f"Could not kick refund worker, periodic drain will pick it up: {e}")
+
+
+def enqueue_refunds(payments, reason='', requested_by=None):
+    """
+    Queue a full refund for each completed payment, in the caller's
+    transaction. A payment already queued keeps its job (and key); one
+    whose job gave up is queued again.
+    """
+    payments = [p for p in payments if p.status == 'completed']
+    if not payments:
+        return 0
+    RefundJob.objects.bulk_create([
+        RefundJob(
+            payment=payment, amount=payment.amount, reason=reason,
+            idempotency_key=f"refund:{payment.id}", requested_by=requested_by,
+        )
+        for payment in payments
+    ], ignore_conflicts=True)
+    RefundJob.objects.filter(payment__in=payments, status='failed').update(
+        status='pending', attempts=0, available_at=timezone.now()
+    )
+    transaction.on_commit(_kick_worker)
+    return len(payments)
+
+
+def enqueue_refund(payment, reason='', requested_by=None):
+    enqueue_refunds([payment], reason, requested_by)
+    return RefundJob.objects.get(payment=payment)
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            RefundJob.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(status__in=['pending', 'processing'], available_at__lte=now)
+            .select_related('payment')
+            .order_by('available_at')[:batch_size]
+        )
+        for job in jobs:
+            job.status = 'processing'
+            job.available_at = now + timedelta(seconds=settings.REFUND_LEASE_SECONDS)
+        RefundJob.objects.bulk_update(jobs, ['status', 'available_at'])
+    return jobs
+
+
+def _issue(job):
+    """Make the Stripe call for one job. Runs in a pool thread: no database access."""
+    if settings.PAYMENT_DEV_MODE:
+        return SUCCEEDED, ''
+    if not acquire('stripe.refunds', settings.REFUND_RATE_LIMIT_PER_SECOND):
+        return THROTTLED, None
+    try:
+        refund = stripe_client().Refund.create(
+            payment_intent=job.payment.stripe_payment_intent_id,
+            amount=int(job.amount * 100),
+            metadata={'booking_id': str(job.payment.booking_id), 'refund_job_id': str(job.id)},
+            idempotency_key=job.idempotency_key,
+        )
+        return SUCCEEDED, refund['id']
+    except stripe.InvalidRequestError as e:
+        if e.code == 'charge_already_refunded':
+            return SUCCEEDED, ''
+        return FAILED, (str(e), False)
+    except RETRYABLE_ERRORS as e:
+        return FAILED, (str(e), True)
+    except stripe.StripeError as e:
+        return FAILED, (str(e), False)
+    except Exception as e:
+        return FAILED, (str(e), True)
+
+
+def _apply(job, outcome, value):
+    with transaction.atomic():
+        if outcome == THROTTLED:
+            job.status = 'pending'
+            job.available_at = timezone.now()
+        elif outcome == FAILED:
+            error, retryable = value
+            job.mark_attempt_failed(error, retryable)
+            logger.warning(f"Refund for payment {job.payment_id} failed (attempt {job.attempts}): {error}")
+        else:
+            job.mark_succeeded(value)
+            payment = Payment.objects.select_for_update().get(id=job.payment_id)
+            if payment.status != 'refunded':
+                payment.status = 'refunded'
+                payment.metadata = payment.metadata or {}
+                if value:
+                    payment.metadata['refund_id'] = value
+                payment.save(update_fields=['status', 'metadata'])
+                record_payments([payment])
+        job.save()
+    metrics.incr(f'payments.refund.{job.status}')
+
+
+def process_refund_jobs(batch_size):
+    """Claim and execute one batch of due refund jobs; returns the number claimed."""
+    jobs = _claim(batch_size)
+    if not jobs:
+        return 0
+    with ThreadPoolExecutor(max_workers=settings.REFUND_MAX_CONCURRENCY) as pool:
+        results = list(pool.map(_issue, jobs))
+    for job, (outcome, value) in zip(jobs, results):
+        _apply(job, outcome, value)
+    return len(jobs)
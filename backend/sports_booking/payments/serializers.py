@@ -6,15 +6,30 @@ from django.conf import settings
 class PaymentSerializer(serializers.ModelSerializer):
     booking_id = serializers.CharField(source='booking.id', read_only=True)
     booking_details = serializers.SerializerMethodField()
+    refund_status = serializers.SerializerMethodField()
 
     class Meta:
         model = Payment
         fields = [
             'id', 'booking', 'booking_id', 'booking_details',
             'stripe_payment_intent_id', 'amount', 'currency', 'status',
-            'payment_method', 'created_at', 'completed_at', 'metadata']
+            'payment_method', 'created_at', 'completed_at', 'metadata', 'refund_status']
         read_only_fields = ['created_at', 'completed_at', 'stripe_payment_intent_id']
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Kept server-side only so create_payment_intent can reuse the intent
+        data['metadata'] = {
+            key: value for key, value in (data.get('metadata') or {}).items()
+            if key != 'client_secret'
+        }
+        return data
+
+    def get_refund_status(self, obj):
+        # pending / processing / succeeded / failed, or None if never refunded
+        job = getattr(obj, 'refund_job', None)
+        return job.status if job else None
+
     def get_booking_details(self, obj):
         return {
             'id': str(obj.booking.id),
@@ -1,9 +1,13 @@
 from celery import shared_task
-from common.email_utils import send_resend_email
 from django.conf import settings
+from common.email_utils import send_resend_email
+from notifications.rendering import booking_context, render
 from django.db import transaction
 from django.db.models import Count
 from .models import Payment
+from .reconciliation import reconcile
+from .refunds import process_refund_jobs as process_refund_batch
+from .webhooks import process_pending_events
 from django.utils import timezone
 from datetime import timedelta
 import logging
@@ -20,29 +24,13 @@ def send_payment_confirmation_email(payment_id):
         booking = payment.booking
 
         if user.email:
-            subject = f'Payment Confirmation - Booking #{booking.id}'
-            message = f'''
-            Dear {user.first_name or 'Customer'},
-
-            Your payment has been successfully processed!
-
-            Payment Details:
-            - Booking ID: {booking.id}
-            - Amount: ₹{payment.amount}
-            - Club: {booking.club.name}
-            - Date: {booking.date}
-            - Time: {booking.start_time} - {booking.end_time}
-            - Sport: {booking.sport.name}
+            rendered = render('payment_confirmation', booking_context(
+                booking, user,
+                customer_name=user.first_name or 'Customer',
+                payment_amount=str(payment.amount),
+            ))
 
-            Please arrive 15 minutes before your slot time.
-
-            Thank you for booking with us!
-
-            Best regards,
-            Sports Club Team
-            '''
-
-            result = send_resend_email(subject, message, user.email)
+            result = send_resend_email(rendered.subject, rendered.text, user.email, html=rendered.html)
             if result:
                 return f"Email sent successfully to {user.email}"
             return f"Email send failed for {user.email}"
@@ -121,4 +109,83 @@ def security_monitoring():
 
     except Exception as e:
         logger.error(f"Security monitoring failed: {e}")
-        return f"Security monitoring failed: {str(e)}"
\ No newline at end of file
+        return f"Security monitoring failed: {str(e)}"
+
+
+@shared_task
+def process_stripe_events(batch_size=None):
+    """Apply pending webhook events from the StripeEvent inbox."""
+    batch_size = batch_size or getattr(settings, 'STRIPE_EVENT_BATCH_SIZE', 100)
+    try:
+        processed = 0
+        while True:
+            count = process_pending_events(batch_size)
+            processed += count
+            if count < batch_size:
+                break
+        if processed:
+            logger.info(f"Processed {processed} Stripe events")
+        return f"Processed {processed} Stripe events"
+    except Exception as e:
+        logger.error(f"Stripe event processing failed: {e}")
+        return f"Failed: {str(e)}"
+
+
+@shared_task
+def process_refund_jobs(batch_size=None):
+    """Execute due refunds from the RefundJob queue, batch after batch."""
+    batch_size = batch_size or getattr(settings, 'REFUND_BATCH_SIZE', 50)
+    try:
+        claimed = 0
+        while True:
+            count = process_refund_batch(batch_size)
+            claimed += count
+            if count < batch_size:
+                break
+        if claimed:
+            logger.info(f"Processed {claimed} refund jobs")
+        return f"Processed {claimed} refund jobs"
+    except Exception as e:
+        logger.error(f"Refund processing failed: {e}")
+        return f"Failed: {str(e)}"
+
+
+@shared_task
+def reconcile_stripe_payments():
+    """Periodic safety net behind the webhook: bulk-reconcile new Stripe windows."""
+    try:
+        totals = reconcile()
+        fixed = totals['completed'] + totals['failed'] + totals['refunded']
+        if fixed or totals['needs_review']:
+            logger.warning(
+                f"Reconciliation fixed {fixed} payments ({dict(totals)}); "
+                f"{totals['needs_review']} need review"
+            )
+        return f"Reconciled {totals['windows']} windows, fixed {fixed} payments"
+    except Exception as e:
+        logger.error(f"Payment reconciliation failed: {e}")
+        return f"Failed: {str(e)}"
+
+
+@shared_task
+def prerender_upi_qr_codes(booking_ids=None):
+    """
+    Render UPI QR codes (SVG and PNG) into the shared cache ahead of the
+    payment page — for the given bookings, or every recent pending one.
+    """
+    from bookings.models import Booking
+    from .qr import booking_upi_string, prerender
+
+    if not settings.UPI_ID:
+        return "UPI not enabled"
+    try:
+        bookings = Booking.objects.filter(status='pending')
+        if booking_ids:
+            bookings = bookings.filter(id__in=booking_ids)
+        else:
+            bookings = bookings.filter(created_at__gte=timezone.now() - timedelta(minutes=15))
+        rendered = prerender([booking_upi_string(b) for b in bookings])
+        return f"Pre-rendered {rendered} QR codes"
+    except Exception as e:
+        logger.error(f"QR pre-render failed: {e}")
+        return f"Failed: {str(e)}"
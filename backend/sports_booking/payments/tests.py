@@ -0,0 +1,524 @@
+from datetime import time, timedelta
+
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from django.test import TestCase
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from bookings.models import Booking, SlotWaitlist
+from clubs.models import Club, Sport
+from common import metrics, providers
+from common.fake_providers import recorded_calls
+from notifications.models import OutboxMessage
+
+from . import qr
+from .intent_cache import remember_intent
+from .ledger import record_payments, running_balances, totals
+from .models import DailyClubBalance, LedgerEntry, Payment, ReconciliationCheckpoint, RefundJob, StripeEvent
+from .reconciliation import reconcile
+from .tasks import process_refund_jobs, process_stripe_events
+
+
+@override_settings(
+    PROVIDER_BACKEND='fake', PAYMENT_DEV_MODE=False, STRIPE_SECRET_KEY='sk_test_fake',
+    STRIPE_WEBHOOK_SECRET='whsec_test',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class FakeProviderCheckoutTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        providers.reset_clients()
+        self.addCleanup(providers.reset_clients)
+        club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        sport = Sport.objects.create(name='Badminton', club=club, price_per_hour=500)
+        self.user = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        self.booking = Booking.objects.create(
+            user=self.user, club=club, sport=sport,
+            date=timezone.now().date() + timedelta(days=2),
+            start_time=time(10), end_time=time(11), amount=500, status='pending',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_checkout_runs_end_to_end_against_fake_stripe(self):
+        response = self.client.post('/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        intent_id = response.data['payment_intent_id']
+
+        response = self.client.post('/api/payments/confirm/', {
+            'booking_id': self.booking.id, 'payment_intent_id': intent_id,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'confirmed')
+        self.assertEqual(Payment.objects.get(booking=self.booking).status, 'completed')
+        self.assertEqual(OutboxMessage.objects.filter(booking=self.booking).count(), 2)
+        self.assertEqual(
+            [call.operation for call in recorded_calls('stripe')],
+            ['payment_intent.create', 'payment_intent.retrieve'],
+        )
+
+    def confirm(self, intent_id):
+        return self.client.post('/api/payments/confirm/', {
+            'booking_id': self.booking.id, 'payment_intent_id': intent_id,
+        }, format='json')
+
+    def test_confirm_after_webhook_settled_it_needs_no_stripe_call(self):
+        stripe = providers.stripe_client()
+        intent_id = self.client.post(
+            '/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json'
+        ).data['payment_intent_id']
+        payload, signature = stripe.signed_event(
+            'payment_intent.succeeded', dict(stripe.intents[intent_id], status='succeeded'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/payments/webhook/', payload, content_type='application/json',
+                             HTTP_STRIPE_SIGNATURE=signature)
+
+        self.assertEqual(self.confirm(intent_id).status_code, 200)
+        self.assertEqual([call.operation for call in recorded_calls('stripe')], ['payment_intent.create'])
+        self.assertEqual(metrics.counter('payments.confirm.local'), 1)
+
+    def test_confirm_uses_cached_intent_state(self):
+        stripe = providers.stripe_client()
+        intent_id = self.client.post(
+            '/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json'
+        ).data['payment_intent_id']
+        remember_intent(dict(stripe.intents[intent_id], status='succeeded'))
+
+        self.assertEqual(self.confirm(intent_id).status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'confirmed')
+        self.assertEqual([call.operation for call in recorded_calls('stripe')], ['payment_intent.create'])
+        self.assertEqual(metrics.counter('payments.confirm.cached'), 1)
+
+    @override_settings(PROVIDER_FAKE_STRIPE_AUTO_CONFIRM=False)
+    def test_reloads_reuse_the_pending_intent(self):
+        first = self.client.post('/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json')
+        again = self.client.post('/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json')
+        self.assertEqual(again.data['payment_intent_id'], first.data['payment_intent_id'])
+        self.assertEqual(again.data['client_secret'], first.data['client_secret'])
+        self.assertEqual(len(recorded_calls('stripe')), 1)
+        self.assertEqual(metrics.counter('payments.intent.reused'), 1)
+
+        # A changed amount needs a new intent
+        self.booking.amount = 750
+        self.booking.save()
+        changed = self.client.post('/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json')
+        self.assertNotEqual(changed.data['payment_intent_id'], first.data['payment_intent_id'])
+        self.assertEqual(
+            Payment.objects.get(booking=self.booking).stripe_payment_intent_id, changed.data['payment_intent_id'],
+        )
+
+    def test_paid_intent_is_settled_not_replaced(self):
+        stripe = providers.stripe_client()
+        intent_id = self.client.post(
+            '/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json'
+        ).data['payment_intent_id']
+        # Paid at Stripe, webhook not processed yet
+        stripe.intents[intent_id]['status'] = 'succeeded'
+        remember_intent(dict(stripe.intents[intent_id]))
+
+        response = self.client.post('/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'confirmed')
+        payment = Payment.objects.get(booking=self.booking)
+        self.assertEqual((payment.stripe_payment_intent_id, payment.status), (intent_id, 'completed'))
+        self.assertEqual([call.operation for call in recorded_calls('stripe')], ['payment_intent.create'])
+
+    @override_settings(PROVIDER_FAKE_STRIPE_AUTO_CONFIRM=False)
+    def test_processing_intent_is_not_replaced(self):
+        stripe = providers.stripe_client()
+        intent_id = self.client.post(
+            '/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json'
+        ).data['payment_intent_id']
+        # Bank transfer in flight when the price changes
+        stripe.intents[intent_id]['status'] = 'processing'
+        Booking.objects.filter(pk=self.booking.pk).update(amount=600)
+
+        response = self.client.post('/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Payment.objects.get(booking=self.booking).stripe_payment_intent_id, intent_id)
+        self.assertEqual(len(stripe.intents), 1)
+
+    def test_retry_after_failed_payment_gets_a_new_intent(self):
+        first = self.client.post(
+            '/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json'
+        ).data['payment_intent_id']
+        Payment.objects.get(booking=self.booking).mark_failed('card_declined')
+        second = self.client.post(
+            '/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json'
+        ).data['payment_intent_id']
+        self.assertNotEqual(second, first)
+        Payment.objects.get(booking=self.booking).mark_failed('card_declined')
+        third = self.client.post(
+            '/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json'
+        ).data['payment_intent_id']
+        self.assertNotIn(third, (first, second))
+
+    @override_settings(PROVIDER_FAKE_ERROR_RATE=1.0)
+    def test_injected_stripe_failure_surfaces_as_error_response(self):
+        response = self.client.post('/api/payments/create-intent/', {'booking_id': self.booking.id}, format='json')
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(Payment.objects.exists())
+        self.assertEqual(recorded_calls('stripe')[0].outcome, 'error')
+
+
+@override_settings(
+    PROVIDER_BACKEND='fake', STRIPE_WEBHOOK_SECRET='whsec_test',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class StripeWebhookInboxTests(APITestCase):
+    def setUp(self):
+        providers.reset_clients()
+        self.addCleanup(providers.reset_clients)
+        self.stripe = providers.stripe_client()
+        club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        sport = Sport.objects.create(name='Badminton', club=club, price_per_hour=500)
+        user = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        self.booking = Booking.objects.create(
+            user=user, club=club, sport=sport,
+            date=timezone.now().date() + timedelta(days=2),
+            start_time=time(10), end_time=time(11), amount=500, status='pending',
+        )
+        self.intent = self.stripe.PaymentIntent.create(
+            amount=50000, currency='inr', metadata={'booking_id': self.booking.id},
+        )
+        Payment.objects.create(booking=self.booking, stripe_payment_intent_id=self.intent.id, amount=500)
+
+    def post_event(self, event_type, obj, **fields):
+        payload, signature = self.stripe.signed_event(event_type, obj, **fields)
+        return self.client.post(
+            '/api/payments/webhook/', payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=signature,
+        )
+
+    def test_redelivered_event_is_stored_once_and_applied_later(self):
+        for _ in range(2):
+            response = self.post_event('payment_intent.succeeded', self.intent, id='evt_same')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'pending')  # nothing applied in the request
+
+        process_stripe_events()
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'confirmed')
+        self.assertEqual(Payment.objects.get(booking=self.booking).status, 'completed')
+        self.assertEqual(StripeEvent.objects.get().status, 'processed')
+
+    def test_bad_signature_is_rejected(self):
+        payload, _ = self.stripe.signed_event('payment_intent.succeeded', self.intent)
+        response = self.client.post(
+            '/api/payments/webhook/', payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE='t=1,v1=bogus',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_events_apply_in_stripe_order_per_booking(self):
+        created = int(timezone.now().timestamp())
+        refund = self.stripe.Refund.create(payment_intent=self.intent.id)
+        # Delivered out of order: the refund arrives before the success
+        self.post_event('refund.created', refund, created=created + 5)
+        self.post_event('payment_intent.succeeded', self.intent, created=created)
+
+        process_stripe_events()
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'cancelled')
+        payment = Payment.objects.get(booking=self.booking)
+        self.assertEqual(payment.status, 'refunded')
+        self.assertEqual(payment.metadata['refund_id'], refund.id)
+
+    def test_payment_failed_marks_payment_failed(self):
+        intent = dict(self.intent, last_payment_error={'message': 'Your card was declined.'})
+        self.post_event('payment_intent.payment_failed', intent)
+        process_stripe_events()
+        payment = Payment.objects.get(booking=self.booking)
+        self.assertEqual(payment.status, 'failed')
+        self.assertEqual(payment.failure_reason, 'Your card was declined.')
+
+
+@override_settings(
+    PROVIDER_BACKEND='fake', PAYMENT_DEV_MODE=False, STRIPE_SECRET_KEY='sk_test_fake',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class RefundQueueTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        providers.reset_clients()
+        self.addCleanup(providers.reset_clients)
+        self.stripe = providers.stripe_client()
+        club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        sport = Sport.objects.create(name='Badminton', club=club, price_per_hour=500)
+        self.user = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        self.booking = Booking.objects.create(
+            user=self.user, club=club, sport=sport,
+            date=timezone.now().date() + timedelta(days=3),
+            start_time=time(10), end_time=time(11), amount=500, status='confirmed',
+        )
+        intent = self.stripe.PaymentIntent.create(amount=50000, currency='inr')
+        self.payment = Payment.objects.create(
+            booking=self.booking, stripe_payment_intent_id=intent.id, amount=500, status='completed',
+        )
+        self.client.force_authenticate(self.user)
+
+    def cancel(self):
+        return self.client.post(f'/api/bookings/{self.booking.id}/cancel/', {'reason': 'Rain'}, format='json')
+
+    def test_cancellation_queues_refund_and_worker_issues_it_once(self):
+        self.stripe.calls.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.cancel()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'refunded')
+
+        job = RefundJob.objects.get(payment=self.payment)
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual([call.operation for call in self.stripe.calls], ['refund.create'])
+        self.assertIn(job.idempotency_key, self.stripe._idempotent)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'refunded')
+        self.assertEqual(self.payment.metadata['refund_id'], job.stripe_refund_id)
+
+        # A worker that lost its lease retries with the same key: no second refund
+        RefundJob.objects.update(status='processing', available_at=timezone.now())
+        process_refund_jobs()
+        self.assertEqual(len(self.stripe.refunds), 1)
+
+    def test_transient_failure_backs_off_then_succeeds(self):
+        self.stripe.faults.error_rate = 1.0
+        self.cancel()
+        process_refund_jobs()
+
+        job = RefundJob.objects.get(payment=self.payment)
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertGreater(job.available_at, timezone.now())
+        self.assertEqual(Payment.objects.get(pk=self.payment.pk).status, 'completed')
+
+        self.stripe.faults.error_rate = 0.0
+        process_refund_jobs()
+        self.assertEqual(RefundJob.objects.get(pk=job.pk).status, 'pending')  # still backing off
+
+        RefundJob.objects.update(available_at=timezone.now())
+        process_refund_jobs()
+        self.assertEqual(RefundJob.objects.get(pk=job.pk).status, 'succeeded')
+        response = self.client.get(f'/api/payments/payments/{self.payment.id}/')
+        self.assertEqual(response.data['refund_status'], 'succeeded')
+
+
+    def test_admin_cancellation_queues_refund_and_notifies_the_waitlist(self):
+        waiting = User.objects.create_user(
+            username='waiting', email='waiting@example.com', mobile_number='9000000002', password='UserPass123',
+        )
+        SlotWaitlist.objects.create(
+            user=waiting, club=self.booking.club, sport=self.booking.sport,
+            date=self.booking.date, start_time=time(10), end_time=time(11),
+        )
+        staff = User.objects.create_superuser(
+            username='staff', email='staff@example.com', mobile_number='9000000003', password='AdminPass123',
+        )
+        self.client.force_login(staff)
+        response = self.client.post('/admin/bookings/booking/', {
+            'action': 'cancel_and_refund', '_selected_action': [self.booking.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(Booking.objects.get(pk=self.booking.pk).status, 'refunded')
+        self.assertTrue(RefundJob.objects.filter(payment=self.payment).exists())
+        self.assertTrue(SlotWaitlist.objects.get(user=waiting).notified)
+        self.assertTrue(OutboxMessage.objects.filter(user=waiting, kind='waitlist_available').exists())
+
+
+class PaymentLedgerTests(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        sport = Sport.objects.create(name='Badminton', club=self.club, price_per_hour=500)
+        user = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        self.day = timezone.now().date() + timedelta(days=2)
+        self.payments = []
+        for i in range(2):
+            booking = Booking.objects.create(
+                user=user, club=self.club, sport=sport, date=self.day,
+                start_time=time(10 + i), end_time=time(11 + i), amount=500, status='pending',
+            )
+            self.payments.append(Payment.objects.create(
+                booking=booking, stripe_payment_intent_id=f'pi_ledger_{i}', amount=500, status='pending',
+            ))
+
+    def test_transitions_post_once_and_roll_into_daily_balance(self):
+        for payment in self.payments:
+            payment.mark_completed()
+        self.payments[0].mark_refunded()
+        self.assertEqual(record_payments(self.payments), 0)  # replays post nothing
+
+        self.assertEqual(
+            sorted(LedgerEntry.objects.values_list('kind', 'amount')),
+            [('charge', 500), ('charge', 500), ('refund', -500)],
+        )
+        balance = DailyClubBalance.objects.get(club=self.club, date=self.day)
+        self.assertEqual((balance.charges, balance.refunds, balance.net), (1000, 500, 500))
+        self.assertEqual(totals(self.day, self.day)['net'], 500)
+        self.assertEqual(running_balances(self.club, self.day, self.day), [(self.day, 500, 500)])
+
+    def test_concurrent_post_of_the_same_entry_is_folded_in_once(self):
+        self.payments[0].mark_completed()
+        # Another poster inserted the charge after this one checked for it
+        with mock.patch('payments.ledger.LedgerEntry.objects.filter') as existing:
+            existing.return_value.values_list.return_value = []
+            self.assertEqual(record_payments([self.payments[0]]), 0)
+        self.assertEqual(LedgerEntry.objects.count(), 1)
+        self.assertEqual(DailyClubBalance.objects.get(club=self.club, date=self.day).charges, 500)
+
+    def test_entries_are_append_only(self):
+        self.payments[0].mark_completed()
+        entry = LedgerEntry.objects.get()
+        entry.amount = 1
+        with self.assertRaises(ValueError):
+            entry.save()
+
+
+@override_settings(
+    PROVIDER_BACKEND='fake', RECONCILE_SETTLE_SECONDS=3600, RECONCILE_WINDOW_SECONDS=6 * 3600,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class PaymentReconciliationTests(TestCase):
+    def setUp(self):
+        providers.reset_clients()
+        self.addCleanup(providers.reset_clients)
+        self.stripe = providers.stripe_client()
+        club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        sport = Sport.objects.create(name='Badminton', club=club, price_per_hour=500)
+        user = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        two_hours_ago = int(timezone.now().timestamp()) - 7200
+        self.payments = {}
+        for i, (stripe_status, local_status, booking_status) in enumerate([
+            ('succeeded', 'pending', 'pending'),     # webhook lost
+            ('canceled', 'pending', 'pending'),      # abandoned at Stripe
+            ('succeeded', 'completed', 'confirmed'), # refunded at Stripe, not here
+        ]):
+            booking = Booking.objects.create(
+                user=user, club=club, sport=sport,
+                date=timezone.now().date() + timedelta(days=2),
+                start_time=time(10 + i), end_time=time(11 + i), amount=500, status=booking_status,
+            )
+            intent = self.stripe.PaymentIntent.create(amount=50000, currency='inr', metadata={'booking_id': booking.id})
+            self.stripe.intents[intent.id].update(status=stripe_status, created=two_hours_ago)
+            self.payments[i] = Payment.objects.create(
+                booking=booking, stripe_payment_intent_id=intent.id, amount=500, status=local_status,
+            )
+        refund = self.stripe.Refund.create(payment_intent=self.payments[2].stripe_payment_intent_id)
+        self.stripe.refunds[refund.id]['created'] = two_hours_ago
+        Payment.objects.update(created_at=timezone.now() - timedelta(hours=3))
+
+    def test_one_list_page_per_stream_fixes_everything_in_bulk(self):
+        self.stripe.calls.clear()
+        totals = reconcile()
+
+        self.assertEqual([call.operation for call in self.stripe.calls], ['payment_intent.list', 'refund.list'])
+        self.assertEqual((totals['completed'], totals['failed'], totals['refunded']), (1, 1, 1))
+        self.assertEqual(Payment.objects.get(pk=self.payments[0].pk).status, 'completed')
+        self.assertEqual(Booking.objects.get(pk=self.payments[0].booking_id).status, 'confirmed')
+        self.assertEqual(Payment.objects.get(pk=self.payments[1].pk).status, 'failed')
+        self.assertEqual(Payment.objects.get(pk=self.payments[2].pk).status, 'refunded')
+        self.assertEqual(Booking.objects.get(pk=self.payments[2].booking_id).status, 'cancelled')
+        self.assertEqual(OutboxMessage.objects.filter(booking_id=self.payments[0].booking_id).count(), 2)
+
+        # The checkpoint moved past the scanned windows: nothing to redo
+        checkpoint = ReconciliationCheckpoint.objects.get()
+        self.assertGreaterEqual(checkpoint.scanned_until, int(timezone.now().timestamp()) - 3600 - 1)
+        self.assertEqual(reconcile()['completed'], 0)
+
+    def test_intent_that_settles_after_its_window_is_still_reconciled(self):
+        booking = Booking.objects.create(
+            user=self.payments[0].booking.user, club=self.payments[0].booking.club,
+            sport=self.payments[0].booking.sport, date=timezone.now().date() + timedelta(days=2),
+            start_time=time(15), end_time=time(16), amount=500, status='pending',
+        )
+        intent = self.stripe.PaymentIntent.create(amount=50000, currency='inr', metadata={'booking_id': booking.id})
+        self.stripe.intents[intent.id].update(status='processing', created=int(timezone.now().timestamp()) - 7200)
+        late = Payment.objects.create(booking=booking, stripe_payment_intent_id=intent.id, amount=500, status='pending')
+        Payment.objects.filter(pk=late.pk).update(created_at=timezone.now() - timedelta(hours=2))
+        reconcile()
+        self.assertEqual(Payment.objects.get(pk=late.pk).status, 'pending')
+
+        # Its window is behind the checkpoint now; the pending pass picks it up
+        self.stripe.intents[intent.id]['status'] = 'succeeded'
+        self.stripe.calls.clear()
+        totals = reconcile()
+        self.assertEqual((totals['retrieved'], totals['completed']), (1, 1))
+        self.assertEqual([call.operation for call in self.stripe.calls], ['payment_intent.retrieve'])
+        self.assertEqual(Payment.objects.get(pk=late.pk).status, 'completed')
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'confirmed')
+
+
+@override_settings(
+    UPI_ID='sportsclub@upi',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class UpiQrCodeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        qr._lru.clear()
+        club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        sport = Sport.objects.create(name='Badminton', club=club, price_per_hour=500)
+        self.user = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        self.booking = Booking.objects.create(
+            user=self.user, club=club, sport=sport,
+            date=timezone.now().date() + timedelta(days=2),
+            start_time=time(10), end_time=time(11), amount=500, status='pending',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_qr_is_rendered_once_then_served_from_cache(self):
+        url = f'/api/payments/upi/{self.booking.id}/qr/'
+        with mock.patch('payments.qr._render', wraps=qr._render) as render:
+            first = self.client.get(url)
+            second = self.client.get(url)
+            qr._lru.clear()  # another worker: only Redis has it
+            third = self.client.get(url)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first['Content-Type'], 'image/svg+xml')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first.content, third.content)
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_prerendered_png_needs_no_render_on_request(self):
+        from .tasks import prerender_upi_qr_codes
+        prerender_upi_qr_codes([str(self.booking.id)])
+        with mock.patch('payments.qr._render') as render:
+            response = self.client.get(f'/api/payments/upi/{self.booking.id}/qr/?fmt=png')
+        render.assert_not_called()
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+
+    def test_booking_is_created_when_the_prerender_cannot_be_queued(self):
+        from bookings.models import SlotLock
+        lock = SlotLock.objects.create(
+            club=self.booking.club, sport=self.booking.sport, date=self.booking.date,
+            start_time=time(12), end_time=time(13), user=self.user,
+        )
+        with mock.patch('bookings.views.prerender_upi_qr_codes.delay', side_effect=ConnectionError('broker down')):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/bookings/', {'lock_id': lock.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Booking.objects.filter(lock=lock).exists())
@@ -10,6 +10,8 @@ urlpatterns = [
     path('create-intent/', views.create_payment_intent, name='create_payment_intent'),
     path('confirm/', views.confirm_payment, name='confirm_payment'),
     path('webhook/', views.stripe_webhook, name='stripe_webhook'),
+    path('upi/<uuid:booking_id>/', views.upi_checkout, name='upi_checkout'),
+    path('upi/<uuid:booking_id>/qr/', views.upi_qr_code, name='upi_qr_code'),
     
     # Admin actions
     path('refund/<int:payment_id>/', views.refund_payment, name='refund_payment'),
@@ -1,5 +1,4 @@
 from django.conf import settings
-import qrcode
 from io import BytesIO
 from django.core.files import File
 import hashlib
@@ -22,23 +21,11 @@ class PaymentUtils:
         return upi_string
         
     @staticmethod
-    def generate_qr_code_image(data_string):
-        """Generate QR code image from string"""
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(data_string)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        return buffer
+    def generate_qr_code_image(data_string, fmt='png'):
+        """QR code image for a string (cached — see payments.qr)"""
+        from .qr import qr_image
+        image, _ = qr_image(data_string, fmt)
+        return BytesIO(image)
     
     @staticmethod
     def verify_webhook_signature(payload, signature, secret_key):
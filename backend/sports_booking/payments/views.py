@@ -1,5 +1,6 @@
-import stripe
 from django.conf import settings
+from django.http import HttpResponse
+from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status, viewsets
 from rest_framework.decorators import api_view, permission_classes
@@ -7,22 +8,28 @@ from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
 from bookings.models import Booking
 from .models import Payment
+from .ledger import record_payments
+from .refunds import enqueue_refund
+from .qr import CONTENT_TYPES as QR_CONTENT_TYPES, booking_upi_string, qr_image
+from .intent_cache import FINAL_STATUSES, cached_intent, remember_intent
+from .webhooks import record_event
 from .serializers import (
     PaymentSerializer,
     PaymentIntentSerializer,
     PaymentConfirmSerializer
 )
-from bookings.tasks import (
-    send_booking_confirmation_email,
-    send_booking_confirmation_sms
-)
+from notifications.outbox import enqueue_booking_confirmation
+from common import metrics
+from common.providers import stripe_client
 from django.db import transaction
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
-if getattr(settings, 'STRIPE_SECRET_KEY', None):
-    stripe.api_key = settings.STRIPE_SECRET_KEY
+# PaymentIntent states in which no money can move any more without the
+# customer acting again, so the intent may be replaced by a new one
+REPLACEABLE_STATUSES = {'requires_payment_method', 'requires_confirmation', 'requires_action', 'canceled'}
 
 
 class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
@@ -31,10 +38,10 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         if self.request.user.is_staff:
-            return Payment.objects.all().select_related('booking', 'booking__club', 'booking__sport')
+            return Payment.objects.all().select_related('booking', 'booking__club', 'booking__sport', 'refund_job')
         return Payment.objects.filter(
             booking__user=self.request.user
-        ).select_related('booking', 'booking__club', 'booking__sport')
+        ).select_related('booking', 'booking__club', 'booking__sport', 'refund_job')
 
 
 @api_view(['POST'])
@@ -55,13 +62,59 @@ def create_payment_intent(request):
                 'amount': float(booking.amount),
                 'currency': 'INR'
             }, status=status.HTTP_200_OK)
-        intent = stripe.PaymentIntent.create(
-            amount=int(booking.amount * 100),
+        amount = int(booking.amount * 100)
+        intent_metadata = {'booking_id': str(booking.id), 'user_id': str(request.user.id)}
+
+        existing = Payment.objects.filter(booking=booking).first()
+        if existing is not None and existing.status in ('completed', 'refunded'):
+            return Response({'error': 'This booking has already been paid'}, status=status.HTTP_409_CONFLICT)
+        if existing is not None and existing.status == 'pending':
+            # Page reloads and retries: hand back the intent we already made for
+            # this booking while it still describes the same charge.
+            stored = existing.metadata or {}
+            cached = cached_intent(existing.stripe_payment_intent_id)
+            if (stored.get('client_secret')
+                    and stored.get('intent_amount') == amount
+                    and stored.get('intent_metadata') == intent_metadata
+                    and (cached is None or cached['status'] not in FINAL_STATUSES)):
+                metrics.incr('payments.intent.reused')
+                return Response({
+                    'client_secret': stored['client_secret'],
+                    'payment_intent_id': existing.stripe_payment_intent_id,
+                    'amount': float(booking.amount),
+                    'currency': 'INR'
+                }, status=status.HTTP_200_OK)
+
+            # Never replace an intent that has been paid, or may still be
+            # (processing, requires_capture): the user would be charged twice
+            # and its late webhook would no longer match the payment row. A
+            # paid one settles the booking instead.
+            if cached is None:
+                cached = remember_intent(stripe_client().PaymentIntent.retrieve(existing.stripe_payment_intent_id))
+            if cached['status'] == 'succeeded':
+                if (cached['metadata'].get('booking_id') == str(booking.id)
+                        and cached['amount'] == stored.get('intent_amount')):
+                    _settle(booking, existing.stripe_payment_intent_id, existing.payment_method or 'card')
+                return Response({'error': 'This booking has already been paid'}, status=status.HTTP_409_CONFLICT)
+            if cached['status'] not in REPLACEABLE_STATUSES:
+                return Response(
+                    {'error': 'A payment for this booking is still being processed'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+
+        # Keyed on the intent being replaced (whatever became of it), so
+        # concurrent double-submits get the same intent back from Stripe
+        # instead of two.
+        previous = existing.stripe_payment_intent_id if existing else 'none'
+        intent = stripe_client().PaymentIntent.create(
+            amount=amount,
             currency='inr',
-            metadata={'booking_id': booking.id, 'user_id': request.user.id},
+            metadata=intent_metadata,
             description=f"Booking at {booking.club.name} for {booking.sport.name}",
             automatic_payment_methods={'enabled': True},
+            idempotency_key=f"pi-create:{booking.id}:{amount}:{previous}",
         )
+        metrics.incr('payments.intent.created')
         Payment.objects.update_or_create(
             booking=booking,
             defaults={
@@ -69,6 +122,11 @@ def create_payment_intent(request):
                 'amount': booking.amount,
                 'currency': 'INR',
                 'status': 'pending',
+                'metadata': {
+                    'client_secret': intent.client_secret,
+                    'intent_amount': amount,
+                    'intent_metadata': intent_metadata,
+                },
             }
         )
         return Response({
@@ -84,6 +142,37 @@ def create_payment_intent(request):
         return Response({'error': 'An unexpected error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _settle(booking, payment_intent_id, payment_method):
+    """Record a succeeded PaymentIntent against its booking and confirm the booking."""
+    with transaction.atomic():
+        payment, created = Payment.objects.get_or_create(
+            booking=booking,
+            stripe_payment_intent_id=payment_intent_id,
+            defaults={
+                'amount': booking.amount,
+                'currency': 'INR',
+                'status': 'completed',
+                'payment_method': payment_method,
+                'completed_at': timezone.now(),
+            }
+        )
+        if not created:
+            payment.status = 'completed'
+            payment.payment_method = payment_method
+            payment.completed_at = timezone.now()
+            payment.save()
+        record_payments([payment])
+        booking.status = 'confirmed'
+        booking.save()
+        try:
+            if booking.lock:
+                booking.lock.is_converted = True
+                booking.lock.save()
+        except Exception:
+            pass
+        enqueue_booking_confirmation(booking)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def confirm_payment(request):
@@ -102,7 +191,7 @@ def confirm_payment(request):
         # hardcoded to True in code.
         if settings.PAYMENT_DEV_MODE:
             with transaction.atomic():
-                Payment.objects.update_or_create(
+                payment, _ = Payment.objects.update_or_create(
                     booking=booking,
                     defaults={
                         'amount': booking.amount,
@@ -113,6 +202,7 @@ def confirm_payment(request):
                         'completed_at': timezone.now(),
                     }
                 )
+                record_payments([payment])
                 booking.status = 'confirmed'
                 booking.save()
                 try:
@@ -128,7 +218,20 @@ def confirm_payment(request):
                 'status': 'confirmed',
             }, status=status.HTTP_200_OK)
 
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+        # Already settled (the webhook got there first, or this is a retry):
+        # answer from our own rows without calling Stripe at all.
+        if booking.status == 'confirmed' and Payment.objects.filter(
+            booking=booking, stripe_payment_intent_id=payment_intent_id, status='completed'
+        ).exists():
+            metrics.incr('payments.confirm.local')
+            return Response({'message': 'Payment successful', 'booking_id': booking.id, 'status': 'confirmed'}, status=status.HTTP_200_OK)
+
+        intent = cached_intent(payment_intent_id)
+        if intent is None:
+            intent = remember_intent(stripe_client().PaymentIntent.retrieve(payment_intent_id))
+            metrics.incr('payments.confirm.stripe')
+        else:
+            metrics.incr('payments.confirm.cached')
 
         # Bind the PaymentIntent to THIS booking before trusting it.
         # Without this, a user could pay for one (cheap) booking, get a
@@ -137,7 +240,7 @@ def confirm_payment(request):
         # still read 'succeeded' with no money ever charged for the second
         # booking. Both the metadata set in create_payment_intent and the
         # charged amount must match this specific booking.
-        intent_booking_id = (intent.metadata or {}).get('booking_id')
+        intent_booking_id = intent['metadata'].get('booking_id')
         if str(intent_booking_id) != str(booking.id):
             logger.warning(
                 f"PaymentIntent {payment_intent_id} booking_id mismatch: "
@@ -145,45 +248,19 @@ def confirm_payment(request):
             )
             return Response({'error': 'This payment does not match the specified booking'},
                              status=status.HTTP_400_BAD_REQUEST)
-        if intent.amount != int(booking.amount * 100):
+        if intent['amount'] != int(booking.amount * 100):
             logger.warning(
                 f"PaymentIntent {payment_intent_id} amount mismatch: "
-                f"intent={intent.amount} expected={int(booking.amount * 100)} booking={booking.id}"
+                f"intent={intent['amount']} expected={int(booking.amount * 100)} booking={booking.id}"
             )
             return Response({'error': 'Payment amount does not match booking amount'},
                              status=status.HTTP_400_BAD_REQUEST)
 
-        if intent.status == 'succeeded':
-            with transaction.atomic():
-                payment, created = Payment.objects.get_or_create(
-                    booking=booking,
-                    stripe_payment_intent_id=payment_intent_id,
-                    defaults={
-                        'amount': booking.amount,
-                        'currency': 'INR',
-                        'status': 'completed',
-                        'payment_method': payment_method,
-                        'completed_at': timezone.now(),
-                    }
-                )
-                if not created:
-                    payment.status = 'completed'
-                    payment.payment_method = payment_method
-                    payment.completed_at = timezone.now()
-                    payment.save()
-                booking.status = 'confirmed'
-                booking.save()
-                try:
-                    if booking.lock:
-                        booking.lock.is_converted = True
-                        booking.lock.save()
-                except Exception:
-                    pass
-                send_booking_confirmation_email.delay(booking.id)
-                send_booking_confirmation_sms.delay(booking.id)
+        if intent['status'] == 'succeeded':
+            _settle(booking, payment_intent_id, payment_method)
             return Response({'message': 'Payment successful', 'booking_id': booking.id, 'status': 'confirmed'}, status=status.HTTP_200_OK)
         else:
-            return Response({'error': f'Payment status: {intent.status}'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'error': f"Payment status: {intent['status']}"}, status=status.HTTP_400_BAD_REQUEST)
     except Booking.DoesNotExist:
         return Response({'error': 'Booking not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
@@ -194,47 +271,94 @@ def confirm_payment(request):
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def stripe_webhook(request):
+    """
+    Verify and persist only (payments.webhooks). Once the event is safely
+    in the inbox Stripe gets its 200 straight away; any failure applying it
+    is retried by our worker, not by Stripe re-sending under load.
+    """
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
     try:
-        event = stripe.Webhook.construct_event(payload, sig_header, settings.STRIPE_WEBHOOK_SECRET)
-        if event['type'] == 'payment_intent.succeeded':
-            payment_intent = event['data']['object']
-            booking_id = payment_intent['metadata'].get('booking_id')
-            if booking_id:
-                booking = Booking.objects.get(id=booking_id)
-                Payment.objects.update_or_create(
-                    booking=booking,
-                    stripe_payment_intent_id=payment_intent['id'],
-                    defaults={'amount': booking.amount, 'currency': 'INR', 'status': 'completed', 'payment_method': payment_intent['payment_method_types'][0] if payment_intent['payment_method_types'] else 'card', 'completed_at': timezone.now()}
-                )
-                if booking.status != 'confirmed':
-                    booking.status = 'confirmed'
-                    booking.save()
-                    send_booking_confirmation_email.delay(booking.id)
-                    send_booking_confirmation_sms.delay(booking.id)
-        return Response({'status': 'success'}, status=status.HTTP_200_OK)
+        stripe_client().Webhook.construct_event(payload, sig_header, settings.STRIPE_WEBHOOK_SECRET)
+        event = json.loads(payload)
     except Exception as e:
-        logger.error(f"Webhook error: {str(e)}")
-        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        logger.warning(f"Rejected webhook: {str(e)}")
+        return Response({'error': 'Invalid payload or signature'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        with transaction.atomic():
+            record_event(event)
+    except Exception as e:
+        # Not stored — let Stripe retry this one
+        logger.error(f"Webhook error storing event {event.get('id')}: {str(e)}")
+        return Response({'error': 'Event could not be recorded'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response({'status': 'received'}, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
 def refund_payment(request, payment_id):
+    """Queue a full refund; the refund worker issues it (see payments.refunds)."""
     try:
-        payment = Payment.objects.get(id=payment_id)
-        if payment.status != 'completed':
-            return Response({'error': 'Can only refund completed payments'}, status=status.HTTP_400_BAD_REQUEST)
-        refund = stripe.Refund.create(payment_intent=payment.stripe_payment_intent_id)
-        payment.status = 'refunded'
-        payment.metadata = payment.metadata or {}
-        payment.metadata['refund_id'] = refund.id
-        payment.save()
-        payment.booking.status = 'cancelled'
-        payment.booking.save()
-        return Response({'message': 'Payment refunded successfully', 'refund_id': refund.id})
+        with transaction.atomic():
+            payment = Payment.objects.select_for_update().select_related('booking').get(id=payment_id)
+            if payment.status != 'completed':
+                return Response({'error': 'Can only refund completed payments'}, status=status.HTTP_400_BAD_REQUEST)
+            job = enqueue_refund(payment, reason=request.data.get('reason', ''), requested_by=request.user)
+            payment.booking.status = 'cancelled'
+            payment.booking.save()
+        return Response({
+            'message': 'Refund queued',
+            'refund_job_id': job.id,
+            'refund_status': job.status,
+        }, status=status.HTTP_202_ACCEPTED)
     except Payment.DoesNotExist:
         return Response({'error': 'Payment not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
-        return Response({'error': f'Refund failed: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response({'error': f'Refund failed: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _upi_booking(request, booking_id):
+    return Booking.objects.filter(id=booking_id, user=request.user, status='pending').first()
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def upi_checkout(request, booking_id):
+    """UPI deep link for a pending booking, plus where to fetch its QR code"""
+    if not settings.UPI_ID:
+        return Response({'error': 'UPI payments are not enabled'}, status=status.HTTP_404_NOT_FOUND)
+    booking = _upi_booking(request, booking_id)
+    if booking is None:
+        return Response({'error': 'Pending booking not found'}, status=status.HTTP_404_NOT_FOUND)
+    qr_url = reverse('upi_qr_code', args=[booking.id])
+    return Response({
+        'upi_uri': booking_upi_string(booking),
+        'amount': float(booking.amount),
+        'currency': 'INR',
+        'qr_svg_url': f"{qr_url}?fmt=svg",
+        'qr_png_url': f"{qr_url}?fmt=png",
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def upi_qr_code(request, booking_id):
+    """QR image for a pending booking's UPI link (?fmt=svg, the default, or png)"""
+    if not settings.UPI_ID:
+        return Response({'error': 'UPI payments are not enabled'}, status=status.HTTP_404_NOT_FOUND)
+    fmt = request.query_params.get('fmt', 'svg')
+    if fmt not in QR_CONTENT_TYPES:
+        return Response({'error': 'fmt must be svg or png'}, status=status.HTTP_400_BAD_REQUEST)
+    booking = _upi_booking(request, booking_id)
+    if booking is None:
+        return Response({'error': 'Pending booking not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    image, key = qr_image(booking_upi_string(booking), fmt)
+    etag = f'"{key}"'
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = HttpResponse(image, content_type=QR_CONTENT_TYPES[fmt])
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=900'
+    return response
@@ -0,0 +1,182 @@
+"""
+Stripe webhook inbox: record verified events, then apply them off the
+request path.
+
+record_event() runs in the webhook request and does one insert. Events are
+grouped by booking (ordering_key) and process_pending_events() applies
+each booking's events strictly in Stripe's order. Several workers can
+drain the inbox at once: rows are claimed with skip_locked, and a worker
+leaves a booking alone while an earlier event for it is still pending
+elsewhere (claimed by another worker, or backing off after a failure).
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from bookings.models import Booking
+from notifications.outbox import enqueue_booking_confirmation
+from .intent_cache import remember_intent
+from .ledger import record_payments
+from .models import Payment, StripeEvent
+
+logger = logging.getLogger(__name__)
+
+KICK_DEBOUNCE_SECONDS = 1
+
+
+def _intent_id(obj):
+    return obj['id'] if obj.get('object') == 'payment_intent' else obj.get('payment_intent')
+
+
+def _ordering_key(event):
+    obj = event['data']['object']
+    booking_id = (obj.get('metadata') or {}).get('booking_id')
+    intent_id = _intent_id(obj)
+    if not booking_id and intent_id:
+        # Charges and refunds don't carry the intent's metadata
+        booking_id = Payment.objects.filter(
+            stripe_payment_intent_id=intent_id
+        ).values_list('booking_id', flat=True).first()
+    return str(booking_id or intent_id or '')
+
+
+def _kick_processor():
+    try:
+        if cache.add('payments:stripe_events:kick', 1, timeout=KICK_DEBOUNCE_SECONDS):
+            from .tasks import process_stripe_events
+            process_stripe_events.delay()
+    except Exception as e:
+        logger.warning(f"Could not kick Stripe event processor, periodic drain will pick it up: {e}")
+
+
+def record_event(event):
+    """Store a verified event (a plain dict). Redeliveries of a stored event_id do nothing."""
+    handled = event['type'] in HANDLERS
+    StripeEvent.objects.bulk_create([StripeEvent(
+        event_id=event['id'],
+        type=event['type'],
+        ordering_key=_ordering_key(event) if handled else '',
+        stripe_created=event.get('created') or 0,
+        payload=event,
+        status='pending' if handled else 'ignored',
+    )], ignore_conflicts=True)
+    if handled:
+        transaction.on_commit(_kick_processor)
+
+    obj = event['data']['object']
+    if obj.get('object') == 'payment_intent':
+        # Stripe's own word on the intent; lets confirm_payment skip a retrieve
+        transaction.on_commit(lambda: remember_intent(obj))
+
+
+# --------------------------------------------------------------------------
+# Handlers — each receives event['data']['object'] and runs in a savepoint
+# --------------------------------------------------------------------------
+def _payment_succeeded(intent):
+    booking_id = (intent.get('metadata') or {}).get('booking_id')
+    if not booking_id:
+        return
+    booking = Booking.objects.select_for_update().get(id=booking_id)
+    method_types = intent.get('payment_method_types') or []
+    payment, _ = Payment.objects.update_or_create(
+        booking=booking,
+        stripe_payment_intent_id=intent['id'],
+        defaults={
+            'amount': booking.amount, 'currency': 'INR', 'status': 'completed',
+            'payment_method': method_types[0] if method_types else 'card',
+            'completed_at': timezone.now(),
+        }
+    )
+    record_payments([payment])
+    if booking.status != 'confirmed':
+        booking.status = 'confirmed'
+        booking.save()
+        enqueue_booking_confirmation(booking)
+
+
+def _payment_failed(intent):
+    payment = Payment.objects.select_for_update().filter(stripe_payment_intent_id=intent['id']).first()
+    if payment is None or payment.status != 'pending':
+        return
+    error = intent.get('last_payment_error') or {}
+    payment.mark_failed(error.get('message') or 'Payment failed')
+
+
+def _refunded(obj):
+    # charge.refunded fires for partial refunds too; only a full refund
+    # (or a succeeded refund object) releases the booking.
+    if obj.get('object') == 'charge' and not obj.get('refunded'):
+        return
+    if obj.get('object') == 'refund' and obj.get('status') != 'succeeded':
+        return
+    payment = Payment.objects.select_for_update().select_related('booking').filter(
+        stripe_payment_intent_id=_intent_id(obj)
+    ).first()
+    if payment is None or payment.status == 'refunded':
+        return
+    payment.status = 'refunded'
+    payment.metadata = payment.metadata or {}
+    if obj.get('object') == 'refund':
+        payment.metadata['refund_id'] = obj['id']
+    payment.save(update_fields=['status', 'metadata'])
+    record_payments([payment])
+    # A booking cancelled through us is already 'refunded' (refund queued)
+    if payment.booking.status not in ('cancelled', 'refunded'):
+        payment.booking.status = 'cancelled'
+        payment.booking.save()
+
+
+HANDLERS = {
+    'payment_intent.succeeded': _payment_succeeded,
+    'payment_intent.payment_failed': _payment_failed,
+    'charge.refunded': _refunded,
+    'refund.created': _refunded,
+    'refund.updated': _refunded,
+}
+
+
+def _blocked_keys(events):
+    """Bookings with an earlier pending event this batch didn't claim."""
+    first = {}
+    for event in events:
+        first.setdefault(event.ordering_key, (event.stripe_created, event.id))
+    others = StripeEvent.objects.filter(
+        status='pending', ordering_key__in=[key for key in first if key]
+    ).exclude(id__in=[e.id for e in events]).values_list('ordering_key', 'stripe_created', 'id')
+    return {key for key, created, pk in others if (created, pk) < first[key]}
+
+
+def process_pending_events(batch_size):
+    """Apply one batch of due events. Returns the number processed."""
+    with transaction.atomic():
+        events = list(
+            StripeEvent.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', available_at__lte=timezone.now())
+            .order_by('stripe_created', 'id')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        blocked = _blocked_keys(events)
+        touched = []
+        for event in events:
+            if event.ordering_key in blocked:
+                continue
+            try:
+                with transaction.atomic():
+                    HANDLERS[event.type](event.payload['data']['object'])
+                event.mark_processed()
+            except Exception as e:
+                logger.error(f"Stripe event {event.event_id} ({event.type}) failed: {e}")
+                event.mark_attempt_failed(str(e))
+                # Keep this booking's later events behind the failed one
+                if event.ordering_key:
+                    blocked.add(event.ordering_key)
+            touched.append(event)
+
+        StripeEvent.objects.bulk_update(
+            touched, ['status', 'attempts', 'last_error', 'available_at', 'processed_at']
+        )
+    return sum(1 for e in touched if e.status == 'processed')
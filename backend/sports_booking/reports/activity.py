@@ -0,0 +1,78 @@
+"""
+Admin activity feed: events are appended by reports.signals as
+bookings, payments, clubs and sports change, and read newest first on
+the (occurred_at, id) index by the dashboard and the admin activity
+endpoint.
+
+queryset.update() skips signals, so bulk transitions (lock expiry, admin
+bulk actions) don't appear in the feed; they are housekeeping rather than
+activity.
+"""
+from bookings.models import Booking
+from .models import ActivityEvent
+
+BOOKING_EVENTS = {'pending', 'confirmed', 'completed', 'cancelled', 'refunded'}
+AMOUNT_EVENTS = {'confirmed', 'refunded'}
+
+FEED_SIZE = 20
+
+
+def _names(booking):
+    """(user name, sport name, club name) for a booking, from loaded relations or one query."""
+    cache = booking._state.fields_cache
+    if all(cache.get(rel) is not None for rel in ('user', 'club', 'sport')):
+        return booking.user.get_full_name() or booking.user.username, booking.sport.name, booking.club.name
+    first, last, username, sport, club = Booking.objects.filter(pk=booking.pk).values_list(
+        'user__first_name', 'user__last_name', 'user__username', 'sport__name', 'club__name'
+    ).get()
+    return f"{first} {last}".strip() or username, sport, club
+
+
+def booking_message(event_type, user, sport, club):
+    return {
+        'pending': f"{user} initiated booking at {club}",
+        'confirmed': f"{user} booked {sport} at {club}",
+        'completed': f"{user} played {sport} at {club}",
+        'cancelled': f"{user} cancelled at {club}",
+        'refunded': f"Refund for {user} — {club}",
+        'payment_failed': f"Payment failed for {user} — {sport} at {club}",
+        'refund_issued': f"Refund issued to {user} — {club}",
+    }[event_type]
+
+
+def booking_event(booking, event_type, amount=None, occurred_at=None):
+    user, sport, club = _names(booking)
+    event = ActivityEvent(
+        type=event_type, message=booking_message(event_type, user, sport, club), amount=amount,
+        user_id=booking.user_id, club_id=booking.club_id, booking_id=booking.pk,
+    )
+    if occurred_at:
+        event.occurred_at = occurred_at
+    return event
+
+
+def booking_changed(booking, old_status, new_status):
+    if new_status != old_status and new_status in BOOKING_EVENTS:
+        amount = booking.amount if new_status in AMOUNT_EVENTS else None
+        booking_event(booking, new_status, amount).save()
+
+
+def payment_changed(payment, old_status, new_status):
+    if new_status == old_status or new_status not in ('failed', 'refunded'):
+        return
+    booking = payment.loaded_booking()
+    booking_event(booking, 'payment_failed' if new_status == 'failed' else 'refund_issued', payment.amount).save()
+
+
+def club_event(club, occurred_at=None):
+    return ActivityEvent(
+        type='club_added', message=f"New club added: {club.name} — {club.location}", club_id=club.pk,
+        occurred_at=occurred_at or club.created_at,
+    )
+
+
+def sport_event(sport):
+    return ActivityEvent(
+        type='sport_added', club_id=sport.club_id,
+        message=f"Sport added: {sport.name} at {sport.club.name} (₹{sport.price_per_hour}/hr)",
+    )
@@ -0,0 +1,70 @@
+from django.contrib import admin
+from .models import ActivityEvent, DailyRollup, ReportJob
+from .rollups import refresh
+
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'club', 'sport', 'pending', 'confirmed', 'completed', 'cancelled', 'refunded',
+                    'booked_hours', 'gross', 'refunds', 'updated_at']
+    list_filter = ['club', 'sport', 'date']
+    date_hierarchy = 'date'
+    readonly_fields = ['updated_at']
+    list_per_page = 50
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('club', 'sport')
+
+    actions = ['recompute']
+
+    def recompute(self, request, queryset):
+        keys = list(queryset.values_list('date', 'club_id', 'sport_id'))
+        refresh(keys)
+        self.message_user(request, f'{len(keys)} rollup(s) recomputed from bookings and payments.')
+    recompute.short_description = 'Recompute selected rollups from base tables'
+
+
+@admin.register(ActivityEvent)
+class ActivityEventAdmin(admin.ModelAdmin):
+    list_display = ['occurred_at', 'type', 'message', 'amount', 'user', 'club']
+    list_filter = ['type', 'occurred_at']
+    search_fields = ['message', 'user__username']
+    date_hierarchy = 'occurred_at'
+    list_per_page = 100
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'club')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ['key', 'kind', 'status', 'is_final', 'attempts', 'requested_by', 'queued_at', 'completed_at',
+                    'invalidated_at']
+    list_filter = ['kind', 'status', 'is_final']
+    search_fields = ['key']
+    readonly_fields = ['key', 'kind', 'params', 'period_start', 'period_end', 'result', 'last_error', 'attempts',
+                       'requested_by', 'created_at', 'queued_at', 'started_at', 'completed_at', 'invalidated_at',
+                       'version']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('requested_by')
+
+    actions = ['rebuild']
+
+    def rebuild(self, request, queryset):
+        from .jobs import submit
+        # Evaluated up front: the list filter may be on the status that submit() changes
+        jobs = list(queryset)
+        for job in jobs:
+            submit(job.kind, job.params, requested_by=request.user, force=True)
+        self.message_user(request, f'{len(jobs)} report job(s) queued for rebuilding.')
+    rebuild.short_description = 'Rebuild selected reports'
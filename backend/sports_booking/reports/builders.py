@@ -0,0 +1,119 @@
+"""
+Admin report payloads, built from the daily rollups and the ledger's
+daily club balances: four queries reshaped in memory, so the query count
+does not grow with the number of clubs, sports or days. Served directly
+by accounts.views.monthly_report and computed by report jobs
+(reports.jobs) for anything larger.
+"""
+from calendar import monthrange
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from clubs.models import Club, Sport
+from payments.models import DailyClubBalance
+from .models import DailyRollup
+
+REPORT_STATUSES = ('confirmed', 'refunded', 'cancelled')
+
+
+def month_bounds(year, month):
+    """(first day, last day) of a month; raises ValueError for an invalid one."""
+    _, last_day = monthrange(year, month)
+    return date(year, month, 1), date(year, month, last_day)
+
+
+def _revenue(money):
+    """
+    Report money from ledger balance totals, with the meaning the reports
+    always had: gross is the completed payments (charges not refunded),
+    net takes the refunds off that again.
+    """
+    gross = money['net']  # charges - refunds + adjustments
+    return {
+        'gross_revenue': float(gross), 'refunds': float(money['refunds']),
+        'net_revenue': float(gross) - float(money['refunds']),
+    }
+
+
+def period_report(start_date, end_date):
+    """Bookings and money per club, sport and day over [start_date, end_date]."""
+    # 1. Booking counts and per-sport revenue from the daily rollups (date x club x sport)
+    booking_counts = defaultdict(Counter)           # club_id -> status -> n
+    sport_counts = defaultdict(Counter)             # club_id -> sport_id -> n
+    sport_revenue = defaultdict(Counter)            # club_id -> sport_id -> amount
+    daily_counts = defaultdict(Counter)             # date -> bookings / confirmed
+    for row in DailyRollup.objects.filter(date__gte=start_date, date__lte=end_date).values(
+        'date', 'club_id', 'sport_id', 'gross', 'refunds', *REPORT_STATUSES
+    ):
+        club_id, sport_id = row['club_id'], row['sport_id']
+        sport_revenue[club_id][sport_id] += row['gross'] - row['refunds']
+        booked = sum(row[s] for s in REPORT_STATUSES)
+        if booked:
+            booking_counts[club_id].update({s: row[s] for s in REPORT_STATUSES})
+            sport_counts[club_id][sport_id] += booked
+            daily_counts[row['date']].update({'n': booked, 'confirmed': row['confirmed']})
+
+    # 2. Money, from the ledger's daily balances (club x day rows)
+    club_money = defaultdict(Counter)
+    daily_net = Counter()
+    for row in DailyClubBalance.objects.filter(date__gte=start_date, date__lte=end_date).values(
+        'club_id', 'date', 'charges', 'refunds', 'net'
+    ):
+        club_money[row['club_id']].update({k: row[k] for k in ('charges', 'refunds', 'net')})
+        daily_net[row['date']] += row['net']
+    period_money = Counter()
+    for money in club_money.values():
+        period_money.update(money)
+
+    # 3 + 4. Names for the clubs and sports that had bookings
+    active_sports = defaultdict(list)
+    for sport in Sport.objects.filter(club_id__in=list(booking_counts), is_active=True).order_by('id'):
+        active_sports[sport.club_id].append(sport)
+
+    club_breakdown = []
+    for club in Club.objects.filter(id__in=list(booking_counts)):
+        counts, money = booking_counts[club.id], club_money[club.id]
+        sports_data = [
+            {'name': s.name, 'bookings': sport_counts[club.id][s.id],
+             'revenue': float(sport_revenue[club.id][s.id])}
+            for s in active_sports[club.id] if sport_counts[club.id][s.id]
+        ]
+        club_breakdown.append({
+            'club_name': club.name, 'location': club.location,
+            'total_bookings': sum(counts.values()), 'confirmed': counts['confirmed'],
+            'refunded': counts['refunded'], 'cancelled': counts['cancelled'],
+            **_revenue(money), 'sports': sports_data
+        })
+
+    daily_data = []
+    current = start_date
+    while current <= end_date:
+        day = daily_counts.get(current, {})
+        daily_data.append({'date': str(current), 'day': current.strftime('%a %d'),
+            'bookings': day.get('n', 0), 'confirmed': day.get('confirmed', 0),
+            'revenue': float(daily_net[current])})
+        current += timedelta(days=1)
+
+    period_counts = Counter()
+    for counts in booking_counts.values():
+        period_counts.update(counts)
+    revenue = _revenue(period_money)
+
+    return {
+        'start_date': str(start_date), 'end_date': str(end_date),
+        'total_bookings': sum(period_counts.values()),
+        'confirmed_bookings': period_counts['confirmed'],
+        'cancelled_bookings': period_counts['cancelled'],
+        'refunded_bookings': period_counts['refunded'],
+        'gross_revenue': revenue['gross_revenue'], 'total_refunds': revenue['refunds'],
+        'net_revenue': revenue['net_revenue'],
+        'club_breakdown': club_breakdown, 'daily_data': daily_data,
+    }
+
+
+def monthly_report(year, month):
+    start_date, end_date = month_bounds(year, month)
+    return {
+        'month': month, 'year': year, 'month_name': start_date.strftime('%B %Y'),
+        **period_report(start_date, end_date),
+    }
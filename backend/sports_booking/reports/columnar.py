@@ -0,0 +1,377 @@
+"""
+Columnar snapshot of historical bookings for analytics.
+
+Days that have settled (ANALYTICS_SETTLE_DAYS behind today) are copied
+into one directory per month under ANALYTICS_STORE_DIR, one .npy file per
+column, rows sorted by day. Club, sport and the two statuses are dictionary-encoded into small
+integer codes (dictionaries.json, append-only so codes never change) and
+money is stored in paise, so a year of bookings is a few tens of MB that
+np.load(mmap_mode='r') maps without reading.
+
+scan() is the query layer: it yields the same columns chunk by chunk
+for any date range, from the memory-mapped months where the snapshot
+covers them and from the live database for the rest (typically the last
+few days), so callers never care where a day came from.
+
+The snapshot lives on the web service's disk. It is created there by
+the snapshot_bookings command (run in the background when the service
+starts, see render.yaml) and then maintained by sync() from the readers
+themselves: at most once per ANALYTICS_SYNC_INTERVAL it copies again
+every month with a late change recorded against it (a refund or admin
+edit after the day settled; reports.jobs.invalidate calls mark_changed)
+and appends newly settled days. Both write month by month and record
+their progress after each, so an interrupted run is simply continued.
+"""
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+from calendar import monthrange
+from datetime import date, timedelta
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min
+from django.db.models.functions import ExtractHour, ExtractMinute
+from django.utils import timezone
+
+from bookings.models import Booking
+from .models import SnapshotChange
+
+logger = logging.getLogger(__name__)
+
+EPOCH = date(1970, 1, 1)
+
+COLUMNS = {
+    'day': np.int32,             # days since 1970-01-01
+    'club': np.uint16,           # dictionary codes
+    'sport': np.uint16,
+    'status': np.uint8,
+    'payment_status': np.uint8,  # '' when there is no payment
+    'start_minute': np.int16,    # minute of day
+    'end_minute': np.int16,
+    'amount': np.int64,          # booking amount, paise
+    'paid': np.int64,            # payment amount, paise
+}
+DICTIONARIES = ('club', 'sport', 'status', 'payment_status')
+PAID_STATUSES = ('completed', 'refunded')
+
+LIVE_CHUNK_ROWS = 100_000
+
+
+def day_number(day):
+    return (day - EPOCH).days
+
+
+def weekday(days):
+    """Monday=0 weekday of day numbers (1970-01-01 was a Thursday)."""
+    return (days + 3) % 7
+
+
+def _write_atomic(path, write):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class Store:
+    """The on-disk snapshot: dictionaries plus one directory of column files per month."""
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.ANALYTICS_STORE_DIR)
+        path = self.root / 'dictionaries.json'
+        self.dictionaries = json.loads(path.read_text()) if path.exists() else {name: [] for name in DICTIONARIES}
+        self._codes = {name: {v: i for i, v in enumerate(values)} for name, values in self.dictionaries.items()}
+        path = self.root / 'meta.json'
+        self.meta = json.loads(path.read_text()) if path.exists() else {'first': None, 'through': None}
+
+    # -- dictionaries ------------------------------------------------------
+    def encode(self, name, values):
+        """Codes for `values`, adding unseen ones to the (in-memory) dictionary."""
+        values = np.asarray(values, dtype=object)
+        uniques, inverse = np.unique(values, return_inverse=True)
+        codes = self._codes[name]
+        for value in uniques:
+            if value not in codes:
+                codes[value] = len(self.dictionaries[name])
+                self.dictionaries[name].append(value)
+        lookup = np.array([codes[value] for value in uniques], dtype=COLUMNS[name])
+        return lookup[inverse]
+
+    def codes_for(self, name, values):
+        """Existing codes of `values` (unknown values are skipped)."""
+        codes = self._codes[name]
+        return np.array([codes[v] for v in values if v in codes], dtype=COLUMNS[name])
+
+    def decode(self, name, codes):
+        return np.asarray(self.dictionaries[name], dtype=object)[codes]
+
+    # -- coverage --------------------------------------------------------
+    @property
+    def first(self):
+        return date.fromisoformat(self.meta['first']) if self.meta['first'] else None
+
+    @property
+    def through(self):
+        return date.fromisoformat(self.meta['through']) if self.meta['through'] else None
+
+    def _month_dir(self, year, month):
+        return self.root / f'{year:04d}-{month:02d}'
+
+    def read_month(self, year, month, columns):
+        """Memory-mapped columns of one month ({} if it has no rows)."""
+        path = self._month_dir(year, month)
+        if not (path / 'day.npy').exists():
+            return {}
+        return {name: np.load(path / f'{name}.npy', mmap_mode='r') for name in columns}
+
+    # -- writing ---------------------------------------------------------
+    def append(self, through):
+        """
+        Copy every day after the current snapshot up to `through` from the
+        database. Returns the number of bookings appended.
+
+        Month by month, each rewritten whole from the database and the
+        coverage recorded right after it, so an append that dies partway
+        leaves a consistent snapshot that the next one continues from.
+        """
+        if self.through and through <= self.through:
+            return 0
+        if self.through:
+            first, start = self.first, self.through + timedelta(days=1)
+        else:
+            # A new snapshot covers all history; there is nothing to copy before the oldest booking
+            first = EPOCH
+            start = min(Booking.objects.aggregate(first=Min('date'))['first'] or through, through)
+        appended = 0
+        for year, month in _months(start, through):
+            end = min(date(year, month, monthrange(year, month)[1]), through)
+            columns = self._copy(year, month, max(date(year, month, 1), first), end)
+            appended += int(np.count_nonzero(columns['day'] >= day_number(start)))
+            self.set_coverage(first, end)
+        return appended
+
+    def rewrite_month(self, year, month):
+        """Copy the snapshotted days of one month from the database again. Returns the number of bookings."""
+        first = max(date(year, month, 1), self.first)
+        last = min(date(year, month, monthrange(year, month)[1]), self.through)
+        return len(self._copy(year, month, first, last)['day'])
+
+    def _copy(self, year, month, first, last):
+        """Replace one month with the bookings dated [first, last] in the database. Returns the columns."""
+        parts = list(live_chunks(self, first, last))
+        # Dictionaries first: month files may only use codes already on disk
+        self.save_dictionaries()
+        columns = {
+            name: np.concatenate([p[name] for p in parts]) if parts else np.empty(0, COLUMNS[name])
+            for name in COLUMNS
+        }
+        self.write_month(year, month, columns)
+        return columns
+
+    def write_month(self, year, month, columns):
+        """
+        Replace one month with `columns`, sorted by day. The files are
+        written to a fresh directory that is then swapped in, so readers
+        (whose existing mappings stay valid) never see half a month.
+        """
+        target = self._month_dir(year, month)
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=self.root, prefix=f'.{target.name}-'))
+        order = np.argsort(columns['day'], kind='stable')
+        for name, values in columns.items():
+            np.save(staging / f'{name}.npy', np.asarray(values)[order].astype(COLUMNS[name]))
+        if target.exists():
+            retired = Path(tempfile.mkdtemp(dir=self.root, prefix=f'.{target.name}-old-'))
+            os.replace(target, retired / target.name)
+            os.replace(staging, target)
+            shutil.rmtree(retired)
+        else:
+            os.replace(staging, target)
+
+    def save_dictionaries(self):
+        _write_atomic(self.root / 'dictionaries.json', lambda f: f.write(json.dumps(self.dictionaries).encode()))
+
+    def set_coverage(self, first, through):
+        self.meta = {'first': str(first), 'through': str(through)}
+        _write_atomic(self.root / 'meta.json', lambda f: f.write(json.dumps(self.meta).encode()))
+
+
+def _minute_of_day(field):
+    return ExtractHour(field) * 60 + ExtractMinute(field)
+
+
+def live_chunks(store, start, end, sport_ids=None):
+    """Bookings with date in [start, end] from the database, encoded like the snapshot."""
+    bookings = Booking.objects.filter(date__gte=start, date__lte=end)
+    if sport_ids is not None:
+        bookings = bookings.filter(sport_id__in=list(sport_ids))
+    rows = bookings.annotate(
+        start_minute=_minute_of_day('start_time'), end_minute=_minute_of_day('end_time'),
+    ).values_list(
+        'date', 'club_id', 'sport_id', 'status', 'payment__status', 'start_minute', 'end_minute',
+        'amount', 'payment__amount',
+    ).order_by('date').iterator(chunk_size=LIVE_CHUNK_ROWS)
+    while True:
+        chunk = list(islice(rows, LIVE_CHUNK_ROWS))
+        if not chunk:
+            return
+        day, club, sport, status, payment_status, start_minute, end_minute, amount, paid = zip(*chunk)
+        yield {
+            'day': np.array(day, dtype='datetime64[D]').astype(np.int64).astype(COLUMNS['day']),
+            'club': store.encode('club', club),
+            'sport': store.encode('sport', sport),
+            'status': store.encode('status', status),
+            'payment_status': store.encode('payment_status', [s or '' for s in payment_status]),
+            'start_minute': np.array(start_minute, dtype=COLUMNS['start_minute']),
+            'end_minute': np.array(end_minute, dtype=COLUMNS['end_minute']),
+            'amount': np.rint(np.array(amount, dtype=float) * 100).astype(np.int64),
+            'paid': np.rint(np.array([p or 0 for p in paid], dtype=float) * 100).astype(np.int64),
+        }
+
+
+def _months(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def scan(start, end, columns=tuple(COLUMNS), sport_ids=None, store=None):
+    """
+    Yield dicts of column arrays covering bookings dated [start, end]:
+    snapshot months where covered, the live database elsewhere. Codes
+    from both sources share `store`'s dictionaries.
+    """
+    store = store or Store()
+    columns = set(columns) | {'day'}
+    sport_codes = None if sport_ids is None else store.codes_for('sport', sport_ids)
+    first, through = store.first, store.through
+
+    live_ranges = [(start, end)]
+    if first and through and first <= end and through >= start:
+        snap_start, snap_end = max(start, first), min(end, through)
+        live_ranges = [(start, snap_start - timedelta(days=1)), (snap_end + timedelta(days=1), end)]
+        lo, hi = day_number(snap_start), day_number(snap_end)
+        for year, month in _months(snap_start, snap_end):
+            arrays = store.read_month(year, month, columns | ({'sport'} if sport_codes is not None else set()))
+            if not arrays:
+                continue
+            # Rows are sorted by day: the range is a contiguous slice of the mapping
+            days = arrays['day']
+            i, j = np.searchsorted(days, lo, 'left'), np.searchsorted(days, hi, 'right')
+            if i == j:
+                continue
+            part = {name: arrays[name][i:j] for name in arrays}
+            if sport_codes is not None:
+                mask = np.isin(part['sport'], sport_codes)
+                part = {name: values[mask] for name, values in part.items()}
+            yield {name: part[name] for name in columns}
+
+    for live_start, live_end in live_ranges:
+        if live_start <= live_end:
+            for chunk in live_chunks(store, live_start, live_end, sport_ids):
+                yield {name: chunk[name] for name in columns}
+
+
+def settled_through():
+    """The last day considered settled enough to snapshot."""
+    return timezone.localdate() - timedelta(days=settings.ANALYTICS_SETTLE_DAYS)
+
+
+def mark_changed(days):
+    """Record changes to bookings dated `days`, so sync() copies their months again."""
+    through = settled_through()
+    months = {day.replace(day=1) for day in days if day <= through}
+    SnapshotChange.objects.bulk_create([SnapshotChange(month=month) for month in sorted(months)])
+
+
+def mark_changed_range(first=None, last=None):
+    """mark_changed() for every day of [first, last] (open-ended when omitted)."""
+    first = first or Booking.objects.aggregate(first=Min('date'))['first']
+    last = min(last or date.max, settled_through())
+    if first is None or last < first:
+        return
+    SnapshotChange.objects.bulk_create([SnapshotChange(month=date(y, m, 1)) for y, m in _months(first, last)])
+
+
+def sync(store=None, create=False, through=None):
+    """
+    Bring the snapshot up to date and return it: copy again the months
+    with recorded changes, then append the days settled since (up to
+    `through`, by default the last settled day). Readers call it on
+    every use; it runs at most once per ANALYTICS_SYNC_INTERVAL seconds
+    and in one process at a time, the others carry on with what is on
+    disk (scan reads anything not covered from the database).
+
+    A missing snapshot is only built with `create` (the snapshot_bookings
+    command, which also skips the throttle): copying all history does
+    not belong on a request.
+    """
+    store = store or Store()
+    interval = settings.ANALYTICS_SYNC_INTERVAL
+    try:
+        if not create and interval and not cache.add('reports:columnar:sync', 1, timeout=interval):
+            return store
+    except Exception as e:
+        logger.warning(f"Analytics sync throttle unavailable: {e}")
+
+    store.root.mkdir(parents=True, exist_ok=True)
+    with open(store.root / '.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return store
+        store = Store(store.root)
+        if not store.through and not create:
+            return store
+        # Marks committed after this read survive until the next sync
+        changes = list(SnapshotChange.objects.values_list('id', 'month'))
+        if store.through:
+            for month in sorted({month for _, month in changes if month <= store.through}):
+                store.rewrite_month(month.year, month.month)
+        store.append(through or settled_through())
+        SnapshotChange.objects.filter(id__in=[pk for pk, _ in changes]).delete()
+    return store
+
+
+def totals(start, end, by='club', store=None):
+    """
+    Booking counts by status, gross paid and refunded (rupees) per club or
+    sport over [start, end], aggregated over the columns with bincounts.
+    """
+    store = store or Store()
+    acc = {}
+    for chunk in scan(start, end, (by, 'status', 'payment_status', 'paid'), store=store):
+        # Sized per chunk: live chunks may have added codes
+        size = max(len(store.dictionaries[by]), 1)
+        n_status = max(len(store.dictionaries['status']), 1)
+        keys = chunk[by].astype(np.int64)
+        counts = np.bincount(keys * n_status + chunk['status'], minlength=size * n_status).reshape(size, n_status)
+        charged = np.isin(chunk['payment_status'], store.codes_for('payment_status', PAID_STATUSES))
+        refunded = np.isin(chunk['payment_status'], store.codes_for('payment_status', ('refunded',)))
+        gross = np.bincount(keys, weights=chunk['paid'] * charged, minlength=size)
+        refunds = np.bincount(keys, weights=chunk['paid'] * refunded, minlength=size)
+        for code in np.flatnonzero(counts.sum(axis=1)):
+            entry = acc.setdefault(store.dictionaries[by][code], {'bookings': {}, 'gross': 0, 'refunds': 0})
+            for status_code in np.flatnonzero(counts[code]):
+                name = store.dictionaries['status'][status_code]
+                entry['bookings'][name] = entry['bookings'].get(name, 0) + int(counts[code, status_code])
+            entry['gross'] += int(gross[code])
+            entry['refunds'] += int(refunds[code])
+    for entry in acc.values():
+        entry['gross'] /= 100
+        entry['refunds'] /= 100
+        entry['net'] = entry['gross'] - entry['refunds']
+    return acc
@@ -0,0 +1,194 @@
+"""
+Streaming exports of bookings and payments for admins.
+
+Rows are read with values_list().iterator(chunk_size=EXPORT_CHUNK_SIZE)
+(a server-side cursor on PostgreSQL, chunked fetches elsewhere) and
+encoded one line at a time, so an export of any size is one query and
+constant memory, and the first bytes reach the client immediately
+instead of after the whole result has been built.
+
+The web service runs gunicorn's gthread workers (Procfile, render.yaml):
+an export streams from its own thread for as long as it takes, while
+--timeout only restarts a worker process that stops responding as a
+whole. With the sync workers it would be killed after 120 seconds.
+
+Text cells of a CSV export that a spreadsheet would read as a formula
+(starting with =, +, -, @, tab or carriage return) are prefixed with
+an apostrophe, since names and notes in them come from users.
+"""
+import csv
+import json
+from datetime import date as date_cls
+
+from django.conf import settings
+from django.db.models import Q
+
+from bookings.models import Booking
+from payments.models import Payment
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+STATUSES = {status for status, _ in Booking.STATUS_CHOICES}
+
+
+def _parse_date(value, name):
+    try:
+        return date_cls.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}, expected YYYY-MM-DD")
+
+
+def _parse_id(value, name):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}")
+
+
+def booking_filters(params, prefix=''):
+    """
+    Filter kwargs for the admin booking filters in `params`: status, club,
+    sport, date_from, date_to (booking date, inclusive); the free-text q
+    goes through booking_search(). `prefix` reaches the booking through a
+    relation (e.g. 'booking__'). Raises ValueError on malformed values.
+    """
+    filters = {}
+    booking_status = params.get('status')
+    if booking_status:
+        if booking_status not in STATUSES:
+            raise ValueError(f"Invalid status. Must be one of: {', '.join(sorted(STATUSES))}")
+        filters[f'{prefix}status'] = booking_status
+    if params.get('club'):
+        filters[f'{prefix}club_id'] = _parse_id(params['club'], 'club')
+    if params.get('sport'):
+        filters[f'{prefix}sport_id'] = _parse_id(params['sport'], 'sport')
+    if params.get('date_from'):
+        filters[f'{prefix}date__gte'] = _parse_date(params['date_from'], 'date_from')
+    if params.get('date_to'):
+        filters[f'{prefix}date__lte'] = _parse_date(params['date_to'], 'date_to')
+    return filters
+
+
+def booking_search(q, prefix=''):
+    """
+    Bookings whose user (username or mobile) or club name starts with `q`.
+    Served on PostgreSQL by the pattern_ops indexes of accounts 0006 and
+    clubs 0007, which match these lookups' UPPER(col::text) LIKE form.
+    """
+    q = q.strip()
+    return (
+        Q(**{f'{prefix}user__username__istartswith': q})
+        | Q(**{f'{prefix}user__mobile_number__startswith': q})
+        | Q(**{f'{prefix}club__name__istartswith': q})
+    )
+
+
+def payment_method(method, booking_status):
+    """The method shown to admins: confirmed/refunded bookings without one were paid by card."""
+    method = (method or '').strip()
+    if not method and booking_status in ('confirmed', 'refunded'):
+        method = 'card'
+    return method or None
+
+
+# --------------------------------------------------------------------------
+# Columns: (output name, values_list() lookups, row -> value)
+# --------------------------------------------------------------------------
+def _full_name(first, last, username):
+    return f"{first} {last}".strip() or username
+
+
+BOOKING_COLUMNS = [
+    ('id', ('id',), str),
+    ('user_name', ('user__first_name', 'user__last_name', 'user__username'), _full_name),
+    ('club_name', ('club__name',), None),
+    ('club_location', ('club__location',), None),
+    ('sport_name', ('sport__name',), None),
+    ('date', ('date',), str),
+    ('start_time', ('start_time',), str),
+    ('end_time', ('end_time',), str),
+    ('amount', ('amount',), float),
+    ('status', ('status',), None),
+    ('payment_method', ('payment__payment_method', 'status'), payment_method),
+    ('created_at', ('created_at',), lambda value: value.isoformat()),
+]
+
+PAYMENT_COLUMNS = [
+    ('id', ('id',), None),
+    ('booking_id', ('booking_id',), str),
+    ('stripe_payment_intent_id', ('stripe_payment_intent_id',), None),
+    ('user_name', ('booking__user__first_name', 'booking__user__last_name', 'booking__user__username'), _full_name),
+    ('club_name', ('booking__club__name',), None),
+    ('sport_name', ('booking__sport__name',), None),
+    ('booking_date', ('booking__date',), str),
+    ('amount', ('amount',), float),
+    ('currency', ('currency',), None),
+    ('status', ('status',), None),
+    ('payment_method', ('payment_method',), lambda value: value or None),
+    ('created_at', ('created_at',), lambda value: value.isoformat()),
+    ('completed_at', ('completed_at',), lambda value: value.isoformat() if value else None),
+]
+
+
+def _rows(queryset, columns):
+    """Yield one output dict per row, fetching EXPORT_CHUNK_SIZE rows at a time."""
+    lookups, slices, start = [], [], 0
+    for name, fields, convert in columns:
+        lookups.extend(fields)
+        slices.append((name, slice(start, start + len(fields)), convert))
+        start += len(fields)
+    for row in queryset.values_list(*lookups).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        record = {}
+        for name, part, convert in slices:
+            values = row[part]
+            if convert is None:
+                record[name] = values[0]
+            else:
+                record[name] = convert(*values)
+        yield record
+
+
+def booking_rows(params):
+    bookings = Booking.objects.filter(**booking_filters(params))
+    if params.get('q'):
+        bookings = bookings.filter(booking_search(params['q']))
+    return _rows(bookings.order_by('-created_at', '-id'), BOOKING_COLUMNS)
+
+
+def payment_rows(params):
+    payments = Payment.objects.filter(**booking_filters(params, prefix='booking__'))
+    if params.get('q'):
+        payments = payments.filter(booking_search(params['q'], prefix='booking__'))
+    return _rows(payments.order_by('-created_at', '-id'), PAYMENT_COLUMNS)
+
+
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """File-like object whose write() hands the encoded line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def encode(rows, columns, fmt):
+    """Yield `rows` as CSV (header first) or NDJSON lines."""
+    names = [name for name, _, _ in columns]
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(names)
+        for record in rows:
+            yield writer.writerow([_cell(record[name]) for name in names])
+    else:
+        for record in rows:
+            yield json.dumps(record) + '\n'
@@ -0,0 +1,188 @@
+"""
+Occupancy heatmaps: weekday x hour matrices per club and sport.
+
+Bookings are read as integer columns (reports.columnar.scan: the
+memory-mapped snapshot for settled days, brought up to date by
+columnar.sync(), the database for the rest) and
+folded into per-(sport, weekday, hour) accumulators with NumPy
+bincounts, chunk by chunk, so millions of bookings cost a few vector
+operations per chunk and memory bounded by the chunk size. A sport at a club is one
+court (slots are locked per club, sport and time), so capacity is the
+number of days in the range falling on each weekday times the part of
+each hour the club is open.
+
+    occupancy               booked hours / open court-hours
+    revenue_per_court_hour  booked revenue / open court-hours
+    cancellation_rate       cancelled or refunded / all bookings, by start hour
+"""
+import numpy as np
+
+from clubs.models import Sport
+from . import columnar
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+HOURS = 24
+CELLS = 7 * HOURS
+
+# Status classes
+BOOKED, CANCELLED, OTHER = 0, 1, 2
+BOOKED_STATUSES = ('confirmed', 'completed')
+CANCELLED_STATUSES = ('cancelled', 'refunded')
+
+CHUNK_ROWS = 100_000
+
+
+class Accumulator:
+    """Running per-(sport, weekday, hour) sums for `n_sports` densely numbered sports."""
+
+    def __init__(self, n_sports):
+        size = n_sports * CELLS
+        self.booked_hours = np.zeros(size)
+        self.revenue = np.zeros(size)
+        self.bookings = np.zeros(size)
+        self.cancelled = np.zeros(size)
+
+    def add(self, sport, weekday, start, end, status, amount):
+        """
+        Fold one chunk of bookings in. All arguments are equal-length
+        arrays: dense sport index, weekday 0-6, start/end minute of day,
+        status class and amount.
+        """
+        size = self.bookings.size
+        base = sport * CELLS + weekday * HOURS
+        duration = np.maximum(end - start, 1)
+
+        first_hour = start // 60
+        self.bookings += np.bincount(base + first_hour, minlength=size)
+        self.cancelled += np.bincount(base + first_hour, weights=(status == CANCELLED), minlength=size)
+
+        booked = status == BOOKED
+        if not booked.any():
+            return
+        base, start, end, duration, amount = base[booked], start[booked], end[booked], duration[booked], amount[booked]
+        first_hour = first_hour[booked]
+        # A booking spreads over every hour it touches, in proportion to the minutes it covers
+        span = int(((end - 1) // 60 - first_hour).max()) + 1
+        for offset in range(span):
+            hour = first_hour + offset
+            minutes = np.minimum(end, (hour + 1) * 60) - np.maximum(start, hour * 60)
+            covered = (minutes > 0) & (hour < HOURS)
+            cells = base[covered] + hour[covered]
+            share = minutes[covered] / 60
+            self.booked_hours += np.bincount(cells, weights=share, minlength=size)
+            self.revenue += np.bincount(cells, weights=amount[covered] * minutes[covered] / duration[covered],
+                                        minlength=size)
+
+
+def _status_class(status):
+    if status in BOOKED_STATUSES:
+        return BOOKED
+    if status in CANCELLED_STATUSES:
+        return CANCELLED
+    return OTHER
+
+
+def weekday_counts(start, end):
+    """How many days of [start, end] fall on each weekday (Monday first)."""
+    days = np.arange((end - start).days + 1)
+    return np.bincount((start.weekday() + days) % 7, minlength=7)
+
+
+def open_hours(opening, closing):
+    """Fraction of each hour of the day that a club open from `opening` to `closing` is open."""
+    hour_start = np.arange(HOURS) * 60
+    open_at = opening.hour * 60 + opening.minute
+    close_at = closing.hour * 60 + closing.minute
+    minutes = np.minimum(close_at, hour_start + 60) - np.maximum(open_at, hour_start)
+    return np.clip(minutes, 0, 60) / 60
+
+
+def _ratio(numerator, denominator):
+    """Elementwise ratio as nested lists, None where the denominator is zero."""
+    out = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return [[None if np.isnan(v) else round(float(v), 4) for v in row] for row in out]
+
+
+def _matrices(acc_slice, capacity):
+    booked_hours, revenue, bookings, cancelled = (a.reshape(7, HOURS) for a in acc_slice)
+    return {
+        'bookings': int(bookings.sum()),
+        'booked_hours': round(float(booked_hours.sum()), 2),
+        'revenue': round(float(revenue.sum()), 2),
+        'occupancy': _ratio(booked_hours, capacity),
+        'revenue_per_court_hour': _ratio(revenue, capacity),
+        'cancellation_rate': _ratio(cancelled, bookings),
+    }
+
+
+def build(start, end, club_id=None, sport_id=None):
+    """Heatmaps for every sport (and club) in scope over [start, end]."""
+    sports = Sport.objects.select_related('club').order_by('club_id', 'id')
+    if club_id:
+        sports = sports.filter(club_id=club_id)
+    if sport_id:
+        sports = sports.filter(id=sport_id)
+    sports = list(sports)
+    if not sports:
+        return {'start': str(start), 'end': str(end), 'weekdays': WEEKDAYS, 'hours': list(range(HOURS)),
+                'clubs': []}
+
+    # sport code -> dense index, as a lookup array so a whole column maps at once
+    store = columnar.sync()
+    codes = store.encode('sport', [s.id for s in sports])
+    dense = np.full(len(store.dictionaries['sport']), -1)
+    dense[codes] = np.arange(len(sports))
+
+    acc = Accumulator(len(sports))
+    for chunk in columnar.scan(start, end, ('sport', 'day', 'start_minute', 'end_minute', 'status', 'amount'),
+                               sport_ids=[s.id for s in sports], store=store):
+        status_class = np.array([_status_class(s) for s in store.dictionaries['status']] or [OTHER])
+        acc.add(
+            dense[chunk['sport']],
+            columnar.weekday(chunk['day'].astype(np.int64)),
+            chunk['start_minute'].astype(np.int64),
+            chunk['end_minute'].astype(np.int64),
+            status_class[chunk['status']],
+            chunk['amount'] / 100,
+        )
+
+    # Open court-hours per (sport, weekday, hour)
+    days = weekday_counts(start, end)
+    capacity = np.stack([
+        np.outer(days, open_hours(s.club.opening_time, s.club.closing_time)) for s in sports
+    ])
+
+    arrays = [a.reshape(len(sports), CELLS) for a in (acc.booked_hours, acc.revenue, acc.bookings, acc.cancelled)]
+    clubs = {}
+    for i, sport in enumerate(sports):
+        club = clubs.setdefault(sport.club_id, {
+            'club_id': sport.club_id, 'club_name': sport.club.name, 'members': [], 'sports': [],
+        })
+        club['members'].append(i)
+        club['sports'].append({
+            'sport_id': sport.id, 'sport_name': sport.name,
+            **_matrices([a[i] for a in arrays], capacity[i]),
+        })
+    for club in clubs.values():
+        members = club.pop('members')
+        club.update(_matrices([a[members].sum(axis=0) for a in arrays], capacity[members].sum(axis=0)))
+
+    return {
+        'start': str(start), 'end': str(end), 'weekdays': WEEKDAYS, 'hours': list(range(HOURS)),
+        'clubs': list(clubs.values()),
+    }
+
+
+def synthetic(n, n_sports=50, seed=0):
+    """Random booking columns shaped like production data, for benchmarking Accumulator.add()."""
+    rng = np.random.default_rng(seed)
+    start = rng.integers(6, 22, n) * 60
+    return (
+        rng.integers(0, n_sports, n),
+        rng.integers(0, 7, n),
+        start,
+        start + rng.choice([60, 90, 120], n),
+        rng.choice([BOOKED, CANCELLED, OTHER], n, p=[0.8, 0.15, 0.05]),
+        rng.choice([400.0, 500.0, 800.0], n),
+    )
@@ -0,0 +1,238 @@
+"""
+Report jobs: admins submit a report (a month, or a custom date range)
+and get a job back instead of waiting on the request thread. The job row
+is keyed by the report's parameters, so identical submissions, even
+concurrent ones, share one row and one computation; the worker
+(reports.tasks.build_report) stores the payload on it.
+
+A stored result is served as is while it is fresh. Results for a closed
+period (one that ended before the current month) are final: they are
+only recomputed after invalidate() marks them stale, which the rollup
+and ledger writers call with the dates of every booking or payment
+change they record, so a late refund or an admin edit to an old booking
+reaches the reports covering its day and nothing else. Other results are
+rebuilt on the next submission after REPORT_RESULT_MAX_AGE seconds. The
+previous result stays readable meanwhile. A job stuck pending or running
+for REPORT_JOB_TIMEOUT seconds (broker outage, dead worker) is queued
+again by the next submission.
+
+cached_report() serves the synchronous monthly report the same way:
+closed months are read from their stored result, only open ones are
+built on the request.
+"""
+import logging
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import builders, columnar
+from .models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+# Beyond this many distinct days invalidate() matches their whole span instead
+INVALIDATE_MAX_DAYS = 50
+
+
+def parse(data):
+    """(kind, params) from a submission; raises ValueError for anything invalid."""
+    kind = data.get('kind', 'monthly')
+    if kind == 'monthly':
+        try:
+            year, month = int(data['year']), int(data['month'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('month and year must be integers')
+        builders.month_bounds(year, month)
+        return kind, {'year': year, 'month': month}
+    if kind == 'range':
+        try:
+            start, end = date.fromisoformat(data['start']), date.fromisoformat(data['end'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('start and end must be dates (YYYY-MM-DD)')
+        if end < start:
+            raise ValueError('end must not be before start')
+        if (end - start).days >= settings.REPORT_MAX_RANGE_DAYS:
+            raise ValueError(f'A custom range covers at most {settings.REPORT_MAX_RANGE_DAYS} days')
+        return kind, {'start': str(start), 'end': str(end)}
+    raise ValueError('kind must be monthly or range')
+
+
+def report_key(kind, params):
+    return kind + ':' + ':'.join(f'{name}={params[name]}' for name in sorted(params))
+
+
+def bounds(kind, params):
+    if kind == 'monthly':
+        return builders.month_bounds(params['year'], params['month'])
+    return date.fromisoformat(params['start']), date.fromisoformat(params['end'])
+
+
+def is_closed(end):
+    """Whether a period ending on `end` is over: it ended before the current month began."""
+    return end < timezone.localdate().replace(day=1)
+
+
+def build(kind, params):
+    if kind == 'monthly':
+        return builders.monthly_report(params['year'], params['month'])
+    return builders.period_report(*bounds(kind, params))
+
+
+def _needs_run(job, now, force=False):
+    if job.status in ('failed', 'stale'):
+        return True
+    if job.status in ('pending', 'running'):
+        since = job.started_at if job.status == 'running' else job.queued_at
+        return since < now - timedelta(seconds=settings.REPORT_JOB_TIMEOUT)
+    if force:
+        return True
+    return not job.is_final and job.completed_at < now - timedelta(seconds=settings.REPORT_RESULT_MAX_AGE)
+
+
+def _kick(job_id):
+    try:
+        from .tasks import build_report
+        build_report.delay(job_id)
+    except Exception as e:
+        logger.warning(f"Could not queue report job {job_id}, next submission will retry: {e}")
+
+
+def submit(kind, params, requested_by=None, force=False):
+    """
+    The job for these parameters, queued for (re)computation if it has no
+    usable result, or (force) whatever its result unless a build is
+    already under way.
+    """
+    now = timezone.now()
+    start, end = bounds(kind, params)
+    with transaction.atomic():
+        job, created = ReportJob.objects.get_or_create(
+            key=report_key(kind, params),
+            defaults={'kind': kind, 'params': params, 'period_start': start, 'period_end': end,
+                      'requested_by': requested_by},
+        )
+        if not created:
+            job = ReportJob.objects.select_for_update().get(pk=job.pk)
+            if not _needs_run(job, now, force):
+                return job
+            job.status = 'pending'
+            job.queued_at = now
+            job.started_at = None
+            job.requested_by = requested_by
+            job.save(update_fields=['status', 'queued_at', 'started_at', 'requested_by'])
+        transaction.on_commit(lambda: _kick(job.pk))
+    return job
+
+
+def run(job_id):
+    """Compute a pending job's report and store it. Returns the job."""
+    with transaction.atomic():
+        job = ReportJob.objects.select_for_update().get(pk=job_id)
+        if job.status != 'pending':
+            return job
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=['status', 'started_at', 'attempts'])
+        version = job.version
+
+    try:
+        result = build(job.kind, job.params)
+    except Exception as e:
+        job.status = 'failed'
+        job.last_error = str(e)
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'last_error', 'completed_at'])
+        raise
+    return _store(job.pk, result, version)
+
+
+def _store(job_id, result, version):
+    """
+    Save a result computed from data read after the job's `version` was
+    read. If an invalidation has committed since then the result may
+    already be out of date: it is kept readable but stale, not final.
+
+    A version rather than a timestamp: invalidate() runs inside the
+    writer's transaction, so a wall-clock stamp can predate a build that
+    still reads the data from before the writer commits.
+    """
+    with transaction.atomic():
+        job = ReportJob.objects.select_for_update().get(pk=job_id)
+        changed = job.version != version
+        job.status = 'stale' if changed else 'succeeded'
+        job.result = result
+        job.is_final = not changed and is_closed(job.period_end)
+        job.last_error = ''
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'result', 'is_final', 'last_error', 'completed_at'])
+    return job
+
+
+def cached_report(kind, params):
+    """
+    The report for (kind, params): the stored result when the period is
+    closed and nothing in it changed since, otherwise built now (and, for
+    a closed period, stored for the next request).
+    """
+    start, end = bounds(kind, params)
+    if not is_closed(end):
+        return build(kind, params)
+    key = report_key(kind, params)
+    stored = ReportJob.objects.filter(key=key, is_final=True).values_list('result', flat=True).first()
+    if stored is not None:
+        return stored
+
+    # The row exists before the build starts so that invalidate() can flag it meanwhile
+    job, _ = ReportJob.objects.get_or_create(key=key, defaults={
+        'kind': kind, 'params': params, 'period_start': start, 'period_end': end, 'status': 'stale',
+    })
+    result = build(kind, params)
+    _store(job.pk, result, job.version)
+    return result
+
+
+def invalidate(days):
+    """
+    Mark the stored reports of closed periods containing any of `days`
+    stale, and the columnar snapshot's months containing them changed.
+    Days in the current month (or later) are skipped for reports: no
+    report covering them is final. Returns the number of reports
+    invalidated.
+    """
+    days = set(days)
+    columnar.mark_changed(days)
+    month_start = timezone.localdate().replace(day=1)
+    days = sorted(day for day in days if day < month_start)
+    if not days:
+        return 0
+    if len(days) > INVALIDATE_MAX_DAYS:
+        return invalidate_range(days[0], days[-1])
+    return _invalidate(_covering(days))
+
+
+def invalidate_range(first=None, last=None):
+    """invalidate() for every day of [first, last] (open-ended when omitted)."""
+    columnar.mark_changed_range(first, last)
+    last = min(last or date.max, timezone.localdate().replace(day=1) - timedelta(days=1))
+    first = first or date.min
+    if last < first:
+        return 0
+    return _invalidate(Q(period_start__lte=last, period_end__gte=first))
+
+
+def _covering(days):
+    query = Q()
+    for day in days:
+        query |= Q(period_start__lte=day, period_end__gte=day)
+    return query
+
+
+def _invalidate(covering):
+    jobs = ReportJob.objects.filter(covering)
+    # Builds in progress see the new version when they store their result
+    jobs.update(invalidated_at=timezone.now(), version=F('version') + 1)
+    return jobs.filter(status='succeeded').update(status='stale', is_final=False)
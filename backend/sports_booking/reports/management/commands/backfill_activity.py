@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from bookings.models import Booking
+from clubs.models import Club
+from reports.activity import booking_event, club_event, AMOUNT_EVENTS, BOOKING_EVENTS
+from reports.models import ActivityEvent
+
+
+class Command(BaseCommand):
+    help = 'Seed the admin activity feed from the latest bookings and clubs (only when the feed is empty)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=200,
+            help='Most recently updated bookings to seed from (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        if ActivityEvent.objects.exists():
+            self.stdout.write(self.style.WARNING('Activity feed already has events, nothing to do'))
+            return
+
+        bookings = Booking.objects.filter(status__in=BOOKING_EVENTS).select_related(
+            'user', 'club', 'sport'
+        ).order_by('-updated_at')[:options['limit']]
+        events = [
+            booking_event(b, b.status, b.amount if b.status in AMOUNT_EVENTS else None, occurred_at=b.updated_at)
+            for b in bookings
+        ]
+        events += [club_event(club) for club in Club.objects.order_by('-created_at')[:options['limit']]]
+        ActivityEvent.objects.bulk_create(sorted(events, key=lambda e: e.occurred_at), batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(f"Seeded {len(events)} activity events"))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reports.heatmap import CHUNK_ROWS, Accumulator, synthetic
+
+
+class Command(BaseCommand):
+    help = 'Time the heatmap aggregation over synthetic booking columns (no database involved)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=3_000_000, help='Bookings to aggregate (default: 3,000,000)')
+        parser.add_argument('--sports', type=int, default=50, help='Distinct club sports (default: 50)')
+
+    def handle(self, *args, **options):
+        rows, n_sports = options['rows'], options['sports']
+        columns = synthetic(rows, n_sports)
+
+        acc = Accumulator(n_sports)
+        started = time.perf_counter()
+        for offset in range(0, rows, CHUNK_ROWS):
+            acc.add(*(column[offset:offset + CHUNK_ROWS] for column in columns))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Aggregated {rows:,} bookings over {n_sports} sports in {elapsed:.2f}s "
+            f"({rows / elapsed:,.0f} rows/s, {acc.booked_hours.sum():,.0f} booked hours)"
+        ))
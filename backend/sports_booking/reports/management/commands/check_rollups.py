@@ -0,0 +1,30 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reports.rollups import check, refresh
+
+
+class Command(BaseCommand):
+    help = 'Compare DailyRollup rows with bookings and payments over a date range'
+
+    def add_arguments(self, parser):
+        today = timezone.now().date()
+        parser.add_argument('--start', type=date.fromisoformat, default=today - timedelta(days=30),
+                            help='First date (YYYY-MM-DD); default: 30 days ago')
+        parser.add_argument('--end', type=date.fromisoformat, default=today + timedelta(days=30),
+                            help='Last date (YYYY-MM-DD); default: 30 days ahead')
+        parser.add_argument('--fix', action='store_true', help='Recompute every rollup that disagrees')
+
+    def handle(self, *args, **options):
+        mismatches = check(options['start'], options['end'])
+        for (day, club_id, sport_id), metric, stored, expected in mismatches:
+            self.stdout.write(f"{day} club={club_id} sport={sport_id} {metric}: stored {stored}, expected {expected}")
+
+        keys = {key for key, *_ in mismatches}
+        if options['fix'] and keys:
+            refresh(keys)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(keys)} rollup(s) inconsistent" + (', recomputed' if options['fix'] and keys else '')
+        ))
@@ -0,0 +1,17 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from reports.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild DailyRollup rows from bookings and payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, default=None, help='First date (YYYY-MM-DD); default: all')
+        parser.add_argument('--end', type=date.fromisoformat, default=None, help='Last date (YYYY-MM-DD); default: all')
+
+    def handle(self, *args, **options):
+        rows = rebuild(options['start'], options['end'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup rows"))
@@ -0,0 +1,78 @@
+import shutil
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from reports.columnar import COLUMNS, Store, day_number, sync, totals
+
+
+class Command(BaseCommand):
+    help = 'Create or update the columnar analytics snapshot, rebuild it, or benchmark a scan over it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--through', type=date.fromisoformat, default=None,
+                            help='Last day to snapshot (YYYY-MM-DD); default: the last settled day')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Delete the snapshot and copy every settled day again')
+        parser.add_argument('--benchmark', type=int, metavar='YEARS', default=0,
+                            help='Instead: write YEARS of synthetic bookings to a scratch store and time a full scan')
+        parser.add_argument('--per-day', type=int, default=3000,
+                            help='Synthetic bookings per day for --benchmark (default: 3000)')
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self.benchmark(options['benchmark'], options['per_day'])
+
+        store = Store()
+        if options['rebuild'] and store.root.exists():
+            shutil.rmtree(store.root)
+        store = sync(create=True, through=options['through'])
+        self.stdout.write(self.style.SUCCESS(f"Snapshot covers everything through {store.through}"))
+
+    def benchmark(self, years, per_day):
+        root = Path(Store().root).with_name('analytics_store_benchmark')
+        shutil.rmtree(root, ignore_errors=True)
+        store = Store(root)
+        store.dictionaries = {
+            'club': list(range(1, 21)), 'sport': list(range(1, 101)),
+            'status': ['confirmed', 'completed', 'cancelled', 'refunded', 'pending'],
+            'payment_status': ['', 'completed', 'refunded', 'failed'],
+        }
+        store.save_dictionaries()
+
+        rng = np.random.default_rng(0)
+        end = date.today().replace(day=1)
+        start = end.replace(year=end.year - years)
+        rows = 0
+        for year in range(start.year, end.year + 1):
+            for month in range(1, 13):
+                first = date(year, month, 1)
+                if not start <= first < end:
+                    continue
+                days = np.arange(day_number(first), day_number(first) + 28).repeat(per_day)
+                n = len(days)
+                sport = rng.integers(0, 100, n)
+                status = rng.choice(5, n, p=[0.3, 0.45, 0.12, 0.08, 0.05])
+                minute = rng.integers(6, 22, n) * 60
+                store.write_month(year, month, {
+                    'day': days, 'club': sport // 5, 'sport': sport, 'status': status,
+                    'payment_status': np.select([status < 2, status == 3], [1, 2], 0),
+                    'start_minute': minute, 'end_minute': minute + 60,
+                    'amount': np.full(n, 50000), 'paid': np.where(status == 4, 0, 50000),
+                })
+                rows += n
+        store.set_coverage(start, end)
+
+        started = time.perf_counter()
+        by_club = totals(start, end, 'club', store=store)
+        elapsed = time.perf_counter() - started
+        shutil.rmtree(root)
+
+        bookings = sum(sum(c['bookings'].values()) for c in by_club.values())
+        size = rows * sum(np.dtype(t).itemsize for t in COLUMNS.values()) / 1e6
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {bookings:,} bookings ({years} years, ~{size:,.0f} MB of columns) in {elapsed:.2f}s"
+        ))
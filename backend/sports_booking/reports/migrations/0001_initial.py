@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('clubs', '0006_alter_club_phone_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('pending', models.IntegerField(default=0)),
+                ('confirmed', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('refunded', models.IntegerField(default=0)),
+                ('booked_hours', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('gross', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('refunds', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('club', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='clubs.club')),
+                ('sport', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='clubs.sport')),
+            ],
+            options={
+                'db_table': 'daily_rollups',
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['club', 'date'], name='daily_rollu_club_id_576750_idx')],
+                'unique_together': {('date', 'club', 'sport')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_booking_bookings_created_4f33ac_idx_and_more'),
+        ('clubs', '0006_alter_club_phone_number'),
+        ('reports', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('pending', 'Booking initiated'), ('confirmed', 'Booking confirmed'), ('completed', 'Booking completed'), ('cancelled', 'Booking cancelled'), ('refunded', 'Booking refunded'), ('payment_failed', 'Payment failed'), ('refund_issued', 'Refund issued'), ('club_added', 'Club added'), ('sport_added', 'Sport added')], max_length=20)),
+                ('message', models.CharField(max_length=500)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='bookings.booking')),
+                ('club', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='clubs.club')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'activity_events',
+                'ordering': ['-occurred_at', '-id'],
+                'indexes': [models.Index(fields=['occurred_at', 'id'], name='activity_ev_occurre_5d76d7_idx'), models.Index(fields=['type', 'occurred_at'], name='activity_ev_type_02e07b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:18
+
+from calendar import monthrange
+from datetime import date
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def set_periods(apps, schema_editor):
+    ReportJob = apps.get_model('reports', 'ReportJob')
+    for job in ReportJob.objects.all():
+        if job.kind == 'monthly':
+            year, month = job.params['year'], job.params['month']
+            job.period_start, job.period_end = date(year, month, 1), date(year, month, monthrange(year, month)[1])
+        else:
+            job.period_start, job.period_end = date.fromisoformat(job.params['start']), date.fromisoformat(job.params['end'])
+        job.save(update_fields=['period_start', 'period_end'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_reportjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='invalidated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reportjob',
+            name='period_end',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='reportjob',
+            name='period_start',
+            field=models.DateField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='reportjob',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('stale', 'Stale'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='reportjob',
+            index=models.Index(fields=['period_start', 'period_end'], name='report_jobs_period__440591_idx'),
+        ),
+        migrations.RunPython(set_periods, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_reportjob_period'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'snapshot_changes',
+                'indexes': [models.Index(fields=['month'], name='snapshot_ch_month_26939d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0005_snapshotchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
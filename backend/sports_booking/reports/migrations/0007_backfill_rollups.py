@@ -0,0 +1,57 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db import migrations
+
+HOURS_STATUSES = ('confirmed', 'completed')
+PAID_STATUSES = ('completed', 'refunded')
+
+
+def _hours(start, end):
+    seconds = (datetime.combine(date.min, end) - datetime.combine(date.min, start)).total_seconds()
+    return Decimal(max(seconds, 0) / 3600).quantize(Decimal('0.01'))
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Compute the daily rollups of every booking made before they existed
+    (what the rebuild_rollups command does), and let reports stored
+    meanwhile be built again from them.
+    """
+    Booking = apps.get_model('bookings', 'Booking')
+    DailyRollup = apps.get_model('reports', 'DailyRollup')
+    ReportJob = apps.get_model('reports', 'ReportJob')
+
+    totals = defaultdict(Counter)
+    for day, club_id, sport_id, status, start, end, payment_status, paid in Booking.objects.values_list(
+        'date', 'club_id', 'sport_id', 'status', 'start_time', 'end_time', 'payment__status', 'payment__amount',
+    ).order_by().iterator():
+        row = totals[(day, club_id, sport_id)]
+        row[status] += 1
+        if status in HOURS_STATUSES:
+            row['booked_hours'] += _hours(start, end)
+        if payment_status in PAID_STATUSES:
+            row['gross'] += paid
+        if payment_status == 'refunded':
+            row['refunds'] += paid
+
+    DailyRollup.objects.all().delete()
+    DailyRollup.objects.bulk_create([
+        DailyRollup(date=day, club_id=club_id, sport_id=sport_id, **metrics)
+        for (day, club_id, sport_id), metrics in totals.items()
+    ], batch_size=1000)
+    ReportJob.objects.filter(status='succeeded').update(status='stale', is_final=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_booking_bookings_created_4f33ac_idx_and_more'),
+        ('payments', '0007_backfill_ledger'),
+        ('reports', '0006_reportjob_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,162 @@
+from django.db import models
+from django.utils import timezone
+
+
+class DailyRollup(models.Model):
+    """
+    Bookings and money per (date, club, sport), kept current by
+    reports.signals as bookings and payments change (see reports.rollups).
+    The status columns count bookings in that status; booked_hours covers
+    confirmed and completed bookings; gross is every charged payment and
+    refunds the part of it since refunded, so net = gross - refunds.
+    """
+    date = models.DateField()
+    club = models.ForeignKey('clubs.Club', on_delete=models.CASCADE, related_name='daily_rollups')
+    sport = models.ForeignKey('clubs.Sport', on_delete=models.CASCADE, related_name='daily_rollups')
+    pending = models.IntegerField(default=0)
+    confirmed = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    refunded = models.IntegerField(default=0)
+    booked_hours = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    gross = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refunds = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'daily_rollups'
+        ordering = ['date']
+        unique_together = ['date', 'club', 'sport']
+        indexes = [
+            models.Index(fields=['club', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} club {self.club_id} sport {self.sport_id}"
+
+    @property
+    def net(self):
+        return self.gross - self.refunds
+
+
+class ActivityEvent(models.Model):
+    """
+    Append-only feed of booking, payment, club and sport changes for the
+    admin dashboard, written by reports.signals (see reports.activity).
+    The message is rendered when the event happens, so reading the feed
+    is one indexed query with no joins, and renamed or deleted rows don't
+    rewrite history.
+    """
+    TYPE_CHOICES = [
+        ('pending', 'Booking initiated'),
+        ('confirmed', 'Booking confirmed'),
+        ('completed', 'Booking completed'),
+        ('cancelled', 'Booking cancelled'),
+        ('refunded', 'Booking refunded'),
+        ('payment_failed', 'Payment failed'),
+        ('refund_issued', 'Refund issued'),
+        ('club_added', 'Club added'),
+        ('sport_added', 'Sport added'),
+    ]
+
+    type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    message = models.CharField(max_length=500)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    user = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    club = models.ForeignKey('clubs.Club', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    booking = models.ForeignKey('bookings.Booking', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    occurred_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'activity_events'
+        ordering = ['-occurred_at', '-id']
+        indexes = [
+            models.Index(fields=['occurred_at', 'id']),
+            models.Index(fields=['type', 'occurred_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.type}: {self.message}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Activity events are append-only')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Activity events are append-only')
+
+
+class ReportJob(models.Model):
+    """
+    One report per distinct parameter set (`key`), computed by
+    reports.tasks.build_report and stored in `result`. Submitting the same
+    parameters again returns this row: while it is pending or running the
+    caller waits on the same job, and once built the stored result is
+    served until it goes stale. Reports of closed periods (`is_final`)
+    only go stale when a change is recorded against a booking dated
+    inside [period_start, period_end] (reports.jobs.invalidate).
+    """
+    KIND_CHOICES = [
+        ('monthly', 'Monthly'),
+        ('range', 'Custom range'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('stale', 'Stale'),
+        ('failed', 'Failed'),
+    ]
+
+    key = models.CharField(max_length=255, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict)
+    period_start = models.DateField(null=True)
+    period_end = models.DateField(null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    is_final = models.BooleanField(default=False)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    requested_by = models.ForeignKey(
+        'accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    queued_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Last change recorded inside the period (for display)
+    invalidated_at = models.DateTimeField(null=True, blank=True)
+    # Bumped by every invalidation; a result built from an older version is not final
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'report_jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['period_start', 'period_end']),
+        ]
+
+    def __str__(self):
+        return f"{self.key} - {self.status}"
+
+
+class SnapshotChange(models.Model):
+    """
+    A change recorded against a booking in a month the columnar analytics
+    snapshot may already hold (reports.columnar). One row per change, so
+    columnar.sync() can delete exactly the marks it has handled after
+    copying the month again.
+    """
+    month = models.DateField()  # first day of the month
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'snapshot_changes'
+        indexes = [
+            models.Index(fields=['month']),
+        ]
+
+    def __str__(self):
+        return f"Snapshot change in {self.month:%Y-%m}"
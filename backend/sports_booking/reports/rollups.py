@@ -0,0 +1,184 @@
+"""
+DailyRollup maintenance.
+
+A booking contributes one count to its status column and, while it holds
+the slot, its hours; its payment contributes to gross/refunds. Both are
+computed by the same two functions for the incremental path (signals on
+the shared common.tracking trackers apply the difference between a row's
+old and new contribution with F() increments) and for the recompute path
+(refresh/rebuild/check read the base tables), so the two can never
+disagree about what a row means.
+
+queryset.update() skips signals: wrap bulk status changes in
+`with refreshing(queryset):` so the affected rollup keys (and the
+bookings' users' counters, accounts.counters) are recomputed.
+
+Every write here also invalidates the stored reports of closed periods
+containing the dates it touched (reports.jobs.invalidate).
+"""
+from contextlib import contextmanager
+from datetime import date as date_cls, datetime
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+
+from accounts import counters
+from bookings.models import Booking
+from common.tracking import add, new_deltas
+from . import jobs
+from .models import DailyRollup
+
+STATUSES = [status for status, _ in Booking.STATUS_CHOICES]
+HOURS_STATUSES = ('confirmed', 'completed')
+PAID_STATUSES = ('completed', 'refunded')
+METRICS = STATUSES + ['booked_hours', 'gross', 'refunds']
+
+# Fields reports.signals needs the before/after of
+BOOKING_STATE_FIELDS = ('date', 'club_id', 'sport_id', 'status', 'start_time', 'end_time')
+PAYMENT_STATE_FIELDS = ('status', 'amount')
+
+KEY_CHUNK = 200
+
+
+def _hours(start, end):
+    seconds = (datetime.combine(date_cls.min, end) - datetime.combine(date_cls.min, start)).total_seconds()
+    return Decimal(max(seconds, 0) / 3600).quantize(Decimal('0.01'))
+
+
+def booking_key(booking_state):
+    return booking_state[:3]
+
+
+def booking_part(booking_state):
+    _, _, _, status, start, end = booking_state
+    part = {status: 1}
+    if status in HOURS_STATUSES:
+        part['booked_hours'] = _hours(start, end)
+    return part
+
+
+def payment_part(payment_state):
+    status, amount = payment_state
+    part = {}
+    if status in PAID_STATUSES:
+        part['gross'] = amount
+    if status == 'refunded':
+        part['refunds'] = amount
+    return part
+
+
+def apply(deltas):
+    """Add per-key metric deltas to the rollup rows, creating rows as needed."""
+    deltas = {
+        key: {metric: value for metric, value in metrics.items() if value}
+        for key, metrics in deltas.items()
+    }
+    deltas = {key: metrics for key, metrics in deltas.items() if metrics}
+    if not deltas:
+        return
+    DailyRollup.objects.bulk_create([
+        DailyRollup(date=day, club_id=club_id, sport_id=sport_id)
+        for day, club_id, sport_id in deltas
+    ], ignore_conflicts=True)
+    for (day, club_id, sport_id), metrics in deltas.items():
+        DailyRollup.objects.filter(date=day, club_id=club_id, sport_id=sport_id).update(**{
+            metric: F(metric) + value for metric, value in metrics.items()
+        })
+    jobs.invalidate(day for day, _, _ in deltas)
+
+
+# --------------------------------------------------------------------------
+# Recomputing from the base tables
+# --------------------------------------------------------------------------
+def compute(bookings):
+    """{key: {metric: value}} for a Booking queryset, payments joined once."""
+    totals = new_deltas()
+    for row in bookings.values_list(
+        *BOOKING_STATE_FIELDS, 'payment__status', 'payment__amount'
+    ).order_by().iterator():
+        key = booking_key(row)
+        add(totals, key, booking_part(row[:6]))
+        if row[6] is not None:
+            add(totals, key, payment_part(row[6:]))
+    return totals
+
+
+def _rows(totals):
+    return [
+        DailyRollup(date=day, club_id=club_id, sport_id=sport_id, **metrics)
+        for (day, club_id, sport_id), metrics in totals.items()
+    ]
+
+
+def _key_filter(keys):
+    return reduce(or_, (
+        Q(date=day, club_id=club_id, sport_id=sport_id) for day, club_id, sport_id in keys
+    ))
+
+
+def refresh(keys):
+    """Recompute the given (date, club_id, sport_id) rollups exactly."""
+    keys = list(set(keys))
+    for i in range(0, len(keys), KEY_CHUNK):
+        chunk = keys[i:i + KEY_CHUNK]
+        totals = compute(Booking.objects.filter(_key_filter(chunk)))
+        with transaction.atomic():
+            DailyRollup.objects.filter(_key_filter(chunk)).delete()
+            DailyRollup.objects.bulk_create(_rows(totals))
+    jobs.invalidate(day for day, _, _ in keys)
+
+
+@contextmanager
+def refreshing(bookings):
+    """Recompute the rollups and user counters of `bookings` after the block (for queryset.update() callers)."""
+    keys = set(bookings.values_list('date', 'club_id', 'sport_id').order_by().distinct())
+    user_ids = counters.users_of(bookings)
+    yield
+    if keys:
+        refresh(keys)
+    if user_ids:
+        counters.refresh(user_ids)
+
+
+@transaction.atomic
+def rebuild(start=None, end=None):
+    """Replace every rollup in [start, end] (all dates when omitted). Returns the number of rows."""
+    bookings, rollups = Booking.objects.all(), DailyRollup.objects.all()
+    if start:
+        bookings, rollups = bookings.filter(date__gte=start), rollups.filter(date__gte=start)
+    if end:
+        bookings, rollups = bookings.filter(date__lte=end), rollups.filter(date__lte=end)
+    rows = _rows(compute(bookings))
+    rollups.delete()
+    DailyRollup.objects.bulk_create(rows, batch_size=1000)
+    jobs.invalidate_range(start, end)
+    return len(rows)
+
+
+def check(start, end):
+    """[(key, metric, stored, expected)] wherever the rollups disagree with the base tables."""
+    expected = compute(Booking.objects.filter(date__gte=start, date__lte=end))
+    stored = {
+        (row['date'], row['club_id'], row['sport_id']): row
+        for row in DailyRollup.objects.filter(date__gte=start, date__lte=end).values('date', 'club_id', 'sport_id', *METRICS)
+    }
+    mismatches = []
+    for key in set(expected) | set(stored):
+        for metric in METRICS:
+            have = stored.get(key, {}).get(metric, 0)
+            want = expected.get(key, {}).get(metric, 0)
+            if have != want:
+                mismatches.append((key, metric, have, want))
+    return sorted(mismatches)
+
+
+def summary(start, end, *group_by, **filters):
+    """Summed rollup metrics over [start, end], grouped by any of date/club_id/sport_id."""
+    rows = DailyRollup.objects.filter(date__gte=start, date__lte=end, **filters)
+    if group_by:
+        rows = rows.values(*group_by).order_by(*group_by)
+        return list(rows.annotate(**{metric: Sum(metric) for metric in METRICS}))
+    return rows.aggregate(**{metric: Sum(metric) for metric in METRICS})
@@ -0,0 +1,96 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from bookings.models import Booking
+from clubs.models import Club, Sport
+from common.tracking import add, new_deltas, pick, state, tracker
+from payments.models import Payment
+from . import activity, rollups
+
+bookings = tracker(Booking, rollups.BOOKING_STATE_FIELDS)
+payments = tracker(Payment, rollups.PAYMENT_STATE_FIELDS)
+
+
+def _booking_key_for(payment):
+    booking = payment.loaded_booking()
+    booking_state = state(booking, rollups.BOOKING_STATE_FIELDS) if booking else None
+    if booking_state:
+        return rollups.booking_key(booking_state)
+    return Booking.objects.filter(pk=payment.booking_id).values_list('date', 'club_id', 'sport_id').first()
+
+
+def booking_saved(instance, old, new, created):
+    old, new = pick(old, rollups.BOOKING_STATE_FIELDS), pick(new, rollups.BOOKING_STATE_FIELDS)
+    if new is None or (old is None and not created):
+        # Loaded with deferred fields: no reliable before/after, recompute
+        key = Booking.objects.filter(pk=instance.pk).values_list('date', 'club_id', 'sport_id').first()
+        rollups.refresh([key] + ([rollups.booking_key(old)] if old else []))
+    elif old != new:
+        deltas = new_deltas()
+        if old is not None:
+            add(deltas, rollups.booking_key(old), rollups.booking_part(old), -1)
+        add(deltas, rollups.booking_key(new), rollups.booking_part(new))
+        if old is not None and rollups.booking_key(old) != rollups.booking_key(new):
+            # Rescheduled: the payment's money moves with the booking
+            payment = Payment.objects.filter(booking_id=instance.pk).values_list('status', 'amount').first()
+            if payment:
+                part = rollups.payment_part(payment)
+                add(deltas, rollups.booking_key(old), part, -1)
+                add(deltas, rollups.booking_key(new), part)
+        rollups.apply(deltas)
+    if created or old is not None:
+        activity.booking_changed(instance, old[3] if old else None, instance.__dict__.get('status'))
+
+
+def booking_deleted(instance, old):
+    old = pick(old, rollups.BOOKING_STATE_FIELDS)
+    if old is not None:
+        deltas = new_deltas()
+        add(deltas, rollups.booking_key(old), rollups.booking_part(old), -1)
+        rollups.apply(deltas)
+
+
+def payment_saved(instance, old, new, created):
+    old, new = pick(old, rollups.PAYMENT_STATE_FIELDS), pick(new, rollups.PAYMENT_STATE_FIELDS)
+    if new is None or (old is None and not created):
+        key = _booking_key_for(instance)
+        if key:
+            rollups.refresh([key])
+        return
+    old_part = rollups.payment_part(old) if old else {}
+    new_part = rollups.payment_part(new)
+    if old_part != new_part:
+        key = _booking_key_for(instance)
+        if key:
+            deltas = new_deltas()
+            add(deltas, key, old_part, -1)
+            add(deltas, key, new_part)
+            rollups.apply(deltas)
+    activity.payment_changed(instance, old[0] if old else None, new[0])
+
+
+def payment_deleted(instance, old):
+    old = pick(old, rollups.PAYMENT_STATE_FIELDS)
+    key = _booking_key_for(instance) if old else None
+    if key:
+        deltas = new_deltas()
+        add(deltas, key, rollups.payment_part(old), -1)
+        rollups.apply(deltas)
+
+
+bookings.on_save.append(booking_saved)
+bookings.on_delete.append(booking_deleted)
+payments.on_save.append(payment_saved)
+payments.on_delete.append(payment_deleted)
+
+
+@receiver(post_save, sender=Club)
+def club_saved(sender, instance, created, **kwargs):
+    if created:
+        activity.club_event(instance).save()
+
+
+@receiver(post_save, sender=Sport)
+def sport_saved(sender, instance, created, **kwargs):
+    if created:
+        activity.sport_event(instance).save()
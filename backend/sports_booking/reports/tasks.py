@@ -0,0 +1,47 @@
+from celery import shared_task
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+import logging
+
+from accounts import counters
+from .rollups import check, refresh
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def verify_daily_rollups():
+    """
+    Nightly consistency check of recent and upcoming rollups, and of every
+    user's booking counters (accounts.counters), against the base tables;
+    anything that drifted (a missed queryset.update(), a manual SQL fix)
+    is recomputed and logged.
+    """
+    try:
+        today = timezone.now().date()
+        start = today - timedelta(days=getattr(settings, 'ROLLUP_VERIFY_DAYS_BACK', 7))
+        end = today + timedelta(days=getattr(settings, 'ROLLUP_VERIFY_DAYS_AHEAD', 30))
+        keys = {key for key, *_ in check(start, end)}
+        if keys:
+            refresh(keys)
+            logger.warning(f"Recomputed {len(keys)} drifted rollups between {start} and {end}")
+        users = counters.rebuild()
+        if users:
+            logger.warning(f"Recomputed drifted booking counters of {users} users")
+        return f"Verified rollups {start}..{end}, {len(keys)} recomputed; {users} users' counters fixed"
+    except Exception as e:
+        logger.error(f"Rollup verification failed: {e}")
+        return f"Failed: {str(e)}"
+
+
+@shared_task
+def build_report(job_id):
+    """Compute and store one submitted report job (reports.jobs)."""
+    from .jobs import run
+    try:
+        job = run(job_id)
+        return f"Report job {job_id}: {job.status}"
+    except Exception as e:
+        logger.error(f"Report job {job_id} failed: {e}")
+        return f"Failed: {str(e)}"
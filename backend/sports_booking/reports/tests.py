@@ -0,0 +1,461 @@
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from bookings.models import Booking
+from clubs.models import Club, Sport
+from payments.models import Payment
+
+from .models import ActivityEvent, DailyRollup, ReportJob, SnapshotChange
+from .rollups import check, rebuild, refreshing, summary
+
+
+class DailyRollupTests(TestCase):
+    def setUp(self):
+        self.club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        self.sport = Sport.objects.create(name='Badminton', club=self.club, price_per_hour=500)
+        self.user = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        self.day = timezone.now().date() + timedelta(days=2)
+
+    def book(self, hour, **fields):
+        return Booking.objects.create(
+            user=self.user, club=self.club, sport=self.sport, date=self.day,
+            start_time=time(hour), end_time=time(hour + 1), amount=500, **fields,
+        )
+
+    def assertConsistent(self):
+        self.assertEqual(check(self.day - timedelta(days=5), self.day + timedelta(days=5)), [])
+
+    def test_state_changes_update_the_rollup_incrementally(self):
+        booking = self.book(10, status='pending')
+        payment = Payment.objects.create(booking=booking, stripe_payment_intent_id='pi_1', amount=500)
+        payment.mark_completed()
+        booking.status = 'confirmed'
+        booking.save()
+        self.book(12, status='pending')
+
+        row = DailyRollup.objects.get(date=self.day, club=self.club, sport=self.sport)
+        self.assertEqual((row.pending, row.confirmed, row.booked_hours, row.gross, row.refunds), (1, 1, 1, 500, 0))
+
+        payment.mark_refunded()
+        booking.status = 'refunded'
+        booking.save()
+        row.refresh_from_db()
+        self.assertEqual((row.confirmed, row.refunded, row.booked_hours, row.net), (0, 1, 0, 0))
+        self.assertConsistent()
+
+    def test_reschedule_moves_bookings_and_money(self):
+        booking = self.book(10, status='confirmed')
+        Payment.objects.create(booking=booking, stripe_payment_intent_id='pi_1', amount=500, status='completed')
+        booking.date = self.day + timedelta(days=1)
+        booking.save()
+
+        self.assertEqual(summary(self.day, self.day)['gross'], 0)
+        self.assertEqual(summary(booking.date, booking.date)['gross'], 500)
+        self.assertConsistent()
+
+        booking.delete()
+        self.assertEqual(summary(booking.date, booking.date)['confirmed'], 0)
+        self.assertConsistent()
+
+    def test_bulk_updates_are_refreshed_and_rebuild_matches(self):
+        for hour in (8, 9, 10):
+            self.book(hour, status='pending')
+        pending = Booking.objects.filter(status='pending')
+        with refreshing(pending):
+            pending.update(status='cancelled')
+        self.assertEqual(summary(self.day, self.day)['cancelled'], 3)
+        self.assertConsistent()
+
+        Booking.objects.update(status='confirmed')  # bypasses signals and refreshing
+        self.assertNotEqual(check(self.day, self.day), [])
+        rebuild()
+        self.assertEqual(summary(self.day, self.day, 'sport_id')[0]['booked_hours'], 3)
+        self.assertConsistent()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ActivityFeedTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', mobile_number='9000000000',
+            password='AdminPass123', is_staff=True,
+        )
+        self.user = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001',
+            password='UserPass123', first_name='Asha',
+        )
+        self.club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        self.sport = Sport.objects.create(name='Tennis', club=self.club, price_per_hour=500)
+        self.client.force_authenticate(self.admin)
+
+    def book(self):
+        booking = Booking.objects.create(
+            user=self.user, club=self.club, sport=self.sport, date=timezone.now().date(),
+            start_time=time(10), end_time=time(11), amount=500,
+        )
+        payment = Payment.objects.create(booking=booking, stripe_payment_intent_id=f'pi_{booking.pk}', amount=500)
+        payment.mark_completed()
+        booking.status = 'confirmed'
+        booking.save()
+        return booking, payment
+
+    def test_state_changes_are_recorded(self):
+        booking, payment = self.book()
+        payment.mark_refunded()
+        booking.status = 'refunded'
+        booking.save()
+        booking.save()  # no transition, no event
+        self.assertEqual(
+            list(ActivityEvent.objects.order_by('id').values_list('type', flat=True)),
+            ['club_added', 'sport_added', 'pending', 'confirmed', 'refund_issued', 'refunded'],
+        )
+        event = ActivityEvent.objects.get(type='confirmed')
+        self.assertEqual((event.message, event.amount), ('Asha booked Tennis at Arena', 500))
+        with self.assertRaises(ValueError):
+            event.save()
+
+    def test_feed_pages_back_and_tails(self):
+        self.book()
+        first = self.client.get('/api/auth/admin/activity/', {'page_size': 3}).data
+        self.assertEqual([e['type'] for e in first['results']], ['confirmed', 'pending', 'sport_added'])
+        older = self.client.get('/api/auth/admin/activity/', {'page_size': 3, 'cursor': first['next_cursor']}).data
+        self.assertEqual([e['type'] for e in older['results']], ['club_added'])
+
+        since = first['latest_cursor']
+        self.assertEqual(self.client.get('/api/auth/admin/activity/', {'since': since}).data['results'], [])
+        self.book()
+        with self.assertNumQueries(1):
+            tail = self.client.get('/api/auth/admin/activity/', {'since': since}).data
+        self.assertEqual([e['type'] for e in tail['results']], ['pending', 'confirmed'])
+
+    def test_tail_reads_a_burst_page_by_page(self):
+        since = self.client.get('/api/auth/admin/activity/').data['latest_cursor']
+        self.book()
+        self.book()
+        seen = []
+        for _ in range(3):
+            tail = self.client.get('/api/auth/admin/activity/', {'since': since, 'page_size': 3}).data
+            seen += [e['type'] for e in tail['results']]
+            since = tail['latest_cursor']
+        self.assertEqual(seen, ['pending', 'confirmed', 'pending', 'confirmed'])
+
+    def test_tail_sees_an_event_stamped_before_the_cursor(self):
+        since = self.client.get('/api/auth/admin/activity/').data['latest_cursor']
+        # Stamped earlier than everything already read, committed only now
+        self.book()
+        ActivityEvent.objects.filter(type='confirmed').update(occurred_at=timezone.now() - timedelta(days=1))
+        tail = self.client.get('/api/auth/admin/activity/', {'since': since}).data
+        self.assertEqual([e['type'] for e in tail['results']], ['pending', 'confirmed'])
+        self.assertEqual(self.client.get('/api/auth/admin/activity/', {'since': 'nope'}).status_code, 400)
+
+    def test_dashboard_reads_the_feed(self):
+        self.book()
+        activities = self.client.get('/api/auth/admin/dashboard-stats/').data['recent_activities']
+        self.assertEqual(activities[0]['message'], 'Asha booked Tennis at Arena')
+        self.assertEqual(activities[-1]['type'], 'club_added')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReportJobTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', mobile_number='9000000000',
+            password='AdminPass123', is_staff=True,
+        )
+        user = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        sport = Sport.objects.create(name='Tennis', club=club, price_per_hour=500)
+        self.last_month = timezone.localdate().replace(day=1) - timedelta(days=1)
+        self.booking = Booking.objects.create(
+            user=user, club=club, sport=sport, date=self.last_month,
+            start_time=time(10), end_time=time(11), amount=500, status='confirmed',
+        )
+        self.client.force_authenticate(self.admin)
+
+    def submit(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/auth/admin/reports/', data, format='json')
+
+    def test_closed_month_is_built_once_and_kept(self):
+        month = {'kind': 'monthly', 'year': self.last_month.year, 'month': self.last_month.month}
+        first = self.submit(**month)
+        self.assertEqual(first.status_code, 202)
+        job = self.client.get(f"/api/auth/admin/reports/{first.data['job_id']}/").data
+        self.assertEqual((job['status'], job['is_final']), ('succeeded', True))
+        self.assertEqual(job['result']['confirmed_bookings'], 1)
+
+        # Served from the stored result, however old, without queueing anything
+        ReportJob.objects.update(completed_at=timezone.now() - timedelta(days=90))
+        with self.captureOnCommitCallbacks() as callbacks:
+            again = self.client.post('/api/auth/admin/reports/', month, format='json')
+        self.assertEqual((again.status_code, again.data['job_id']), (200, first.data['job_id']))
+        self.assertEqual(callbacks, [])
+        self.assertEqual(ReportJob.objects.get().attempts, 1)
+
+    def test_identical_pending_submissions_share_a_job(self):
+        from . import jobs
+        kind, params = jobs.parse({'kind': 'range', 'start': '2025-01-01', 'end': '2025-01-31'})
+        first, second = jobs.submit(kind, params), jobs.submit(kind, params)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_open_period_is_rebuilt_when_stale(self):
+        today = str(timezone.localdate())
+        self.submit(kind='range', start=today, end=today)
+        job = ReportJob.objects.get()
+        self.assertFalse(job.is_final)
+        ReportJob.objects.update(completed_at=timezone.now() - timedelta(hours=1))
+        self.submit(kind='range', start=today, end=today)
+        self.assertEqual(ReportJob.objects.get().attempts, 2)
+
+    def test_rejects_invalid_submissions(self):
+        self.assertEqual(self.submit(kind='monthly', year=2025, month=13).status_code, 400)
+        self.assertEqual(self.submit(kind='range', start='2025-02-01', end='2025-01-01').status_code, 400)
+
+    def monthly(self):
+        return self.client.get('/api/auth/admin/monthly-report/', {
+            'year': self.last_month.year, 'month': self.last_month.month,
+        }).data
+
+    def test_closed_month_is_served_from_the_stored_result(self):
+        self.assertEqual(self.monthly()['confirmed_bookings'], 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.monthly()['confirmed_bookings'], 1)
+
+        # Bookings in the current month don't touch it
+        Booking.objects.create(
+            user=self.booking.user, club=self.booking.club, sport=self.booking.sport,
+            date=timezone.localdate(), start_time=time(12), end_time=time(13), amount=500, status='confirmed',
+        )
+        self.assertEqual(ReportJob.objects.get().status, 'succeeded')
+
+        # An admin edit to a booking in that month does
+        self.booking.status = 'cancelled'
+        self.booking.save()
+        job = ReportJob.objects.get()
+        self.assertEqual((job.status, job.is_final), ('stale', False))
+        report = self.monthly()
+        self.assertEqual((report['confirmed_bookings'], report['cancelled_bookings']), (0, 1))
+        self.assertTrue(ReportJob.objects.get().is_final)
+
+    def test_late_refund_invalidates_the_closed_month(self):
+        payment = Payment.objects.create(
+            booking=self.booking, stripe_payment_intent_id='pi_1', amount=500, status='pending',
+        )
+        payment.mark_completed()
+        self.assertEqual(self.monthly()['total_refunds'], 0)
+        payment.mark_refunded()
+        self.assertEqual(self.monthly()['total_refunds'], 500)
+
+    def test_change_during_a_build_keeps_the_result_from_being_final(self):
+        from . import jobs
+        original = jobs.build
+
+        def build_then_change(kind, params):
+            result = original(kind, params)
+            jobs.invalidate([self.last_month])
+            return result
+
+        with mock.patch('reports.jobs.build', build_then_change):
+            jobs.cached_report('monthly', {'year': self.last_month.year, 'month': self.last_month.month})
+        job = ReportJob.objects.get()
+        self.assertEqual((job.status, job.is_final), ('stale', False))
+
+    def test_change_stamped_before_the_build_but_committed_during_it_is_not_lost(self):
+        from . import jobs
+        original = jobs.build
+        stamped = timezone.now() - timedelta(minutes=1)
+
+        def build_then_commit(kind, params):
+            # The writer ran invalidate() before the build started, but only commits now
+            result = original(kind, params)
+            with mock.patch('reports.jobs.timezone.now', return_value=stamped):
+                jobs.invalidate([self.last_month])
+            return result
+
+        kind, params = 'monthly', {'year': self.last_month.year, 'month': self.last_month.month}
+        job = jobs.submit(kind, params)
+        with mock.patch('reports.jobs.build', build_then_commit):
+            jobs.run(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.is_final), ('stale', False))
+
+    def test_admin_rebuild_resubmits_the_filtered_jobs(self):
+        month = {'kind': 'monthly', 'year': self.last_month.year, 'month': self.last_month.month}
+        self.submit(**month)
+        self.assertEqual(ReportJob.objects.get().status, 'succeeded')
+
+        superuser = User.objects.create_superuser(
+            username='root', email='root@example.com', mobile_number='9000000009', password='RootPass123',
+        )
+        self.client.force_login(superuser)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/admin/reports/reportjob/?status__exact=succeeded', {
+                'action': 'rebuild', '_selected_action': [ReportJob.objects.get().pk],
+            })
+        self.assertEqual(response.status_code, 302)
+        job = ReportJob.objects.get()
+        self.assertEqual((job.status, job.attempts, job.is_final), ('succeeded', 2, True))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class OccupancyHeatmapTests(APITestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        store_dir = override_settings(ANALYTICS_STORE_DIR=root)
+        store_dir.enable()
+        self.addCleanup(store_dir.disable)
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', mobile_number='9000000000',
+            password='AdminPass123', is_staff=True,
+        )
+        user = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        club = Club.objects.create(name='Arena', location='Pune', opening_time=time(6), closing_time=time(22))
+        sport = Sport.objects.create(name='Tennis', club=club, price_per_hour=500)
+        monday = date(2025, 1, 6)
+        for day, start, end, amount, booking_status in [
+            (monday, time(10), time(11), 500, 'confirmed'),
+            (monday + timedelta(weeks=1), time(10, 30), time(12), 600, 'completed'),
+            (monday + timedelta(weeks=1), time(10), time(11), 500, 'cancelled'),
+        ]:
+            Booking.objects.create(
+                user=user, club=club, sport=sport, date=day, start_time=start, end_time=end,
+                amount=amount, status=booking_status,
+            )
+        self.client.force_authenticate(self.admin)
+
+    def test_weekday_hour_matrices(self):
+        data = self.client.get('/api/auth/admin/analytics/heatmap/', {'start': '2025-01-06', 'end': '2025-01-19'}).data
+        club = data['clubs'][0]
+        tennis = club['sports'][0]
+        # Two Mondays in range: 1.5 booked hours of 2 open court-hours at 10:00, 1 of 2 at 11:00
+        self.assertEqual(tennis['occupancy'][0][10:12], [0.75, 0.5])
+        self.assertEqual(tennis['revenue_per_court_hour'][0][10:12], [350.0, 200.0])
+        self.assertEqual(tennis['cancellation_rate'][0][10:12], [0.3333, None])
+        self.assertIsNone(tennis['occupancy'][0][3])  # closed
+        self.assertEqual(tennis['occupancy'][1][10], 0.0)
+        self.assertEqual((club['bookings'], club['revenue']), (3, 1100.0))
+
+    def test_rejects_bad_range(self):
+        response = self.client.get('/api/auth/admin/analytics/heatmap/', {'start': '2025-02-01', 'end': '2025-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ColumnarSnapshotTests(TestCase):
+    def setUp(self):
+        import tempfile
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(__import__('shutil').rmtree, self.root, True)
+        user = User.objects.create_user(
+            username='player', email='player@example.com', mobile_number='9000000001', password='UserPass123',
+        )
+        self.clubs = [
+            Club.objects.create(name=name, location='Pune', opening_time=time(6), closing_time=time(22))
+            for name in ('Arena', 'Riverside')
+        ]
+        self.today = timezone.localdate()
+        for i, club in enumerate(self.clubs):
+            sport = Sport.objects.create(name='Tennis', club=club, price_per_hour=500)
+            # Across a month boundary, up to today
+            for days_ago in (40, 35, 3, 0):
+                booking = Booking.objects.create(
+                    user=user, club=club, sport=sport, date=self.today - timedelta(days=days_ago),
+                    start_time=time(8 + i), end_time=time(9 + i), amount=500, status='confirmed',
+                )
+                payment = Payment.objects.create(
+                    booking=booking, stripe_payment_intent_id=f'pi_{booking.pk}', amount=500, status='pending',
+                )
+                payment.mark_completed()
+                if days_ago == 35:
+                    payment.mark_refunded()
+
+    def store(self, root=None):
+        from .columnar import Store
+        return Store(root or self.root)
+
+    def test_append_is_incremental_and_scan_matches_live(self):
+        from .columnar import totals
+        start, end = self.today - timedelta(days=60), self.today
+        live = totals(start, end, store=self.store(self.root + '/empty'))
+
+        store = self.store()
+        self.assertEqual(store.append(self.today - timedelta(days=10)), 4)
+        self.assertEqual(store.append(self.today - timedelta(days=10)), 0)
+        # Reopened from disk: snapshot for the old days, live database for the rest
+        with self.assertNumQueries(1):
+            combined = totals(start, end, store=self.store())
+        self.assertEqual(combined, live)
+        self.assertEqual(combined[self.clubs[0].id]['bookings'], {'confirmed': 4})
+        self.assertEqual((combined[self.clubs[0].id]['gross'], combined[self.clubs[0].id]['refunds']), (2000, 500))
+
+        self.assertEqual(self.store().append(self.today - timedelta(days=1)), 2)
+        self.assertEqual(totals(start, end, store=self.store()), live)
+
+    def test_heatmap_reads_the_snapshot(self):
+        from . import heatmap
+        start, end = self.today - timedelta(days=60), self.today
+        with override_settings(ANALYTICS_STORE_DIR=self.root, ANALYTICS_SYNC_INTERVAL=0):
+            # A request never creates the snapshot, it reads the database meanwhile
+            before = heatmap.build(start, end)
+            self.assertIsNone(self.store().through)
+            call_command('snapshot_bookings', stdout=StringIO())
+            self.assertEqual(self.store().through, self.today - timedelta(days=2))
+            self.assertEqual(heatmap.build(start, end), before)
+            # Changing a snapshotted booking behind the signals' back no longer affects the result
+            Booking.objects.filter(date=self.today - timedelta(days=40)).update(status='cancelled')
+            after = heatmap.build(start, end)
+        self.assertEqual(before, after)
+
+    def test_interrupted_append_is_continued_without_duplicates(self):
+        from .columnar import Store, totals
+        start, end = self.today - timedelta(days=60), self.today
+        live = totals(start, end, store=self.store(self.root + '/empty'))
+        original = Store.write_month
+        written = []
+
+        def die_on_second_month(store, year, month, columns):
+            if written:
+                raise RuntimeError('worker killed')
+            written.append((year, month))
+            original(store, year, month, columns)
+
+        with mock.patch.object(Store, 'write_month', die_on_second_month):
+            with self.assertRaises(RuntimeError):
+                self.store().append(self.today - timedelta(days=2))
+        self.assertEqual(self.store().through.replace(day=1), date(*written[0], 1))
+        self.store().append(self.today - timedelta(days=2))
+        self.assertEqual(totals(start, end, store=self.store()), live)
+
+    @override_settings(ANALYTICS_SYNC_INTERVAL=0)
+    def test_late_change_is_copied_in_again_by_the_next_sync(self):
+        from .columnar import sync, totals
+        start, end = self.today - timedelta(days=60), self.today
+        store = sync(self.store(), create=True)
+        self.assertEqual(store.through, self.today - timedelta(days=2))
+
+        booking = Booking.objects.get(club=self.clubs[0], date=self.today - timedelta(days=40))
+        booking.status = 'cancelled'
+        booking.save()
+        self.assertEqual(
+            totals(start, end, store=sync(self.store())),
+            totals(start, end, store=self.store(self.root + '/empty')),
+        )
+        self.assertEqual(totals(start, end, store=self.store())[self.clubs[0].id]['bookings'],
+                         {'confirmed': 3, 'cancelled': 1})
+        self.assertFalse(SnapshotChange.objects.exists())
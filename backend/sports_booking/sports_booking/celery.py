@@ -1,7 +1,9 @@
 from __future__ import absolute_import, unicode_literals
 import os
+import time
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import before_task_publish, task_prerun
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sports_booking.settings')
@@ -25,12 +27,66 @@ app.conf.beat_schedule = {
         'schedule': crontab(hour=2, minute=0),  # Daily at 2 AM
         'options': {'expires': 3600}
     },
+    # Safety net for the transactional outbox: requests nudge the
+    # dispatcher on commit, this drains anything those nudges missed
+    # (e.g. broker briefly unavailable).
+    'dispatch-notification-outbox': {
+        'task': 'notifications.tasks.dispatch_outbox',
+        'schedule': 10.0,
+        'options': {'expires': 10}
+    },
+    # Safety net for the Stripe webhook inbox, same idea as the outbox.
+    'process-stripe-events': {
+        'task': 'payments.tasks.process_stripe_events',
+        'schedule': 15.0,
+        'options': {'expires': 15}
+    },
+    'process-refund-jobs': {
+        'task': 'payments.tasks.process_refund_jobs',
+        'schedule': 30.0,
+        'options': {'expires': 30}
+    },
+    'reconcile-stripe-payments-hourly': {
+        'task': 'payments.tasks.reconcile_stripe_payments',
+        'schedule': crontab(minute=15),
+        'options': {'expires': 3000}
+    },
+    'verify-daily-rollups-nightly': {
+        'task': 'reports.tasks.verify_daily_rollups',
+        'schedule': crontab(hour=3, minute=30),
+        'options': {'expires': 3600}
+    },
+    'send-due-booking-reminders': {
+        'task': 'notifications.tasks.send_due_reminders',
+        'schedule': 60.0,
+        'options': {'expires': 60}
+    },
 }
 
 app.conf.timezone = 'Asia/Kolkata'
 app.conf.task_track_started = True
 app.conf.task_time_limit = 30 * 60  # 30 minutes
 
+
+# Queue latency: stamp every message when it is published and record how
+# long it waited once a worker picks it up, per queue. Summaries are served
+# from accounts' admin/queue-latency/ endpoint (common.metrics).
+@before_task_publish.connect
+def stamp_publish_time(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('published_at', time.time())
+
+
+@task_prerun.connect
+def record_queue_latency(task=None, **kwargs):
+    published_at = getattr(task.request, 'published_at', None)
+    if published_at is None:  # eager / locally applied tasks never queue
+        return
+    from common.metrics import observe_latency
+    queue = (task.request.delivery_info or {}).get('routing_key') or 'unknown'
+    observe_latency(f'celery.queue.{queue}', time.time() - published_at)
+
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
\ No newline at end of file
@@ -7,6 +7,7 @@ from decouple import config, Csv
 from datetime import timedelta
 import dj_database_url
 from dotenv import load_dotenv
+from kombu import Queue
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -59,6 +60,8 @@ INSTALLED_APPS = [
     'clubs',
     'bookings',
     'payments',
+    'notifications',
+    'reports',
 ]
 
 MIDDLEWARE = [
@@ -197,6 +200,45 @@ CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=DEBUG, cast=bool)
 CELERY_TASK_EAGER_PROPAGATES = True
 
+# Priority queues. Each queue gets its own worker pool (see Procfile /
+# render.yaml), so an OTP never waits behind a waitlist fan-out or a
+# cleanup backlog:
+#   auth          — login OTPs; a user is staring at a spinner.
+#   transactional — confirmations, status updates, the outbox dispatcher.
+#   bulk          — fan-out and periodic maintenance; may lag freely.
+CELERY_TASK_QUEUES = (
+    Queue('auth'),
+    Queue('transactional'),
+    Queue('bulk'),
+)
+CELERY_TASK_DEFAULT_QUEUE = 'transactional'
+CELERY_TASK_ROUTES = {
+    'bookings.tasks.send_otp_sms_task': {'queue': 'auth'},
+
+    'bookings.tasks.send_booking_confirmation_email': {'queue': 'transactional'},
+    'bookings.tasks.send_booking_confirmation_sms': {'queue': 'transactional'},
+    'bookings.tasks.send_booking_status_update': {'queue': 'transactional'},
+    'bookings.tasks.send_welcome_email_task': {'queue': 'transactional'},
+    'payments.tasks.send_payment_confirmation_email': {'queue': 'transactional'},
+    'payments.tasks.process_stripe_events': {'queue': 'transactional'},
+    'notifications.tasks.dispatch_outbox': {'queue': 'transactional'},
+    'notifications.tasks.send_due_reminders': {'queue': 'transactional'},
+
+    'bookings.tasks.notify_waitlisted_users': {'queue': 'bulk'},
+    'bookings.tasks.release_expired_slot_locks': {'queue': 'bulk'},
+    'bookings.tasks.cleanup_*': {'queue': 'bulk'},
+    'payments.tasks.cleanup_expired_payments': {'queue': 'bulk'},
+    'payments.tasks.security_monitoring': {'queue': 'bulk'},
+    'payments.tasks.reconcile_stripe_payments': {'queue': 'bulk'},
+    'payments.tasks.process_refund_jobs': {'queue': 'bulk'},
+    'reports.tasks.verify_daily_rollups': {'queue': 'bulk'},
+    'reports.tasks.build_report': {'queue': 'bulk'},
+    'payments.tasks.prerender_upi_qr_codes': {'queue': 'bulk'},
+}
+# Reserve one message per worker process at a time: with a deep prefetch a
+# busy process sits on queued OTPs while a sibling is idle.
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
 CELERY_BEAT_SCHEDULE = {
     'cleanup-expired-payments': {
         'task': 'payments.tasks.cleanup_expired_payments',
@@ -211,15 +253,44 @@ CELERY_BEAT_SCHEDULE = {
 # --------------------------------------------------------------------------
 # Third-party service credentials (loaded once, consistently, via decouple)
 # --------------------------------------------------------------------------
-TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID', default='')
-TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN', default='')
-TWILIO_PHONE_NUMBER = config('TWILIO_PHONE_NUMBER', default='')
-
-STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='')
-STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
-STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
-
-RESEND_API_KEY = config('RESEND_API_KEY', default='')
+# 'live' in every real deployment. 'fake' (in-process fakes) and 'standin'
+# (real SDKs against a local common.standin_server) exist for offline load
+# tests of the checkout / notification pipeline — see common.providers.
+# Off 'live', credentials default to placeholders so nothing is skipped as
+# "not configured".
+PROVIDER_BACKEND = config('PROVIDER_BACKEND', default='live')
+_PLACEHOLDER = PROVIDER_BACKEND != 'live'
+
+TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID', default='ACfake' if _PLACEHOLDER else '')
+TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN', default='fake' if _PLACEHOLDER else '')
+TWILIO_PHONE_NUMBER = config('TWILIO_PHONE_NUMBER', default='+10000000000' if _PLACEHOLDER else '')
+
+STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='pk_test_fake' if _PLACEHOLDER else '')
+STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='sk_test_fake' if _PLACEHOLDER else '')
+STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='whsec_fake' if _PLACEHOLDER else '')
+# Webhook inbox events applied per payments.tasks.process_stripe_events batch.
+STRIPE_EVENT_BATCH_SIZE = config('STRIPE_EVENT_BATCH_SIZE', default=100, cast=int)
+
+RESEND_API_KEY = config('RESEND_API_KEY', default='re_fake' if _PLACEHOLDER else '')
+
+PROVIDER_STANDIN_URL = config('PROVIDER_STANDIN_URL', default='http://127.0.0.1:8765')
+
+# Fault injection for the fakes (and `run_provider_standin` defaults).
+# Per-provider overrides: PROVIDER_FAKE_OVERRIDES = {'twilio': {'error_rate': 0.05}}
+PROVIDER_FAKE_LATENCY_MS = config('PROVIDER_FAKE_LATENCY_MS', default=0.0, cast=float)
+PROVIDER_FAKE_LATENCY_JITTER_MS = config('PROVIDER_FAKE_LATENCY_JITTER_MS', default=0.0, cast=float)
+PROVIDER_FAKE_ERROR_RATE = config('PROVIDER_FAKE_ERROR_RATE', default=0.0, cast=float)
+PROVIDER_FAKE_RATE_LIMIT = config('PROVIDER_FAKE_RATE_LIMIT', default=0, cast=int)
+PROVIDER_FAKE_SEED = config('PROVIDER_FAKE_SEED', default=None)
+PROVIDER_FAKE_OVERRIDES = {}
+PROVIDER_FAKE_STRIPE_AUTO_CONFIRM = config('PROVIDER_FAKE_STRIPE_AUTO_CONFIRM', default=True, cast=bool)
+
+# Shared keep-alive HTTP pool used by the Resend/Twilio/Stripe clients
+# (common.providers). One pool per worker process; timeouts are explicit so
+# a slow provider can never hang a worker indefinitely.
+PROVIDER_HTTP_CONNECT_TIMEOUT = config('PROVIDER_HTTP_CONNECT_TIMEOUT', default=3.05, cast=float)
+PROVIDER_HTTP_READ_TIMEOUT = config('PROVIDER_HTTP_READ_TIMEOUT', default=10.0, cast=float)
+PROVIDER_HTTP_POOL_MAXSIZE = config('PROVIDER_HTTP_POOL_MAXSIZE', default=10, cast=int)
 
 # Admin passcode login (accounts.views.admin_login). Never hardcode this —
 # set it as a Render env var, and do NOT ship the same value inside the
@@ -233,6 +304,37 @@ RESEND_API_KEY = config('RESEND_API_KEY', default='')
 # looks like a forgotten bypass. NEVER default this to True.
 PAYMENT_DEV_MODE = config('PAYMENT_DEV_MODE', default=False, cast=bool)
 
+# Local PaymentIntent state (payments.intent_cache) that lets confirm_payment
+# skip PaymentIntent.retrieve: seconds to keep settled and in-flight states.
+PAYMENT_INTENT_CACHE_TTL = config('PAYMENT_INTENT_CACHE_TTL', default=600, cast=int)
+PAYMENT_INTENT_PENDING_CACHE_TTL = config('PAYMENT_INTENT_PENDING_CACHE_TTL', default=5, cast=int)
+
+# UPI checkout (payments.views.upi_checkout); disabled while UPI_ID is empty.
+UPI_ID = config('UPI_ID', default='')
+UPI_MERCHANT_NAME = config('UPI_MERCHANT_NAME', default='Sports Club')
+# Rendered QR codes: per-process LRU entries, and seconds kept in Redis.
+QR_CACHE_LRU_SIZE = config('QR_CACHE_LRU_SIZE', default=256, cast=int)
+QR_CACHE_TTL = config('QR_CACHE_TTL', default=3600, cast=int)
+
+# Stripe <-> Payment reconciliation (payments.reconciliation): windows of
+# this many seconds, scanned once they are RECONCILE_SETTLE_SECONDS old; a
+# first run (no checkpoint) looks back at most RECONCILE_LOOKBACK_DAYS.
+# Payments still pending behind the checkpoint are re-checked by
+# individual retrieves, at most RECONCILE_PENDING_LIMIT per run.
+RECONCILE_WINDOW_SECONDS = config('RECONCILE_WINDOW_SECONDS', default=6 * 3600, cast=int)
+RECONCILE_SETTLE_SECONDS = config('RECONCILE_SETTLE_SECONDS', default=3600, cast=int)
+RECONCILE_LOOKBACK_DAYS = config('RECONCILE_LOOKBACK_DAYS', default=30, cast=int)
+RECONCILE_PENDING_LIMIT = config('RECONCILE_PENDING_LIMIT', default=500, cast=int)
+
+# Refund queue (payments.refunds): jobs claimed per batch, concurrent Stripe
+# calls per worker, a per-second cap shared by all workers (well under
+# Stripe's live-mode limit, which checkout traffic shares), and how long a
+# claimed job stays leased before another worker may retry it.
+REFUND_BATCH_SIZE = config('REFUND_BATCH_SIZE', default=50, cast=int)
+REFUND_MAX_CONCURRENCY = config('REFUND_MAX_CONCURRENCY', default=4, cast=int)
+REFUND_RATE_LIMIT_PER_SECOND = config('REFUND_RATE_LIMIT_PER_SECOND', default=20, cast=int)
+REFUND_LEASE_SECONDS = config('REFUND_LEASE_SECONDS', default=300, cast=int)
+
 # --------------------------------------------------------------------------
 # Email Configuration
 # --------------------------------------------------------------------------
@@ -245,6 +347,25 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 EMAIL_TIMEOUT = 10  # seconds — fail fast instead of hanging the whole request/worker
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='Sports Club <noreply@sportsclub.com>')
 
+# Notification outbox: rows drained per dispatch_outbox run.
+NOTIFICATION_OUTBOX_BATCH_SIZE = config('NOTIFICATION_OUTBOX_BATCH_SIZE', default=100, cast=int)
+# Rows are claimed ('sending') for this long while a dispatcher sends them;
+# if it dies mid-batch they become due again once the lease runs out.
+NOTIFICATION_OUTBOX_LEASE_SECONDS = config('NOTIFICATION_OUTBOX_LEASE_SECONDS', default=300, cast=int)
+
+# Per-kind coalescing window in seconds: notifications of these kinds for
+# the same user and channel that land within one window go out as a single
+# digest message. Kinds not listed are sent immediately.
+NOTIFICATION_COALESCE_WINDOWS = {
+    'booking_confirmation': 60,
+    'booking_status_update': 120,
+}
+
+# Booking reminders go out this long before the slot starts
+# (notifications.tasks.send_due_reminders, drained once a minute).
+BOOKING_REMINDER_LEAD_MINUTES = config('BOOKING_REMINDER_LEAD_MINUTES', default=120, cast=int)
+NOTIFICATION_REMINDER_BATCH_SIZE = config('NOTIFICATION_REMINDER_BATCH_SIZE', default=500, cast=int)
+
 # Slot Locking Configuration
 SLOT_LOCK_DURATION = 600  # 10 minutes in seconds
 
@@ -270,6 +391,39 @@ CACHES = {
     }
 }
 
+# Nightly rollup consistency check window (reports.tasks.verify_daily_rollups)
+ROLLUP_VERIFY_DAYS_BACK = config('ROLLUP_VERIFY_DAYS_BACK', default=7, cast=int)
+ROLLUP_VERIFY_DAYS_AHEAD = config('ROLLUP_VERIFY_DAYS_AHEAD', default=30, cast=int)
+
+# Admin dashboard payload (accounts.views.dashboard_stats) is computed at
+# most once per this many seconds and shared by every admin (common.snapshot).
+DASHBOARD_SNAPSHOT_TTL = config('DASHBOARD_SNAPSHOT_TTL', default=5, cast=int)
+
+# Report jobs (reports.jobs): results for periods still open are rebuilt
+# on resubmission after REPORT_RESULT_MAX_AGE seconds; a job pending or
+# running longer than REPORT_JOB_TIMEOUT is assumed lost and requeued.
+REPORT_RESULT_MAX_AGE = config('REPORT_RESULT_MAX_AGE', default=300, cast=int)
+REPORT_JOB_TIMEOUT = config('REPORT_JOB_TIMEOUT', default=900, cast=int)
+REPORT_MAX_RANGE_DAYS = config('REPORT_MAX_RANGE_DAYS', default=366, cast=int)
+
+# Occupancy heatmaps (reports.heatmap) are shared between admins asking
+# for the same range for this many seconds (common.snapshot).
+HEATMAP_SNAPSHOT_TTL = config('HEATMAP_SNAPSHOT_TTL', default=300, cast=int)
+
+# Columnar snapshot of settled bookings (reports.columnar). It is read and
+# maintained by the web service, so ANALYTICS_STORE_DIR must be that
+# service's persistent disk (render.yaml). Days newer than
+# ANALYTICS_SETTLE_DAYS are read live since late payments and refunds
+# can still change them; later changes are copied in again by the next
+# sync, at most every ANALYTICS_SYNC_INTERVAL seconds.
+ANALYTICS_STORE_DIR = config('ANALYTICS_STORE_DIR', default=str(BASE_DIR / 'analytics_store'))
+ANALYTICS_SETTLE_DAYS = config('ANALYTICS_SETTLE_DAYS', default=2, cast=int)
+ANALYTICS_SYNC_INTERVAL = config('ANALYTICS_SYNC_INTERVAL', default=300, cast=int)
+
+# Rows fetched per round trip by the streaming admin exports; memory use
+# is bounded by this, not by the size of the export
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
 # Static files
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
@@ -355,5 +509,9 @@ LOGGING = {
             'handlers': ['console', 'file'],
             'level': 'DEBUG' if DEBUG else 'INFO',
         },
+        'notifications': {
+            'handlers': ['console', 'file'],
+            'level': 'DEBUG' if DEBUG else 'INFO',
+        },
     },
 }
\ No newline at end of file